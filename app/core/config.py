@@ -12,17 +12,244 @@ ROOT_DIR = APP_DIR.parent                         # project root
 # Load .env from project root
 load_dotenv(ROOT_DIR / ".env")
 
+def _env_bool(name: str, default: bool = False) -> bool:
+    return os.getenv(name, str(default)).strip().lower() in ("1", "true", "yes", "on")
+
+
 # --- Access Map ---
 ACCESS_MAP_PATH = APP_DIR / "constants" / "access_map.json"
 ACCESS_MAP: Dict[str, List[str]] = json.loads(ACCESS_MAP_PATH.read_text())
 
+# --- Latency budgets (ms) per timed_op event; slower calls go to the slow-operation log ---
+LATENCY_BUDGETS_PATH = APP_DIR / "constants" / "latency_budgets.json"
+LATENCY_BUDGETS_MS: Dict[str, float] = json.loads(LATENCY_BUDGETS_PATH.read_text())
+
+# --- Admission control: per-route concurrency, wait queue size and wait timeout ---
+ADMISSION_LIMITS_PATH = APP_DIR / "constants" / "admission_limits.json"
+ADMISSION_LIMITS: Dict[str, dict] = json.loads(ADMISSION_LIMITS_PATH.read_text())
+
+# --- Metadata retention: days to keep audit rows per http_status_code class
+# ("other" covers rows with no status or one outside 200-599) ---
+RETENTION_POLICY_PATH = APP_DIR / "constants" / "retention_policy.json"
+RETENTION_DAYS: Dict[str, int] = json.loads(RETENTION_POLICY_PATH.read_text())
+
+# --- Workspaces: name -> {"host", "token_env" | "client_id_env" + "client_secret_env",
+#                          "warehouse_id", "products"} ---
+# The workspace from DATABRICKS_HOST / DATABRICKS_TOKEN / SQL_WAREHOUSE_ID is
+# always registered as DEFAULT_WORKSPACE unless this file defines it
+WORKSPACES_PATH = APP_DIR / "constants" / "workspaces.json"
+WORKSPACES: Dict[str, dict] = json.loads(WORKSPACES_PATH.read_text())
+
 # --- Env Vars ---
 DATABRICKS_HOST: str = os.getenv("DATABRICKS_HOST", "")
 DATABRICKS_TOKEN: str = os.getenv("DATABRICKS_TOKEN", "")
 DATABRICKS_ACCOUNT_ID: str = os.getenv("DATABRICKS_ACCOUNT_ID", "")
+# Service principal for OAuth M2M; when set it replaces DATABRICKS_TOKEN and
+# LAKEBASE_OAUTH_TOKEN (LAKEBASE_USER is then the client id)
+DATABRICKS_CLIENT_ID: str = os.getenv("DATABRICKS_CLIENT_ID", "")
+DATABRICKS_CLIENT_SECRET: str = os.getenv("DATABRICKS_CLIENT_SECRET", "")
 LAKEBASE_DB_NAME: str = os.getenv("LAKEBASE_DB_NAME", "")
 LAKEBASE_USER: str = os.getenv("LAKEBASE_USER", "")
 LAKEBASE_OAUTH_TOKEN: str = os.getenv("LAKEBASE_OAUTH_TOKEN", "")
 LAKEBASE_HOST: str = os.getenv("LAKEBASE_HOST", "")
+# Pooled Lakebase connections: upper bound, opened at startup, wait for a free one
+LAKEBASE_POOL_SIZE: int = int(os.getenv("LAKEBASE_POOL_SIZE", "10"))
+LAKEBASE_POOL_WARM: int = int(os.getenv("LAKEBASE_POOL_WARM", "2"))
+LAKEBASE_POOL_TIMEOUT_SECONDS: float = float(
+    os.getenv("LAKEBASE_POOL_TIMEOUT_SECONDS", "10")
+)
+# Connections are reopened after this long, well inside the server's idle limits
+LAKEBASE_CONN_MAX_AGE_SECONDS: float = float(
+    os.getenv("LAKEBASE_CONN_MAX_AGE_SECONDS", "1800")
+)
+# Read replica for dashboard reads (/get-metadata, aggregates); empty reads the primary
+LAKEBASE_REPLICA_HOST: str = os.getenv("LAKEBASE_REPLICA_HOST", "")
+# Reads fall back to the primary when the replica is further behind than this,
+# or has not yet replayed this process's last write
+LAKEBASE_REPLICA_MAX_LAG_SECONDS: float = float(
+    os.getenv("LAKEBASE_REPLICA_MAX_LAG_SECONDS", "10")
+)
+LAKEBASE_REPLICA_LAG_CHECK_SECONDS: float = float(
+    os.getenv("LAKEBASE_REPLICA_LAG_CHECK_SECONDS", "5")
+)
+# Fixed metadata statements are prepared once per pooled connection
+LAKEBASE_PREPARED_STATEMENTS: bool = _env_bool("LAKEBASE_PREPARED_STATEMENTS", True)
 SQL_WAREHOUSE_ID: str = os.getenv("SQL_WAREHOUSE_ID", "")
 
+# --- Databricks client ---
+# Upper bound on concurrent calls a single bulk operation sends (also the HTTP pool size)
+DATABRICKS_MAX_CONCURRENCY: int = int(os.getenv("DATABRICKS_MAX_CONCURRENCY", "8"))
+# Schema, volume and grant calls of one payload in flight at once
+PLAN_FAN_OUT: int = int(os.getenv("PLAN_FAN_OUT", str(DATABRICKS_MAX_CONCURRENCY)))
+# Grant changes sent per permissions PATCH, by count and by approximate JSON size
+UC_GRANT_MAX_CHANGES: int = int(os.getenv("UC_GRANT_MAX_CHANGES", "500"))
+UC_GRANT_MAX_BYTES: int = int(os.getenv("UC_GRANT_MAX_BYTES", "500000"))
+# Grant PATCHes to a securable that arrive while one is in flight are merged into the next
+GRANT_BATCHING_ENABLED: bool = _env_bool("GRANT_BATCHING_ENABLED", True)
+# Hedged GETs: an idempotent read still unanswered after the recent HEDGE_PERCENTILE
+# latency of the same call is sent again and the first answer wins. Hedges skip
+# the per-workspace rate limiter and are instead limited to HEDGE_BUDGET_RATIO
+# of hedgeable calls (0.05 = at most 5% extra load)
+HEDGING_ENABLED: bool = _env_bool("HEDGING_ENABLED")
+HEDGE_PERCENTILE: float = float(os.getenv("HEDGE_PERCENTILE", "95"))
+HEDGE_MIN_DELAY_MS: float = float(os.getenv("HEDGE_MIN_DELAY_MS", "50"))
+HEDGE_MIN_SAMPLES: int = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_BUDGET_RATIO: float = float(os.getenv("HEDGE_BUDGET_RATIO", "0.05"))
+HEDGE_MAX_WORKERS: int = int(os.getenv("HEDGE_MAX_WORKERS", "32"))
+# OAuth tokens are refreshed this long before they expire; failed refreshes retry after
+TOKEN_REFRESH_MARGIN_SECONDS: float = float(
+    os.getenv("TOKEN_REFRESH_MARGIN_SECONDS", "300")
+)
+TOKEN_REFRESH_RETRY_SECONDS: float = float(os.getenv("TOKEN_REFRESH_RETRY_SECONDS", "10"))
+# Workspace used when a request names neither a workspace nor a mapped product
+DEFAULT_WORKSPACE: str = os.getenv("DEFAULT_WORKSPACE", "default")
+# Calls per second allowed per workspace (0 disables the limit), with bursts up to this size
+WORKSPACE_REQUESTS_PER_SECOND: float = float(
+    os.getenv("WORKSPACE_REQUESTS_PER_SECOND", "20")
+)
+WORKSPACE_RATE_LIMIT_BURST: int = int(os.getenv("WORKSPACE_RATE_LIMIT_BURST", "20"))
+# Consecutive failed calls that open a workspace's circuit, and how long it stays open
+CIRCUIT_BREAKER_FAILURES: int = int(os.getenv("CIRCUIT_BREAKER_FAILURES", "5"))
+CIRCUIT_BREAKER_RESET_SECONDS: float = float(
+    os.getenv("CIRCUIT_BREAKER_RESET_SECONDS", "30")
+)
+
+
+# --- SQL Statement Execution ---
+# How long a submission waits inline before returning a statement id ("0s" = fully async)
+SQL_WAIT_TIMEOUT: str = os.getenv("SQL_WAIT_TIMEOUT", "5s")
+# Initial and maximum delay between status polls for running statements
+SQL_POLL_INTERVAL_SECONDS: float = float(os.getenv("SQL_POLL_INTERVAL_SECONDS", "1"))
+SQL_MAX_POLL_INTERVAL_SECONDS: float = float(
+    os.getenv("SQL_MAX_POLL_INTERVAL_SECONDS", "10")
+)
+
+# --- Planning ---
+# How long listed workspace state (catalogs, schemas, volumes) is reused when diffing plans
+WORKSPACE_STATE_TTL_SECONDS: int = int(os.getenv("WORKSPACE_STATE_TTL_SECONDS", "60"))
+# Per-operation latency assumed before timed_op has observed an operation
+DEFAULT_OPERATION_LATENCY_MS: float = float(
+    os.getenv("DEFAULT_OPERATION_LATENCY_MS", "250")
+)
+
+# --- Traffic record / replay (benchmarking only) ---
+# "record" writes every Databricks exchange to TRAFFIC_FILE (gzip NDJSON, secrets
+# redacted); "replay" answers from that file instead of the workspace
+TRAFFIC_MODE: str = os.getenv("TRAFFIC_MODE", "off").lower()
+TRAFFIC_FILE: str = os.getenv("TRAFFIC_FILE", "")
+# Replayed latency = recorded latency x this factor (0 answers immediately)
+TRAFFIC_LATENCY_SCALE: float = float(os.getenv("TRAFFIC_LATENCY_SCALE", "1"))
+
+# --- Lifecycle ---
+# Each startup warm-up step (HTTP pool, Lakebase pool, catalog cache) gives up after this long
+WARMUP_TIMEOUT_SECONDS: float = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "30"))
+# On shutdown, how long in-flight provisioning may take before workers are stopped anyway
+SHUTDOWN_DRAIN_SECONDS: float = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "60"))
+
+# --- Metadata dashboards ---
+# How long /get-metadata/aggregates results are served from the in-process cache
+AGGREGATES_CACHE_TTL_SECONDS: float = float(
+    os.getenv("AGGREGATES_CACHE_TTL_SECONDS", "5")
+)
+
+# --- Profiling ---
+# Off by default; when off the middleware is not installed at all
+PROFILING_ENABLED: bool = _env_bool("PROFILING_ENABLED")
+# Fraction of requests profiled at random (0.0 - 1.0)
+PROFILE_SAMPLE_RATE: float = float(os.getenv("PROFILE_SAMPLE_RATE", "0"))
+# Requests carrying this header are always profiled (value must match the token if one is set)
+PROFILE_DEBUG_HEADER: str = os.getenv("PROFILE_DEBUG_HEADER", "x-debug-profile").lower()
+PROFILE_DEBUG_TOKEN: str = os.getenv("PROFILE_DEBUG_TOKEN", "")
+PROFILE_INTERVAL_MS: float = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR: str = os.getenv("PROFILE_DIR", "profiles")
+
+# --- Latency tracking ---
+# Percentiles cover the current and previous window of this length
+LATENCY_WINDOW_SECONDS: float = float(os.getenv("LATENCY_WINDOW_SECONDS", "300"))
+
+# --- Admission control ---
+ADMISSION_CONTROL_ENABLED: bool = _env_bool("ADMISSION_CONTROL_ENABLED", True)
+# Header naming the caller's lane; earlier lanes are admitted first
+ADMISSION_PRIORITY_HEADER: str = os.getenv(
+    "ADMISSION_PRIORITY_HEADER", "x-request-priority"
+).lower()
+ADMISSION_LANES: List[str] = os.getenv("ADMISSION_LANES", "interactive,batch").split(",")
+
+# --- Response compression ---
+COMPRESSION_ENABLED: bool = _env_bool("COMPRESSION_ENABLED", True)
+# Responses smaller than this many bytes are sent uncompressed
+COMPRESSION_MIN_SIZE: int = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+COMPRESSION_GZIP_LEVEL: int = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+COMPRESSION_BROTLI_QUALITY: int = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "4"))
+
+# --- Metadata retention ---
+RETENTION_ENABLED: bool = _env_bool("RETENTION_ENABLED")
+# UTC hour at which the daily retention run starts
+RETENTION_RUN_HOUR_UTC: int = int(os.getenv("RETENTION_RUN_HOUR_UTC", "3"))
+# Rows archived and deleted per transaction, and batches allowed per run
+RETENTION_BATCH_SIZE: int = int(os.getenv("RETENTION_BATCH_SIZE", "5000"))
+RETENTION_MAX_BATCHES: int = int(os.getenv("RETENTION_MAX_BATCHES", "200"))
+# Days to keep per-minute rollups; they outlive the rows they summarise
+ROLLUP_RETENTION_DAYS: int = int(os.getenv("ROLLUP_RETENTION_DAYS", "400"))
+# UC volume directory for archived rows, e.g. /Volumes/ops/audit/metadata_archive
+# (rows are deleted without an archive copy when empty)
+RETENTION_ARCHIVE_PATH: str = os.getenv("RETENTION_ARCHIVE_PATH", "").rstrip("/")
+
+# --- Audit outbox ---
+# Audit rows are appended to local segment files and shipped to Lakebase in the
+# background, so a slow or unavailable Lakebase neither stalls requests nor loses rows
+AUDIT_OUTBOX_ENABLED: bool = _env_bool("AUDIT_OUTBOX_ENABLED", True)
+AUDIT_OUTBOX_DIR: str = os.getenv("AUDIT_OUTBOX_DIR", "audit_outbox")
+# A segment is closed for shipping at this size or age, whichever comes first
+AUDIT_OUTBOX_SEGMENT_BYTES: int = int(os.getenv("AUDIT_OUTBOX_SEGMENT_BYTES", str(4 * 1024 * 1024)))
+AUDIT_OUTBOX_SEGMENT_SECONDS: float = float(os.getenv("AUDIT_OUTBOX_SEGMENT_SECONDS", "5"))
+# Appends reach disk with one fsync per interval instead of one per row
+AUDIT_OUTBOX_FSYNC_MS: float = float(os.getenv("AUDIT_OUTBOX_FSYNC_MS", "50"))
+AUDIT_OUTBOX_SHIP_INTERVAL_SECONDS: float = float(
+    os.getenv("AUDIT_OUTBOX_SHIP_INTERVAL_SECONDS", "2")
+)
+# A segment Lakebase rejects this many times (bad row, constraint) is quarantined
+AUDIT_OUTBOX_MAX_ATTEMPTS: int = int(os.getenv("AUDIT_OUTBOX_MAX_ATTEMPTS", "5"))
+
+# --- Idempotency ---
+IDEMPOTENCY_ENABLED: bool = _env_bool("IDEMPOTENCY_ENABLED", True)
+# How long a completed response is replayed for duplicate submissions
+IDEMPOTENCY_TTL_SECONDS: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "3600"))
+# How long a duplicate waits for the running original before giving up with 409
+IDEMPOTENCY_WAIT_SECONDS: float = float(os.getenv("IDEMPOTENCY_WAIT_SECONDS", "300"))
+# Share keys across instances through Lakebase ("memory" or "lakebase")
+IDEMPOTENCY_BACKEND: str = os.getenv("IDEMPOTENCY_BACKEND", "memory").lower()
+# A Lakebase claim older than this is treated as abandoned by a crashed instance
+IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS: int = int(
+    os.getenv("IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS", "900")
+)
+
+# --- NDJSON ingest ---
+# Lines provisioned concurrently per stream, and lines / results buffered per stream
+INGEST_CONCURRENCY: int = int(os.getenv("INGEST_CONCURRENCY", "4"))
+INGEST_QUEUE_SIZE: int = int(os.getenv("INGEST_QUEUE_SIZE", "64"))
+# Payloads started per second across all streams (0 disables the limit)
+INGEST_ITEMS_PER_SECOND: float = float(os.getenv("INGEST_ITEMS_PER_SECOND", "5"))
+INGEST_MAX_LINE_BYTES: int = int(os.getenv("INGEST_MAX_LINE_BYTES", str(1024 * 1024)))
+
+# --- Workspace index ---
+# Background index of catalogs, schemas, volumes and tables for existence checks
+WORKSPACE_INDEX_ENABLED: bool = _env_bool("WORKSPACE_INDEX_ENABLED")
+# Catalogs to index (comma separated); empty indexes every visible catalog
+WORKSPACE_INDEX_CATALOGS: List[str] = [
+    name.strip().lower()
+    for name in os.getenv("WORKSPACE_INDEX_CATALOGS", "").split(",")
+    if name.strip()
+]
+WORKSPACE_INDEX_REFRESH_SECONDS: float = float(
+    os.getenv("WORKSPACE_INDEX_REFRESH_SECONDS", "600")
+)
+# An index older than this is ignored and callers fall back to live calls
+WORKSPACE_INDEX_MAX_AGE_SECONDS: float = float(
+    os.getenv("WORKSPACE_INDEX_MAX_AGE_SECONDS", "1800")
+)
+# List calls per second allowed during a full refresh, and page size per call
+WORKSPACE_INDEX_REQUESTS_PER_SECOND: float = float(
+    os.getenv("WORKSPACE_INDEX_REQUESTS_PER_SECOND", "5")
+)
+WORKSPACE_INDEX_PAGE_SIZE: int = int(os.getenv("WORKSPACE_INDEX_PAGE_SIZE", "1000"))
@@ -0,0 +1,186 @@
+import threading
+import time
+from typing import Optional
+from urllib.parse import urljoin
+import requests
+from app.core.config import (
+    TOKEN_REFRESH_MARGIN_SECONDS,
+    TOKEN_REFRESH_RETRY_SECONDS,
+)
+from app.core.logging_config import get_logger
+
+logger = get_logger("credentials")
+
+# Least time between background refreshes, whatever lifetime tokens have
+MIN_REFRESH_INTERVAL_SECONDS = 1.0
+
+
+class CredentialError(Exception):
+    pass
+
+
+class StaticToken:
+    """A fixed token (PAT or pre-issued OAuth token) that is never refreshed."""
+
+    refreshable = False
+
+    def __init__(self, token: str):
+        self._token = token
+
+    def token(self) -> str:
+        return self._token
+
+    def refresh(self, rejected: Optional[str] = None):
+        pass
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
+
+    def stats(self) -> dict:
+        return {"type": "static"}
+
+
+class OAuthClientCredentials:
+    """
+    OAuth machine-to-machine token from a client id and secret.
+
+    The current token is cached in memory and swapped before it expires by a
+    background thread, so requests only read it. A caller that finds no valid
+    token refreshes it itself; concurrent callers wait for that single fetch
+    instead of each requesting a token.
+    """
+
+    refreshable = True
+
+    def __init__(
+        self,
+        token_url: str,
+        client_id: str,
+        client_secret: str,
+        scope: str = "all-apis",
+        name: str = "",
+    ):
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.scope = scope
+        self.name = name or token_url
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+        self._lifetime = 0.0
+        self._refresh_lock = threading.Lock()
+        self._session = requests.Session()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.refreshes = 0
+
+    @classmethod
+    def for_workspace(cls, host: str, client_id: str, client_secret: str, name: str = ""):
+        return cls(urljoin(host, "/oidc/v1/token"), client_id, client_secret, name=name)
+
+    def _valid(self) -> bool:
+        return self._token is not None and time.time() < self._expires_at
+
+    def token(self) -> str:
+        if not self._valid():
+            self._refresh_if(lambda: not self._valid())
+        return self._token
+
+    def refresh(self, rejected: Optional[str] = None):
+        """
+        Fetch a new token now. With `rejected`, only if that token is still
+        the current one, so callers rejected together share one fetch.
+        """
+        self._refresh_if(lambda: rejected is None or self._token == rejected)
+
+    def _refresh_if(self, needed):
+        with self._refresh_lock:
+            if needed():
+                self._fetch()
+
+    def _fetch(self):
+        try:
+            resp = self._session.post(
+                self.token_url,
+                data={"grant_type": "client_credentials", "scope": self.scope},
+                auth=(self.client_id, self.client_secret),
+                timeout=30,
+            )
+        except requests.RequestException as e:
+            raise CredentialError(f"Token request for {self.name} failed: {e}") from e
+        if not resp.ok:
+            raise CredentialError(
+                f"Token request for {self.name} failed: {resp.status_code} {resp.text}"
+            )
+        try:
+            body = resp.json()
+            token = body["access_token"]
+            lifetime = float(body.get("expires_in", 3600))
+        except (KeyError, TypeError, ValueError) as e:
+            raise CredentialError(
+                f"Token response for {self.name} is not usable: {e!r}"
+            ) from e
+        self._token = token
+        self._lifetime = lifetime
+        self._expires_at = time.time() + lifetime
+        self.refreshes += 1
+        logger.info(
+            "OAuth token refreshed",
+            extra={
+                "event": "oauth_token_refreshed",
+                "credential": self.name,
+                "expires_in": body.get("expires_in"),
+            },
+        )
+
+    def _refresh_at(self) -> float:
+        # Short-lived tokens are refreshed halfway through instead of
+        # continuously once the margin exceeds their lifetime
+        return self._expires_at - min(TOKEN_REFRESH_MARGIN_SECONDS, self._lifetime / 2)
+
+    def _run(self):
+        delay = max(0.0, self._refresh_at() - time.time())
+        while not self._stop.wait(delay):
+            try:
+                self._refresh_if(lambda: self._refresh_at() <= time.time())
+            except Exception:
+                # The current token usually stays valid for a while; try again soon
+                logger.exception(
+                    "OAuth token refresh failed",
+                    extra={"event": "oauth_token_refresh_failed", "credential": self.name},
+                )
+                delay = TOKEN_REFRESH_RETRY_SECONDS
+                continue
+            delay = max(MIN_REFRESH_INTERVAL_SECONDS, self._refresh_at() - time.time())
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name=f"token-refresh-{self.name}", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def stats(self) -> dict:
+        return {
+            "type": "oauth",
+            "valid": self._valid(),
+            "expires_in_seconds": max(0, int(self._expires_at - time.time())),
+            "refreshes": self.refreshes,
+        }
+
+
+def provider(host: str, token: str, client_id: str, client_secret: str, name: str = ""):
+    """OAuth when client credentials are configured, otherwise the static token."""
+    if client_id and client_secret:
+        return OAuthClientCredentials.for_workspace(host, client_id, client_secret, name)
+    return StaticToken(token)
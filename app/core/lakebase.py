@@ -0,0 +1,385 @@
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Set, Tuple, Union
+import psycopg2
+import psycopg2.errors
+import psycopg2.extensions
+from psycopg2 import sql
+from app.utils import request_profile
+from app.core import workspaces
+from app.core.credentials import StaticToken
+from app.core.config import (
+    DEFAULT_WORKSPACE,
+    LAKEBASE_DB_NAME,
+    LAKEBASE_USER,
+    LAKEBASE_OAUTH_TOKEN,
+    LAKEBASE_HOST,
+    LAKEBASE_POOL_SIZE,
+    LAKEBASE_POOL_WARM,
+    LAKEBASE_POOL_TIMEOUT_SECONDS,
+    LAKEBASE_CONN_MAX_AGE_SECONDS,
+    LAKEBASE_REPLICA_HOST,
+    LAKEBASE_REPLICA_MAX_LAG_SECONDS,
+    LAKEBASE_REPLICA_LAG_CHECK_SECONDS,
+    LAKEBASE_PREPARED_STATEMENTS,
+)
+
+# Lakebase accepts workspace OAuth tokens as the password, so it shares the
+# default workspace's service principal token when one is configured
+_workspace_credentials = workspaces.get(DEFAULT_WORKSPACE).credentials
+credentials = (
+    _workspace_credentials
+    if _workspace_credentials.refreshable
+    else StaticToken(LAKEBASE_OAUTH_TOKEN)
+)
+
+
+class PreparedStatement:
+    """
+    A fixed statement written with %s placeholders, prepared once per
+    connection and then run with EXECUTE so the server skips parsing it.
+    """
+
+    def __init__(self, name: str, query: Union[str, sql.Composable]):
+        self.name = name
+        self.query = query
+        self._prepare_sql: Optional[str] = None
+        self.params = 0
+
+    def prepare_sql(self, conn) -> str:
+        if self._prepare_sql is None:
+            text = self.query
+            if not isinstance(text, str):
+                text = text.as_string(conn)
+            # %s placeholders become $1..$n; %% is a literal %
+            parts = text.replace("%%", "\0").split("%s")
+            numbered = "".join(
+                part + (f"${i}" if i < len(parts) else "")
+                for i, part in enumerate(parts, start=1)
+            )
+            self.params = len(parts) - 1
+            self._prepare_sql = f"PREPARE {self.name} AS " + numbered.replace("\0", "%")
+        return self._prepare_sql
+
+    def execute_sql(self) -> str:
+        if not self.params:
+            return f"EXECUTE {self.name}"
+        return f"EXECUTE {self.name} ({', '.join(['%s'] * self.params)})"
+
+
+class PreparingConnection(psycopg2.extensions.connection):
+    """Connection that remembers which statements it has prepared."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Prepared statements live as long as the session, across rollbacks
+        self.prepared: Set[str] = set()
+
+    def execute_prepared(self, cursor, statement: PreparedStatement, params=()):
+        if statement.name not in self.prepared:
+            cursor.execute(statement.prepare_sql(self))
+            self.prepared.add(statement.name)
+        try:
+            cursor.execute(statement.execute_sql(), params)
+        except psycopg2.errors.FeatureNotSupported:
+            # "cached plan must not change result type" after a schema change:
+            # drop the connection so its replacement prepares afresh
+            self.close()
+            raise
+
+
+def execute(cursor, statement: PreparedStatement, params=()):
+    """Run a fixed statement, prepared on the cursor's connection when enabled."""
+    conn = cursor.connection
+    if LAKEBASE_PREPARED_STATEMENTS and isinstance(conn, PreparingConnection):
+        conn.execute_prepared(cursor, statement, params)
+    else:
+        cursor.execute(statement.query, params)
+
+
+def connect(host: str = LAKEBASE_HOST):
+    # The token is read per connection, so new connections pick up a
+    # refreshed token while open ones keep working
+    return psycopg2.connect(
+        dbname=LAKEBASE_DB_NAME,
+        user=LAKEBASE_USER,
+        password=credentials.token(),
+        host=host,
+        port="5432",
+        sslmode="require",
+        connection_factory=PreparingConnection,
+    )
+
+
+def connect_replica():
+    return connect(LAKEBASE_REPLICA_HOST)
+
+
+class ConnectionPool:
+    """
+    Bounded pool of Lakebase connections, reused most-recently-used first.
+
+    New connections go through `connect`, so they always use the current
+    token. Connections older than LAKEBASE_CONN_MAX_AGE_SECONDS, closed by
+    the server or left in a failed state are dropped instead of reused.
+    """
+
+    def __init__(self, size: int, max_age: float, connect=connect):
+        self.size = size
+        self.max_age = max_age
+        self._connect = connect
+        self._idle: List[Tuple[float, object]] = []
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.created = 0
+
+    def _new(self):
+        conn = self._connect()
+        self.created += 1
+        return time.monotonic(), conn
+    def acquire(self, timeout: float = LAKEBASE_POOL_TIMEOUT_SECONDS):
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError(f"No Lakebase connection free within {timeout}s")
+        try:
+            with self._lock:
+                entry = self._idle.pop() if self._idle else None
+            if entry is None or entry[1].closed:
+                entry = self._new()
+            return entry
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, entry, discard: bool = False):
+        created_at, conn = entry
+        try:
+            if (
+                discard
+                or conn.closed
+                or time.monotonic() - created_at > self.max_age
+            ):
+                conn.close()
+            else:
+                with self._lock:
+                    self._idle.append(entry)
+        finally:
+            self._slots.release()
+
+    def warm_up(self, count: int = LAKEBASE_POOL_WARM):
+        """Open connections up front so the first requests skip the TLS and auth handshake."""
+        entries = [self.acquire() for _ in range(min(count, self.size))]
+        for entry in entries:
+            self.release(entry)
+        return len(entries)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for _, conn in idle:
+            conn.close()
+
+    def stats(self) -> dict:
+        return {"size": self.size, "idle": len(self._idle), "created": self.created}
+
+
+pool = ConnectionPool(LAKEBASE_POOL_SIZE, LAKEBASE_CONN_MAX_AGE_SECONDS)
+replica_pool = (
+    ConnectionPool(LAKEBASE_POOL_SIZE, LAKEBASE_CONN_MAX_AGE_SECONDS, connect_replica)
+    if LAKEBASE_REPLICA_HOST
+    else None
+)
+
+# WAL position on the primary after a commit, to compare against the replica
+PRIMARY_LSN_QUERY = "SELECT pg_current_wal_lsn()::text"
+
+# WAL position the replica has replayed, and roughly how far behind it is
+# (0 when it has replayed everything it received)
+REPLICA_STATE_QUERY = """
+    SELECT
+        pg_last_wal_replay_lsn()::text,
+        COALESCE(
+            CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END,
+            0
+        )
+    """
+
+
+def parse_lsn(lsn: Optional[str]) -> Optional[int]:
+    """'16/B374D848' -> integer WAL position."""
+    if lsn is None:
+        return None
+    high, low = lsn.split("/")
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+class ReplicaRouter:
+    """
+    Decides whether a read may use the replica.
+
+    Read-your-writes: after each write this process commits, the primary's
+    WAL position is recorded, and the replica serves reads only once its
+    replayed position has reached it (checked on the borrowed connection
+    while it is behind). Staleness from other writers is bounded by the
+    measured lag, re-sampled at most every `check_interval` seconds, which
+    must stay within `max_lag`. Otherwise reads use the primary.
+    """
+
+    def __init__(
+        self, replica: Optional[ConnectionPool], max_lag: float, check_interval: float
+    ):
+        self.replica = replica
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.lag: Optional[float] = None
+        self._checked_at: Optional[float] = None
+        self._write_lsn = 0
+        self._replay_lsn = 0
+        # Reads stay on the primary until then when a write's position is unknown
+        self._pinned_until = 0.0
+        self._lock = threading.Lock()
+        self.replica_reads = 0
+        self.primary_reads = 0
+
+    def wrote(self, conn):
+        """Record the position of a write just committed on `conn` (primary)."""
+        if self.replica is None:
+            return
+        try:
+            conn.autocommit = True
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(PRIMARY_LSN_QUERY)
+                    lsn = parse_lsn(cursor.fetchone()[0])
+            finally:
+                conn.autocommit = False
+        except psycopg2.Error:
+            with self._lock:
+                self._pinned_until = time.monotonic() + self.max_lag
+            return
+        with self._lock:
+            self._write_lsn = max(self._write_lsn, lsn)
+
+    def _due(self) -> bool:
+        return (
+            self._checked_at is None
+            or time.monotonic() - self._checked_at >= self.check_interval
+        )
+
+    def _lag_ok(self) -> bool:
+        return self.lag is not None and self.lag <= self.max_lag
+
+    def _usable(self) -> bool:
+        return (
+            self._lag_ok()
+            and self._replay_lsn >= self._write_lsn
+            and time.monotonic() >= self._pinned_until
+        )
+
+    def _to_primary(self, unavailable: bool = False):
+        with self._lock:
+            if unavailable:
+                self.lag = None
+                self._checked_at = time.monotonic()
+            self.primary_reads += 1
+        return None
+
+    def acquire(self):
+        """A replica connection entry, or None to read from the primary."""
+        if self.replica is None:
+            return self._to_primary()
+        with self._lock:
+            due = self._due()
+            if time.monotonic() < self._pinned_until or (not due and not self._lag_ok()):
+                self.primary_reads += 1
+                return None
+            check = due or self._replay_lsn < self._write_lsn
+        try:
+            entry = self.replica.acquire()
+        except (psycopg2.Error, TimeoutError):
+            return self._to_primary(unavailable=True)
+
+        if check:
+            conn = entry[1]
+            try:
+                with conn.cursor() as cursor:
+                    cursor.execute(REPLICA_STATE_QUERY)
+                    replay_lsn, lag = cursor.fetchone()
+                conn.rollback()
+            except psycopg2.Error:
+                self.replica.release(entry, discard=True)
+                return self._to_primary(unavailable=True)
+            with self._lock:
+                # NULL when the host is not in recovery, i.e. not behind at all
+                replay = parse_lsn(replay_lsn)
+                self._replay_lsn = max(
+                    self._replay_lsn, self._write_lsn if replay is None else replay
+                )
+                self.lag = float(lag)
+                self._checked_at = time.monotonic()
+
+        with self._lock:
+            usable = self._usable()
+            if usable:
+                self.replica_reads += 1
+            else:
+                self.primary_reads += 1
+        if not usable:
+            self.replica.release(entry)
+            return None
+        return entry
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "configured": self.replica is not None,
+                "lag_seconds": self.lag,
+                "replay_behind_writes": self._replay_lsn < self._write_lsn,
+                "replica_reads": self.replica_reads,
+                "primary_reads": self.primary_reads,
+            }
+
+
+router = ReplicaRouter(
+    replica_pool, LAKEBASE_REPLICA_MAX_LAG_SECONDS, LAKEBASE_REPLICA_LAG_CHECK_SECONDS
+)
+
+
+def stats() -> dict:
+    return {
+        "primary": pool.stats(),
+        "replica": replica_pool.stats() if replica_pool is not None else None,
+        "routing": router.stats(),
+    }
+
+
+@contextmanager
+def get_connection(readonly: bool = False):
+    """
+    Pooled Lakebase connection that commits on success and rolls back on error.
+    Read-only work goes to the replica when the router allows it.
+    Time spent inside is attributed to Lakebase when the request is profiled.
+    """
+    with request_profile.waiting(request_profile.LAKEBASE):
+        entry = router.acquire() if readonly else None
+        source = replica_pool if entry is not None else pool
+        if entry is None:
+            entry = pool.acquire()
+        conn = entry[1]
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+            if not readonly:
+                router.wrote(conn)
+        except Exception as e:
+            discard = isinstance(e, (psycopg2.OperationalError, psycopg2.InterfaceError))
+            try:
+                if not conn.closed:
+                    conn.rollback()
+            except psycopg2.Error:
+                discard = True
+            raise
+        finally:
+            source.release(entry, discard=discard)
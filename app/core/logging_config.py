@@ -1,6 +1,6 @@
 import logging
 import os
-import json
+import orjson
 from logging.handlers import RotatingFileHandler
 from datetime import datetime
 
@@ -45,7 +45,9 @@ class JSONFormatter(logging.Formatter):
             ):
                 log_record[key] = value
 
-        return json.dumps(log_record)
+        return orjson.dumps(
+            log_record, default=str, option=orjson.OPT_NON_STR_KEYS
+        ).decode()
 
 
 def _create_handler(file_path, level=logging.DEBUG):
@@ -94,3 +96,15 @@ def get_logger(name):
 
     logger.propagate = False
     return logger
+
+
+def flush_handlers():
+    """Flush every handler of every logger, e.g. before the process exits."""
+    loggers = [logging.getLogger()] + [
+        logger
+        for logger in logging.Logger.manager.loggerDict.values()
+        if isinstance(logger, logging.Logger)
+    ]
+    for logger in loggers:
+        for handler in logger.handlers:
+            handler.flush()
@@ -0,0 +1,11 @@
+from contextvars import ContextVar
+from typing import Optional
+
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+endpoint: ContextVar[Optional[str]] = ContextVar("endpoint", default=None)
+
+# Details of the most recent Databricks call made in this context:
+# {"status_code": ..., "attempts": ..., "headers": {...}}
+last_upstream_call: ContextVar[Optional[dict]] = ContextVar(
+    "last_upstream_call", default=None
+)
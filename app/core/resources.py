@@ -0,0 +1,180 @@
+import asyncio
+import signal
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, List, Tuple
+from starlette.concurrency import run_in_threadpool
+from app.core.config import WARMUP_TIMEOUT_SECONDS, SHUTDOWN_DRAIN_SECONDS
+from app.core.logging_config import flush_handlers, get_logger
+
+logger = get_logger("resources")
+
+STARTING = "starting"
+WARMING = "warming"
+READY = "ready"
+DRAINING = "draining"
+STOPPED = "stopped"
+
+
+class Resources:
+    """
+    Lifecycle of the app's long-lived resources.
+
+    At startup background workers are started and warm-up steps run
+    concurrently; the app reports ready once they have finished (failures are
+    reported, and the resource falls back to lazy creation). At shutdown the
+    app reports draining, waits for in-flight work up to a deadline, then
+    stops workers and closes pools in reverse order of registration.
+    """
+
+    def __init__(self):
+        self.state = STARTING
+        self.warmup: Dict[str, dict] = {}
+        self._warmups: List[Tuple[str, Callable]] = []
+        self._workers: List[Tuple[str, Callable, Callable]] = []
+        self._closers: List[Tuple[str, Callable]] = []
+        self._inflight = 0
+        self._idle = threading.Condition()
+        self.started_at = time.time()
+
+    # --- Registration ---
+    def add_warmup(self, name: str, fn: Callable):
+        self._warmups.append((name, fn))
+
+    def add_worker(self, name: str, start: Callable, stop: Callable):
+        """A background worker; stop() should flush anything it has queued."""
+        self._workers.append((name, start, stop))
+
+    def add_closer(self, name: str, close: Callable):
+        self._closers.append((name, close))
+
+    # --- In-flight work ---
+    @contextmanager
+    def track(self):
+        """Mark work that shutdown should wait for."""
+        with self._idle:
+            self._inflight += 1
+        try:
+            yield
+        finally:
+            with self._idle:
+                self._inflight -= 1
+                if not self._inflight:
+                    self._idle.notify_all()
+
+    def _wait_idle(self, deadline: float) -> bool:
+        with self._idle:
+            return self._idle.wait_for(
+                lambda: not self._inflight, max(0.0, deadline - time.monotonic())
+            )
+
+    # --- Startup ---
+    async def startup(self):
+        self.install_signal_handler()
+        for name, start, _ in self._workers:
+            try:
+                start()
+            except Exception:
+                logger.exception(
+                    "Worker failed to start",
+                    extra={"event": "worker_start_failed", "worker": name},
+                )
+        self.state = WARMING
+        self._warm_task = asyncio.create_task(self._warm_up())
+
+    async def _run_warmup(self, name: str, fn: Callable):
+        start = time.perf_counter()
+        entry = self.warmup[name] = {"status": "running"}
+        try:
+            result = await asyncio.wait_for(
+                run_in_threadpool(fn), WARMUP_TIMEOUT_SECONDS
+            )
+            entry.update(status="ok", result=result)
+        except Exception as e:
+            entry.update(status="failed", error=repr(e))
+            logger.warning(
+                "Warm-up failed",
+                extra={"event": "warmup_failed", "resource": name, "error": repr(e)},
+            )
+        entry["duration_ms"] = int((time.perf_counter() - start) * 1000)
+
+    async def _warm_up(self):
+        await asyncio.gather(
+            *(self._run_warmup(name, fn) for name, fn in self._warmups)
+        )
+        if self.state == WARMING:
+            self.state = READY
+        logger.info("Warm-up finished", extra={"event": "warmup_finished", **self.warmup})
+
+    # --- Shutdown ---
+    def install_signal_handler(self):
+        """
+        Report draining as soon as SIGTERM arrives, then hand the signal to
+        the server's own handler so it stops accepting connections.
+        """
+        if threading.current_thread() is not threading.main_thread():
+            return
+        previous = signal.getsignal(signal.SIGTERM)
+
+        def on_sigterm(signum, frame):
+            self.begin_drain()
+            if callable(previous):
+                previous(signum, frame)
+            elif previous == signal.SIG_DFL:
+                raise SystemExit(128 + signum)
+
+        signal.signal(signal.SIGTERM, on_sigterm)
+
+    def begin_drain(self):
+        """Report not-ready so load balancers stop routing here."""
+        if self.state not in (DRAINING, STOPPED):
+            self.state = DRAINING
+            logger.info(
+                "Draining",
+                extra={"event": "drain_started", "in_flight": self._inflight},
+            )
+
+    async def shutdown(self, deadline_seconds: float = SHUTDOWN_DRAIN_SECONDS):
+        self.begin_drain()
+        deadline = time.monotonic() + deadline_seconds
+        drained = await run_in_threadpool(self._wait_idle, deadline)
+        if not drained:
+            logger.warning(
+                "Drain deadline reached with work in flight",
+                extra={"event": "drain_timeout", "in_flight": self._inflight},
+            )
+        task = getattr(self, "_warm_task", None)
+        if task is not None and not task.done():
+            task.cancel()
+
+        for name, _, stop in reversed(self._workers):
+            await self._safe(name, stop)
+        for name, close in reversed(self._closers):
+            await self._safe(name, close)
+        self.state = STOPPED
+        logger.info("Shutdown complete", extra={"event": "shutdown_complete"})
+        flush_handlers()
+
+    async def _safe(self, name: str, fn: Callable):
+        try:
+            await run_in_threadpool(fn)
+        except Exception:
+            logger.exception(
+                "Shutdown step failed",
+                extra={"event": "shutdown_step_failed", "resource": name},
+            )
+
+    # --- Probes ---
+    def liveness(self) -> dict:
+        return {"status": "alive", "state": self.state}
+
+    def readiness(self) -> Tuple[bool, dict]:
+        return self.state == READY, {
+            "state": self.state,
+            "in_flight": self._inflight,
+            "warmup": self.warmup,
+        }
+
+
+resources = Resources()
@@ -0,0 +1,124 @@
+import os
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Optional, Tuple
+from app.core import credentials
+from app.core.config import (
+    WORKSPACES,
+    DEFAULT_WORKSPACE,
+    DATABRICKS_HOST,
+    DATABRICKS_TOKEN,
+    DATABRICKS_CLIENT_ID,
+    DATABRICKS_CLIENT_SECRET,
+    SQL_WAREHOUSE_ID,
+)
+
+
+@dataclass(frozen=True, slots=True)
+class Workspace:
+    name: str
+    host: str
+    warehouse_id: str
+    products: Tuple[str, ...] = ()
+    # StaticToken or OAuthClientCredentials
+    credentials: Any = field(default=None, compare=False, repr=False)
+
+
+class UnknownWorkspaceError(ValueError):
+    pass
+
+
+def _load() -> Dict[str, Workspace]:
+    registry = {
+        DEFAULT_WORKSPACE: Workspace(
+            DEFAULT_WORKSPACE,
+            DATABRICKS_HOST,
+            SQL_WAREHOUSE_ID,
+            credentials=credentials.provider(
+                DATABRICKS_HOST,
+                DATABRICKS_TOKEN,
+                DATABRICKS_CLIENT_ID,
+                DATABRICKS_CLIENT_SECRET,
+                DEFAULT_WORKSPACE,
+            ),
+        )
+    }
+    for name, entry in WORKSPACES.items():
+        registry[name] = Workspace(
+            name=name,
+            host=entry["host"],
+            warehouse_id=entry.get("warehouse_id", ""),
+            products=tuple(p.lower() for p in entry.get("products", [])),
+            # Secrets stay in the environment, the file only names the variables
+            credentials=credentials.provider(
+                entry["host"],
+                os.getenv(entry.get("token_env", ""), ""),
+                os.getenv(entry.get("client_id_env", ""), ""),
+                os.getenv(entry.get("client_secret_env", ""), ""),
+                name,
+            ),
+        )
+    return registry
+
+
+REGISTRY: Dict[str, Workspace] = _load()
+# product (lower case) -> workspace name
+PRODUCTS: Dict[str, str] = {
+    product: workspace.name
+    for workspace in REGISTRY.values()
+    for product in workspace.products
+}
+
+_current: ContextVar[str] = ContextVar("workspace", default=DEFAULT_WORKSPACE)
+
+
+def get(name: str) -> Workspace:
+    try:
+        return REGISTRY[name]
+    except KeyError:
+        raise UnknownWorkspaceError(f"Unknown workspace {name}") from None
+
+
+def current() -> Workspace:
+    return REGISTRY[_current.get()]
+
+
+def current_name() -> str:
+    return _current.get()
+
+
+def resolve(product: Optional[str] = None, workspace: Optional[str] = None) -> str:
+    """
+    Workspace for a request: an explicit name wins, then the product mapping,
+    then DEFAULT_WORKSPACE.
+    """
+    if workspace:
+        return get(workspace).name
+    if product:
+        return PRODUCTS.get(product.lower(), DEFAULT_WORKSPACE)
+    return DEFAULT_WORKSPACE
+
+
+@contextmanager
+def use_workspace(name: str):
+    """
+    Route Databricks calls made in this context (and threads started with a
+    copy of it) to the named workspace.
+    """
+    token = _current.set(get(name).name)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def start_credentials():
+    """Fetch and keep refreshing OAuth tokens ahead of the first request."""
+    for workspace in REGISTRY.values():
+        workspace.credentials.start()
+
+
+def stop_credentials():
+    for workspace in REGISTRY.values():
+        workspace.credentials.stop()
@@ -1,18 +1,41 @@
+import contextvars
+import posixpath
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List
+import orjson
 import requests
 from urllib.parse import urljoin
 from app.core.config import (
-    DATABRICKS_HOST,
-    DATABRICKS_TOKEN,
     DATABRICKS_ACCOUNT_ID,
-    SQL_WAREHOUSE_ID,
+    DATABRICKS_MAX_CONCURRENCY,
+    WORKSPACE_REQUESTS_PER_SECOND,
+    WORKSPACE_RATE_LIMIT_BURST,
+    CIRCUIT_BREAKER_FAILURES,
+    CIRCUIT_BREAKER_RESET_SECONDS,
+    HEDGING_ENABLED,
 )
 from app.core.logging_config import get_logger
+from app.utils.time_logging import timed_op
+from app.utils import request_profile, traffic
+from app.utils.hedging import hedger
+from app.utils.circuit_breaker import CircuitBreaker
+from app.utils.rate_limiter import RateLimiter
+from app.core import request_context
+from app.core import workspaces
+from app.core.credentials import CredentialError
 
 logger = get_logger("databricks_api")
 
+# Response headers kept for slow-call diagnostics (Databricks request id etc.)
+UPSTREAM_DIAGNOSTIC_HEADERS = (
+    "x-request-id",
+    "x-databricks-org-id",
+    "x-databricks-reason-phrase",
+    "retry-after",
+)
 
-HEADERS = {"Authorization": f"Bearer {DATABRICKS_TOKEN}"}
 
 
 class DatabricksAPIError(Exception):
@@ -22,22 +45,161 @@ class DatabricksAPIError(Exception):
         super().__init__(f"Databricks API Error {status_code}: {message}")
 
 
+class WorkspaceClient:
+    """
+    Per-workspace connection state, so a slow or failing workspace only
+    uses up its own pool, rate limit and circuit breaker.
+    """
+
+    def __init__(self, workspace: workspaces.Workspace):
+        self.workspace = workspace
+        self.credentials = workspace.credentials
+        self.credentials.start()
+        # Pooled keep-alive connections to this workspace
+        self.session = requests.Session()
+        # A plain pooled HTTPAdapter unless traffic is being recorded or replayed
+        self.session.mount(
+            "https://",
+            traffic.adapter(
+                pool_connections=DATABRICKS_MAX_CONCURRENCY,
+                pool_maxsize=DATABRICKS_MAX_CONCURRENCY,
+            ),
+        )
+        self.limiter = RateLimiter(
+            WORKSPACE_REQUESTS_PER_SECOND, WORKSPACE_RATE_LIMIT_BURST
+        )
+        self.breaker = CircuitBreaker(
+            CIRCUIT_BREAKER_FAILURES, CIRCUIT_BREAKER_RESET_SECONDS
+        )
+
+    def stats(self) -> dict:
+        return {
+            "host": self.workspace.host,
+            "circuit": self.breaker.stats(),
+            "credentials": self.credentials.stats(),
+        }
+
+
+_clients: Dict[str, WorkspaceClient] = {}
+_clients_lock = threading.Lock()
+
+
+def client() -> WorkspaceClient:
+    """Client of the current workspace, created on first use."""
+    name = workspaces.current_name()
+    found = _clients.get(name)
+    if found is not None:
+        return found
+    with _clients_lock:
+        if name not in _clients:
+            _clients[name] = WorkspaceClient(workspaces.get(name))
+        return _clients[name]
+
+
+def client_stats() -> Dict[str, dict]:
+    return {name: c.stats() for name, c in list(_clients.items())}
+
+
+def warm_up(connections: int = DATABRICKS_MAX_CONCURRENCY) -> int:
+    """
+    Open pooled keep-alive connections to the current workspace with
+    concurrent lightweight calls, so the first requests skip TLS setup.
+    """
+    if not client().workspace.host:
+        return 0
+    with ThreadPoolExecutor(max_workers=connections) as executor:
+        futures = [
+            executor.submit(
+                contextvars.copy_context().run,
+                _make_request,
+                "GET",
+                "/api/2.1/unity-catalog/catalogs",
+                retries=1,
+                params={"max_results": 1},
+            )
+            for _ in range(connections)
+        ]
+        for future in futures:
+            future.result()
+    return connections
+
+
+def close_clients():
+    """Close every workspace's pooled connections."""
+    with _clients_lock:
+        clients = list(_clients.values())
+        _clients.clear()
+    for c in clients:
+        c.session.close()
+
+
 def _make_request(
-    method: str, endpoint: str, retries: int = 3, backoff: int = 2, **kwargs
+    method: str,
+    endpoint: str,
+    retries: int = 3,
+    backoff: int = 2,
+    hedge: str = None,
+    **kwargs,
 ):
     """
     - method: HTTP method ("GET", "POST", "PUT", "PATCH")
     - endpoint: relative endpoint (not full URL)
     - retries: number of retries on failure
     - backoff: seconds to wait (doubles each retry)
+    - hedge: latency class of an idempotent GET that may be hedged
     """
-    url = urljoin(DATABRICKS_HOST, endpoint)
+    ws = client()
+    url = urljoin(ws.workspace.host, endpoint)
+    extra_headers = kwargs.pop("headers", {})
 
     logger.info(f"Calling Databricks API: {method} {endpoint}")
-    print(url)
+    logger.debug(
+        "Databricks API URL",
+        extra={"event": "databricks_request", "method": method, "url": url},
+    )
+    token_refreshed = False
     for attempt in range(retries):
         try:
-            resp = requests.request(method, url, headers=HEADERS, timeout=30, **kwargs)
+            # Read per call so a refreshed token is used on the pooled connections
+            token = ws.credentials.token()
+        except CredentialError as e:
+            raise DatabricksAPIError(503, str(e))
+        if not ws.breaker.allow():
+            raise DatabricksAPIError(
+                503,
+                f"Workspace {ws.workspace.name} unavailable, circuit open for "
+                f"{ws.breaker.retry_after():.0f}s more",
+            )
+        headers = {"Authorization": f"Bearer {token}", **extra_headers}
+        try:
+            with request_profile.waiting(request_profile.RATE_LIMIT):
+                ws.limiter.acquire()
+            send = lambda: ws.session.request(
+                method, url, headers=headers, timeout=30, **kwargs
+            )
+            with request_profile.waiting(request_profile.DATABRICKS):
+                if hedge and HEDGING_ENABLED and method == "GET":
+                    resp = hedger.call(hedge, send)
+                else:
+                    resp = send()
+            _record_upstream_call(resp, attempt + 1)
+
+            if resp.status_code < 500:
+                ws.breaker.record_success()
+
+            # A token revoked or expired early is replaced once and the call retried
+            if (
+                resp.status_code == 401
+                and ws.credentials.refreshable
+                and not token_refreshed
+                and attempt < retries - 1
+            ):
+                token_refreshed = True
+                try:
+                    ws.credentials.refresh(token)
+                except CredentialError as e:
+                    raise DatabricksAPIError(503, str(e))
+                continue
 
             if resp.ok:
                 logger.info(f"Databricks API response: {resp.status_code} {resp.text}")
@@ -54,21 +216,95 @@ def _make_request(
             raise DatabricksAPIError(resp.status_code, resp.text)
 
         except (requests.RequestException, requests.Timeout) as e:
+            ws.breaker.record_failure()
             if attempt < retries - 1:
                 wait = backoff * (2**attempt)
-                print(
-                    f"[Retry {attempt+1}] Request failed: {e}, retrying in {wait}s..."
+                logger.warning(
+                    f"Databricks API request failed, retrying in {wait}s",
+                    extra={
+                        "event": "databricks_request_retry",
+                        "endpoint": endpoint,
+                        "attempt": attempt + 1,
+                        "retry_in_seconds": wait,
+                        "error": str(e),
+                    },
                 )
-                time.sleep(wait)
+                with request_profile.waiting(request_profile.RETRY_SLEEP):
+                    time.sleep(wait)
                 continue
             status = getattr(getattr(e, "response", None), "status_code", 500)
             raise DatabricksAPIError(status, str(e))
+        finally:
+            # A half-open trial that ended without an outcome (e.g. an
+            # unexpected error) must not keep the circuit blocked
+            ws.breaker.release_trial()
 
     raise DatabricksAPIError(-1, f"Max retries exceeded for endpoint: {endpoint}")
 
 
-def list_catalogs():
-    return _make_request("GET", "/api/2.1/unity-catalog/catalogs")
+def _record_upstream_call(resp: requests.Response, attempts: int):
+    request_context.last_upstream_call.set(
+        {
+            "status_code": resp.status_code,
+            "attempts": attempts,
+            "headers": {
+                name: resp.headers[name]
+                for name in UPSTREAM_DIAGNOSTIC_HEADERS
+                if name in resp.headers
+            },
+        }
+    )
+
+
+def _page_params(page_token: str = None, max_results: int = None, **params):
+    if page_token:
+        params["page_token"] = page_token
+    if max_results:
+        params["max_results"] = max_results
+    return params or None
+
+
+def list_catalogs(page_token: str = None, max_results: int = None):
+    params = _page_params(page_token, max_results)
+    return _make_request(
+        "GET", "/api/2.1/unity-catalog/catalogs", hedge="list_catalogs", params=params
+    )
+
+
+def list_schemas(catalog_name: str, page_token: str = None, max_results: int = None):
+    params = _page_params(page_token, max_results, catalog_name=catalog_name)
+    return _make_request(
+        "GET", "/api/2.1/unity-catalog/schemas", hedge="list_schemas", params=params
+    )
+
+
+def list_volumes(
+    catalog_name: str,
+    schema_name: str,
+    page_token: str = None,
+    max_results: int = None,
+):
+    params = _page_params(
+        page_token, max_results, catalog_name=catalog_name, schema_name=schema_name
+    )
+    return _make_request(
+        "GET", "/api/2.1/unity-catalog/volumes", hedge="list_volumes", params=params
+    )
+
+
+def list_table_summaries(
+    catalog_name: str, page_token: str = None, max_results: int = None
+):
+    """
+    Full names of every table in a catalog, without per-schema calls.
+    """
+    params = _page_params(page_token, max_results, catalog_name=catalog_name)
+    return _make_request(
+        "GET",
+        "/api/2.1/unity-catalog/table-summaries",
+        hedge="list_table_summaries",
+        params=params,
+    )
 
 
 def create_schema(schema_name: str, catalog_name: str):
@@ -92,13 +328,93 @@ def create_directory(
     directory_path = (
         f"/Volumes/{catalog_name}/{schema_name}/{volume_name}/{directory_name}"
     )
+    return create_directory_path(directory_path)
+
+
+def create_directory_path(directory_path: str):
     endpoint = f"/api/2.0/fs/directories{directory_path}"
     return _make_request("PUT", endpoint)
 
 
+def normalize_directory_paths(paths: Iterable[str]) -> Dict[str, str]:
+    """
+    Map each normalized, de-duplicated path to the path whose PUT creates it.
+    The Files API creates missing parents, so a parent maps to one of its
+    requested leaf descendants and only leaf paths need a request.
+    """
+    normalized = sorted(
+        {posixpath.normpath("/" + path.strip("/")) for path in paths if path.strip("/")},
+        key=lambda path: path.split("/"),
+    )
+    creators: Dict[str, str] = {}
+    # Sorting by path components places descendants directly after their
+    # ancestor, so walking backwards visits leaves before the parents they cover.
+    leaf = None
+    for path in reversed(normalized):
+        if leaf is not None and leaf.startswith(path + "/"):
+            creators[path] = creators[leaf]
+        else:
+            creators[path] = path
+        leaf = path
+    return {path: creators[path] for path in normalized}
+
+
+def create_directories(
+    paths: Iterable[str], max_concurrency: int = DATABRICKS_MAX_CONCURRENCY
+) -> Dict[str, dict]:
+    """
+    Create many directories with concurrent Files API calls.
+    Returns a result per normalized path; a failure never aborts the others.
+    """
+    creators = normalize_directory_paths(paths)
+    leaves: List[str] = sorted(set(creators.values()))
+
+    def _create(path: str) -> dict:
+        try:
+            with timed_op(logger=logger, event="create_directory", extra={"path": path}):
+                create_directory_path(path)
+            return {"status": "success"}
+        except DatabricksAPIError as e:
+            return {"status": "error", "status_code": e.status_code, "message": e.message}
+
+    results: Dict[str, dict] = {}
+    if leaves:
+        workers = max(1, min(max_concurrency, len(leaves)))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {
+                path: executor.submit(contextvars.copy_context().run, _create, path)
+                for path in leaves
+            }
+            results = {path: future.result() for path, future in futures.items()}
+
+    report = {}
+    for path, creator in creators.items():
+        report[path] = dict(results[creator])
+        if creator != path:
+            report[path]["created_by"] = creator
+    return report
+
+
+def upload_file(file_path: str, contents: bytes, overwrite: bool = False):
+    endpoint = f"/api/2.0/fs/files{file_path}"
+    return _make_request(
+        "PUT",
+        endpoint,
+        params={"overwrite": str(overwrite).lower()},
+        data=contents,
+        headers={"Content-Type": "application/octet-stream"},
+    )
+
+
 def grant_permissions(object_type: str, full_name: str, access_payload: dict):
     endpoint = f"/api/2.1/unity-catalog/permissions/{object_type}/{full_name}"
-    return _make_request("PATCH", endpoint, json=access_payload)
+    # Change lists can be large; orjson also encodes the shared privilege tuples
+    return _make_request(
+        "PATCH",
+        endpoint,
+        data=orjson.dumps(access_payload),
+        headers={"Content-Type": "application/json"},
+    )
 
 
 def list_groups(filter_name: str = None):
@@ -108,7 +424,7 @@ def list_groups(filter_name: str = None):
     endpoint = f"/api/2.0/accounts/{DATABRICKS_ACCOUNT_ID}/scim/v2/Groups"
     if filter_name:
         endpoint += f"?filter=displayName eq '{filter_name}'"
-    return _make_request("GET", endpoint)
+    return _make_request("GET", endpoint, hedge="list_groups")
 
 
 def create_group(group_name: str):
@@ -147,18 +463,42 @@ def ensure_group_exists(group_name: str, retries: int = 3, backoff: int = 2):
 
 def get_tables(table_fullname=None):
     if table_fullname:
-        return _make_request("GET", f"/api/2.1/unity-catalog/tables/{table_fullname}")
-    return _make_request("GET", "/api/2.1/unity-catalog/tables")
+        return _make_request(
+            "GET", f"/api/2.1/unity-catalog/tables/{table_fullname}", hedge="get_table"
+        )
+    return _make_request("GET", "/api/2.1/unity-catalog/tables", hedge="list_tables")
 
 
-def execute_statement(statement: str):
+def execute_statement(
+    statement: str,
+    wait_timeout: str = "5s",
+    on_wait_timeout: str = "CONTINUE",
+    disposition: str = "INLINE",
+    format: str = "JSON_ARRAY",
+    parameters: list = None,
+):
     data = {
         "statement": statement,
-        "wait_timeout": "5s",
-        "warehouse_id": SQL_WAREHOUSE_ID,
+        "wait_timeout": wait_timeout,
+        "on_wait_timeout": on_wait_timeout,
+        "disposition": disposition,
+        "format": format,
+        "warehouse_id": workspaces.current().warehouse_id,
     }
+    if parameters:
+        data["parameters"] = parameters
     return _make_request("POST", "/api/2.0/sql/statements", json=data)
 
 
 def sql_status(statement_id: str):
     return _make_request("GET", f"/api/2.0/sql/statements/{statement_id}")
+
+
+def cancel_statement(statement_id: str):
+    return _make_request("POST", f"/api/2.0/sql/statements/{statement_id}/cancel")
+
+
+def get_statement_result_chunk(statement_id: str, chunk_index: int):
+    return _make_request(
+        "GET", f"/api/2.0/sql/statements/{statement_id}/result/chunks/{chunk_index}"
+    )
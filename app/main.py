@@ -1,30 +1,191 @@
 from tokenize import group
-from fastapi import FastAPI, HTTPException, Body, Query
+from fastapi import FastAPI, HTTPException, Body, Query, Header, Request, Response
 from app.models.study_payload import StudyPayload, Metadata
 from app.models.snapshot_payload import CreateSnapshotPayload
 from app.models.analysis_payload import AnalysisPayload
 from app.services.study_resources import process_payload
-from app.services.create_snapshot import create_snapshot
+from app.services.create_snapshot import create_snapshot, snapshot_status
 from app.services.analysis_setup import process_analysis_payload
-from app.databricks_api import DatabricksAPIError
-from app.services.capture_metadata import insert_metadata
-from app.services.fetch_metadata import fetch_metadata
+from app.databricks_api import (
+    DatabricksAPIError,
+    client_stats,
+    close_clients,
+    warm_up as warm_up_databricks,
+)
+from app.core import lakebase
+from app.core.lakebase import pool as lakebase_pool, replica_pool
+from app.core.resources import resources
+from app.utils import traffic
+from app.utils.hedging import hedger
+from app.services import workspace_state
+from app.core.workspaces import (
+    UnknownWorkspaceError,
+    resolve,
+    start_credentials,
+    stop_credentials,
+    use_workspace,
+)
+from app.services.capture_metadata import outbox as audit_outbox, record_audit
+from app.services.fetch_metadata import fetch_metadata_json
+from app.services.metadata_aggregates import get_cached_aggregates
+from app.middleware.profiling import ProfilingMiddleware
+from app.middleware.request_context import RequestContextMiddleware
+from app.middleware.admission import AdmissionControlMiddleware, admission_stats
+from app.middleware.compression import CompressionMiddleware
+from app.core.config import (
+    AGGREGATES_CACHE_TTL_SECONDS,
+    PROFILING_ENABLED,
+    LATENCY_BUDGETS_MS,
+    ADMISSION_CONTROL_ENABLED,
+    COMPRESSION_ENABLED,
+    RETENTION_ENABLED,
+    IDEMPOTENCY_ENABLED,
+    WORKSPACE_INDEX_ENABLED,
+    AUDIT_OUTBOX_ENABLED,
+)
+from app.utils import latency_stats
+from app.services.provisioning_plan import build_study_plan, build_analysis_plan
+from app.services.plan_estimate import plan_response
+from app.services.ingest import ingest
+from app.services.grant_batcher import batcher as grant_batcher
+from app.services.workspace_index import index as workspace_index
+from app.services.idempotency import (
+    IdempotencyConflict,
+    IdempotencyMismatch,
+    request_hash,
+    request_key,
+    run_idempotent,
+)
 from app.core.logging_config import get_logger
+from app.utils.responses import DuplexStreamingResponse, ORJSONResponse
+from app.services.metadata_retention import (
+    run_retention,
+    start_retention_scheduler,
+    stop_retention_scheduler,
+)
+from contextlib import asynccontextmanager
 import time
 
-app = FastAPI()
+
+# Workers start in this order and stop in reverse; pools are closed last
+resources.add_worker("credentials", start_credentials, stop_credentials)
+if RETENTION_ENABLED:
+    resources.add_worker(
+        "retention", start_retention_scheduler, stop_retention_scheduler
+    )
+if WORKSPACE_INDEX_ENABLED:
+    resources.add_worker(
+        "workspace_index", workspace_index.start, workspace_index.stop
+    )
+if AUDIT_OUTBOX_ENABLED:
+    # Stopped after request drain, so the last audit rows are shipped
+    resources.add_worker("audit_outbox", audit_outbox.start, audit_outbox.stop)
+resources.add_warmup("databricks_pool", warm_up_databricks)
+resources.add_warmup("catalog_cache", workspace_state.warm_up)
+resources.add_warmup("lakebase_pool", lakebase_pool.warm_up)
+if replica_pool is not None:
+    resources.add_warmup("lakebase_replica_pool", replica_pool.warm_up)
+resources.add_closer("databricks_pool", close_clients)
+resources.add_closer("lakebase_pool", lakebase_pool.close)
+if replica_pool is not None:
+    resources.add_closer("lakebase_replica_pool", replica_pool.close)
+resources.add_closer("traffic_recording", traffic.close)
+resources.add_closer("hedging", hedger.shutdown)
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await resources.startup()
+    yield
+    await resources.shutdown()
+
+
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
 logger = get_logger("main")
 
+# Middleware added last runs first: request context, then admission, then
+# profiling, with compression closest to the endpoints
+if COMPRESSION_ENABLED:
+    app.add_middleware(CompressionMiddleware)
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+if ADMISSION_CONTROL_ENABLED:
+    app.add_middleware(AdmissionControlMiddleware)
+app.add_middleware(RequestContextMiddleware)
+
+
+def select_workspace(product: str, workspace: str | None) -> str:
+    """
+    Workspace a request runs against: its workspace field, or the one
+    mapped to its product
+    """
+    try:
+        return resolve(product, workspace)
+    except UnknownWorkspaceError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def run_once(route, idempotency_key, http_response: Response, fn, *bodies: bytes):
+    """
+    Run fn at most once per idempotency key (the Idempotency-Key header, or a
+    hash of the route and body); duplicates get the original result, and a
+    key reused with a different body is rejected.
+    """
+    with resources.track():
+        if not IDEMPOTENCY_ENABLED:
+            return fn()
+        result, replayed = run_idempotent(
+            request_key(route, idempotency_key, *bodies),
+            request_hash(route, *bodies),
+            fn,
+        )
+    if replayed:
+        http_response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+
+def planned(build_plan, diff: bool):
+    """
+    Plan-only response. With diff the workspace state is listed, so
+    Databricks errors are mapped to their status like on the execution path.
+    """
+    try:
+        return plan_response(build_plan(), diff=diff)
+    except DatabricksAPIError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
 
 @app.post("/study-setup")
-def study_setup(payload: StudyPayload = Body(...), payload2: Metadata = Body(...)):
-    logger.info(f"Incoming payload for processing: {payload.dict()}")
+def study_setup(
+    payload: StudyPayload = Body(...),
+    payload2: Metadata = Body(...),
+    plan_only: bool = Query(False),
+    diff: bool = Query(False),
+    http_response: Response = None,
+    idempotency_key: str | None = Header(None),
+):
+    logger.info(f"Incoming payload for processing: {payload.json_text()}")
+    workspace = select_workspace(
+        payload.business_metadata.product_name, payload.workspace
+    )
+
+    if plan_only:
+        with use_workspace(workspace):
+            return planned(lambda: build_study_plan(payload), diff)
 
     start = time.perf_counter()
     response = None
     http_status = None
     try:
-        response = process_payload(payload)
+        with use_workspace(workspace):
+            response = run_once(
+                "/study-setup",
+                idempotency_key,
+                http_response,
+                lambda: process_payload(payload),
+                payload.json_bytes(),
+                payload2.model_dump_json().encode(),
+            )
         http_status = 200
 
         # Log success with full response
@@ -55,6 +216,16 @@ def study_setup(payload: StudyPayload = Body(...), payload2: Metadata = Body(...
 
         raise HTTPException(status_code=http_status, detail=e.message)
 
+    except IdempotencyConflict as e:
+        response = {"status": "Conflict", "message": str(e)}
+        http_status = 409
+        raise HTTPException(status_code=409, detail=str(e))
+
+    except IdempotencyMismatch as e:
+        response = {"status": "Unprocessable Entity", "message": str(e)}
+        http_status = 422
+        raise HTTPException(status_code=422, detail=str(e))
+
     except Exception as e:
         response = {"status": "Error", "message": str(e)}
         http_status = 500
@@ -71,34 +242,39 @@ def study_setup(payload: StudyPayload = Body(...), payload2: Metadata = Body(...
 
         raise HTTPException(status_code=500, detail=str(e))
 
-    # finally:
-    #     end = time.perf_counter()
-    #     meta_start = time.perf_counter()
-    #     insert_metadata(
-    #         payload,
-    #         response,
-    #         http_status,
-    #         error=None if http_status == 200 else response["message"],
-    #         request_by=payload2.request_by,
-    #         description=payload2.description,
-    #         business_justification=payload2.business_justification,
-    #         api_response_time=(end - start) * 1000,
-    #     )
-    #     meta_end = time.perf_counter()
-    #     meta_duration_ms = (meta_end - meta_start) * 1000
-
-    #     print(f"Insert into Lakebase (metadata) took {meta_duration_ms} ms")
+    finally:
+        record_audit(payload, response, http_status, start, payload2)
 
 
 @app.post("/analysis-setup")
-def analysis_setup(payload: AnalysisPayload):
-    logger.info(f"Incoming payload for processing: {payload.dict()}")
+def analysis_setup(
+    payload: AnalysisPayload,
+    plan_only: bool = Query(False),
+    diff: bool = Query(False),
+    http_response: Response = None,
+    idempotency_key: str | None = Header(None),
+):
+    logger.info(f"Incoming payload for processing: {payload.json_text()}")
+    workspace = select_workspace(
+        payload.business_metadata.product_name, payload.workspace
+    )
+
+    if plan_only:
+        with use_workspace(workspace):
+            return planned(lambda: build_analysis_plan(payload), diff)
 
     start = time.perf_counter()
     response = None
     http_status = None
     try:
-        response = process_analysis_payload(payload)
+        with use_workspace(workspace):
+            response = run_once(
+                "/analysis-setup",
+                idempotency_key,
+                http_response,
+                lambda: process_analysis_payload(payload),
+                payload.json_bytes(),
+            )
         http_status = 200
 
         # Log success with full response
@@ -129,6 +305,16 @@ def analysis_setup(payload: AnalysisPayload):
 
         raise HTTPException(status_code=http_status, detail=e.message)
 
+    except IdempotencyConflict as e:
+        response = {"status": "Conflict", "message": str(e)}
+        http_status = 409
+        raise HTTPException(status_code=409, detail=str(e))
+
+    except IdempotencyMismatch as e:
+        response = {"status": "Unprocessable Entity", "message": str(e)}
+        http_status = 422
+        raise HTTPException(status_code=422, detail=str(e))
+
     except Exception as e:
         response = {"status": "Error", "message": str(e)}
         http_status = 500
@@ -145,23 +331,62 @@ def analysis_setup(payload: AnalysisPayload):
 
         raise HTTPException(status_code=500, detail=str(e))
 
-    # finally:
-    #     end = time.perf_counter()
-    #     meta_start = time.perf_counter()
-    #     insert_metadata(
-    #         payload,
-    #         response,
-    #         http_status,
-    #         error=None if http_status == 200 else response["message"],
-    #         request_by=payload2.request_by,
-    #         description=payload2.description,
-    #         business_justification=payload2.business_justification,
-    #         api_response_time=(end - start) * 1000,
-    #     )
-    #     meta_end = time.perf_counter()
-    #     meta_duration_ms = (meta_end - meta_start) * 1000
-
-    #     print(f"Insert into Lakebase (metadata) took {meta_duration_ms} ms")
+    finally:
+        record_audit(payload, response, http_status, start)
+
+
+@app.get("/health/live")
+def health_live():
+    """
+    Liveness: the process is up and serving
+    """
+    return resources.liveness()
+
+
+@app.get("/health/ready")
+def health_ready():
+    """
+    Readiness: warm-up finished and not draining
+    """
+    ready, body = resources.readiness()
+    return ORJSONResponse(body, status_code=200 if ready else 503)
+
+
+@app.post("/ingest")
+async def ingest_ndjson(request: Request):
+    """
+    Bulk provisioning: one StudyPayload or AnalysisPayload per NDJSON line,
+    answered with one NDJSON result per line as each finishes
+    """
+    return DuplexStreamingResponse(
+        ingest(request.stream()), media_type="application/x-ndjson"
+    )
+
+
+@app.post("/study-setup/plan")
+def study_setup_plan(
+    payload: StudyPayload = Body(..., embed=True), diff: bool = Query(False)
+):
+    """
+    Dry run: return the provisioning plan and cost estimate for a study
+    """
+    workspace = select_workspace(
+        payload.business_metadata.product_name, payload.workspace
+    )
+    with use_workspace(workspace):
+        return planned(lambda: build_study_plan(payload), diff)
+
+
+@app.post("/analysis-setup/plan")
+def analysis_setup_plan(payload: AnalysisPayload, diff: bool = Query(False)):
+    """
+    Dry run: return the provisioning plan and cost estimate for an analysis
+    """
+    workspace = select_workspace(
+        payload.business_metadata.product_name, payload.workspace
+    )
+    with use_workspace(workspace):
+        return planned(lambda: build_analysis_plan(payload), diff)
 
 
 @app.get("/get-metadata")
@@ -171,8 +396,8 @@ def get_metadata():
     """
     start = time.perf_counter()
     try:
-        rows = fetch_metadata()
-        if not rows:
+        count, data = fetch_metadata_json()
+        if not count:
             raise HTTPException(status_code=404, detail="No metadata found")
     except Exception as e:
         raise HTTPException(
@@ -183,19 +408,159 @@ def get_metadata():
         latency_ms = int((end - start) * 1000)
         print(f"Lakebase read operation took {latency_ms} ms")
 
-    return {"latency_ms": latency_ms, "count": len(rows), "data": rows}
+    # Rows are already encoded, so the envelope is assembled around them
+    body = b'{"latency_ms":%d,"count":%d,"data":%s}' % (latency_ms, count, data)
+    return Response(content=body, media_type="application/json")
+
+
+@app.get("/get-metadata/aggregates")
+def get_metadata_aggregates(
+    minutes: int = Query(60, ge=1, le=7 * 24 * 60),
+    by_study: bool = Query(False),
+    if_none_match: str | None = Header(None),
+):
+    """
+    Request counts, error rates and average api_response_time per product,
+    served from a short-lived cache; unchanged results return 304
+    """
+    try:
+        etag, body = get_cached_aggregates(minutes, by_study)
+    except Exception as e:
+        raise HTTPException(
+            status_code=500, detail=f"Error fetching metadata aggregates: {str(e)}"
+        )
+
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"max-age={int(AGGREGATES_CACHE_TTL_SECONDS)}",
+    }
+    if if_none_match and etag in [tag.strip() for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 
 @app.post("/create-snapshot")
-def create_snpshot(payload: CreateSnapshotPayload):
+def create_snpshot(
+    payload: CreateSnapshotPayload,
+    http_response: Response = None,
+    idempotency_key: str | None = Header(None),
+):
     """
     Create a snapshot of a table at a specific timestamp
     """
+    workspace = select_workspace(payload.product, payload.workspace)
     try:
         # Assuming dbx.create_snapshot is a function that creates the snapshot
-        result = create_snapshot(payload)
-        return {"status": "Snapshot created successfully", "details": result}
+        with use_workspace(workspace):
+            return run_once(
+                "/create-snapshot",
+                idempotency_key,
+                http_response,
+                lambda: {
+                    "status": (
+                        "Snapshot created successfully"
+                        if payload.wait
+                        else "Snapshot submitted"
+                    ),
+                    "details": create_snapshot(payload),
+                },
+                payload.model_dump_json().encode(),
+            )
     except DatabricksAPIError as e:
         raise HTTPException(status_code=e.status_code, detail=e.message)
+    except IdempotencyConflict as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except IdempotencyMismatch as e:
+        raise HTTPException(status_code=422, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.get("/create-snapshot/{statement_id}")
+def get_snapshot_status(statement_id: str, workspace: str | None = Query(None)):
+    """
+    State of a snapshot clone, with files and bytes copied once it finished
+    """
+    try:
+        with use_workspace(select_workspace(None, workspace)):
+            return snapshot_status(statement_id)
+    except DatabricksAPIError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
+
+@app.get("/admin/latency")
+def admin_latency():
+    """
+    Rolling latency percentiles per timed_op event, with their budgets
+    """
+    stats = latency_stats.snapshot()
+    for event, event_stats in stats.items():
+        event_stats["budget_ms"] = LATENCY_BUDGETS_MS.get(event)
+    return stats
+
+
+@app.get("/admin/admission")
+def admin_admission():
+    """
+    Per-route concurrency, queue depth, queue wait and rejection counts
+    """
+    return admission_stats()
+
+
+@app.get("/admin/workspaces")
+def admin_workspaces():
+    """
+    Circuit state of every workspace client created so far
+    """
+    return client_stats()
+
+
+@app.get("/admin/grant-batching")
+def admin_grant_batching():
+    """
+    Grant calls received versus PATCH requests actually sent
+    """
+    return grant_batcher.stats()
+
+
+@app.get("/admin/hedging")
+def admin_hedging():
+    """
+    Hedged GETs: calls, hedges fired and won, hedges skipped over budget
+    """
+    return hedger.stats()
+
+
+@app.get("/admin/audit-outbox")
+def admin_audit_outbox():
+    """
+    Audit rows appended locally versus shipped to Lakebase, and the backlog
+    """
+    return audit_outbox.stats()
+
+
+@app.get("/admin/lakebase")
+def admin_lakebase():
+    """
+    Primary and replica pools, replica lag and where reads were routed
+    """
+    return lakebase.stats()
+
+
+@app.get("/admin/workspace-index")
+def admin_workspace_index():
+    """
+    Freshness and size of the in-memory workspace index
+    """
+    return workspace_index.stats()
+
+
+@app.post("/admin/retention/run")
+def admin_retention_run():
+    """
+    Run the metadata retention job now instead of waiting for the schedule
+    """
+    try:
+        return run_retention()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Retention run failed: {str(e)}")
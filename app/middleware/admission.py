@@ -0,0 +1,205 @@
+import asyncio
+import math
+from collections import deque
+from time import perf_counter
+from typing import Dict
+import orjson
+from app.core.config import (
+    ADMISSION_LIMITS,
+    ADMISSION_PRIORITY_HEADER,
+    ADMISSION_LANES,
+)
+from app.core.logging_config import get_logger
+from app.utils import latency_stats
+
+logger = get_logger("admission")
+
+# Weight of the newest request in the per-route service time average
+SERVICE_TIME_ALPHA = 0.2
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, status_code: int, message: str, retry_after: int):
+        self.status_code = status_code
+        self.message = message
+        self.retry_after = retry_after
+        super().__init__(message)
+
+
+class RouteLimiter:
+    """
+    Concurrency limit for one route with a bounded, prioritised wait queue.
+    Lives on the event loop, so no locking is needed.
+    """
+
+    def __init__(
+        self,
+        route: str,
+        concurrency: int,
+        queue_size: int,
+        queue_timeout_seconds: float,
+    ):
+        self.route = route
+        self.concurrency = concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout_seconds
+        self.active = 0
+        self.waiters: Dict[str, deque] = {lane: deque() for lane in ADMISSION_LANES}
+        self.service_time = 1.0
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+
+    def waiting(self) -> int:
+        return sum(len(queue) for queue in self.waiters.values())
+
+    def retry_after(self) -> int:
+        """
+        Seconds until the current backlog should have drained.
+        """
+        backlog = self.waiting() + 1
+        return max(1, math.ceil(self.service_time * backlog / self.concurrency))
+
+    async def acquire(self, lane: str) -> float:
+        """
+        Wait for a slot and return the time spent queued in seconds.
+        """
+        if self.active < self.concurrency and not self.waiting():
+            self.active += 1
+            self.admitted += 1
+            return 0.0
+
+        if self.waiting() >= self.queue_size:
+            self.rejected_queue_full += 1
+            raise AdmissionRejected(
+                429, f"Too many queued requests for {self.route}", self.retry_after()
+            )
+
+        future = asyncio.get_running_loop().create_future()
+        queue = self.waiters[lane]
+        queue.append(future)
+        start = perf_counter()
+        try:
+            await asyncio.wait_for(future, self.queue_timeout)
+        except asyncio.TimeoutError:
+            if future.done() and not future.cancelled():
+                # A slot was handed over just as the wait expired
+                self.admitted += 1
+                return perf_counter() - start
+            if future in queue:
+                queue.remove(future)
+            self.rejected_timeout += 1
+            raise AdmissionRejected(
+                503,
+                f"Timed out after {self.queue_timeout}s waiting for {self.route}",
+                self.retry_after(),
+            )
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()
+            elif future in queue:
+                queue.remove(future)
+            raise
+        self.admitted += 1
+        return perf_counter() - start
+
+    def release(self, service_seconds: float = None):
+        if service_seconds is not None:
+            self.service_time += SERVICE_TIME_ALPHA * (service_seconds - self.service_time)
+        # Hand the slot straight to the highest-priority waiter
+        for lane in ADMISSION_LANES:
+            queue = self.waiters[lane]
+            while queue:
+                future = queue.popleft()
+                if not future.done():
+                    future.set_result(None)
+                    return
+        self.active -= 1
+
+    def stats(self) -> dict:
+        return {
+            "concurrency": self.concurrency,
+            "queue_size": self.queue_size,
+            "active": self.active,
+            "waiting": {lane: len(queue) for lane, queue in self.waiters.items()},
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "avg_service_seconds": round(self.service_time, 3),
+            "queue_wait": latency_stats.snapshot_event(f"queue_wait {self.route}"),
+        }
+
+
+limiters: Dict[str, RouteLimiter] = {
+    route: RouteLimiter(route, **limits) for route, limits in ADMISSION_LIMITS.items()
+}
+
+
+def admission_stats() -> Dict[str, dict]:
+    return {route: limiter.stats() for route, limiter in limiters.items()}
+
+
+class AdmissionControlMiddleware:
+    """
+    Applies the per-route limits in ADMISSION_LIMITS. Saturated routes answer
+    429 (queue full) or 503 (queue wait timed out) with Retry-After instead of
+    piling more work onto the threadpool and Databricks.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.priority_header = ADMISSION_PRIORITY_HEADER.encode()
+
+    def _lane(self, scope) -> str:
+        for name, value in scope.get("headers", []):
+            if name == self.priority_header:
+                lane = value.decode().strip().lower()
+                if lane in ADMISSION_LANES:
+                    return lane
+        return ADMISSION_LANES[0]
+
+    async def __call__(self, scope, receive, send):
+        limiter = limiters.get(scope["path"]) if scope["type"] == "http" else None
+        if limiter is None:
+            await self.app(scope, receive, send)
+            return
+
+        lane = self._lane(scope)
+        try:
+            waited = await limiter.acquire(lane)
+        except AdmissionRejected as e:
+            logger.warning(
+                "Request rejected by admission control",
+                extra={
+                    "event": "admission_rejected",
+                    "route": limiter.route,
+                    "lane": lane,
+                    "status_code": e.status_code,
+                    "retry_after": e.retry_after,
+                },
+            )
+            await _reject(send, e)
+            return
+
+        latency_stats.record(f"queue_wait {limiter.route}", waited * 1000)
+        start = perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limiter.release(perf_counter() - start)
+
+
+async def _reject(send, error: AdmissionRejected):
+    body = orjson.dumps({"detail": error.message})
+    await send(
+        {
+            "type": "http.response.start",
+            "status": error.status_code,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"retry-after", str(error.retry_after).encode()),
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": body})
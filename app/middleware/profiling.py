@@ -0,0 +1,83 @@
+import os
+import random
+from datetime import datetime
+import orjson
+from starlette.concurrency import run_in_threadpool
+from app.core.config import (
+    PROFILE_SAMPLE_RATE,
+    PROFILE_DEBUG_HEADER,
+    PROFILE_DEBUG_TOKEN,
+    PROFILE_INTERVAL_MS,
+    PROFILE_DIR,
+)
+from app.core.logging_config import get_logger
+from app.utils import request_profile
+
+logger = get_logger("profiling")
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a sample of requests (PROFILE_SAMPLE_RATE) and every request that
+    carries the debug header. Each profile is written to PROFILE_DIR as a
+    collapsed-stack file for flame graphs plus a JSON time split.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.header = PROFILE_DEBUG_HEADER.encode()
+
+    def _should_profile(self, scope) -> bool:
+        for name, value in scope.get("headers", []):
+            if name == self.header:
+                return not PROFILE_DEBUG_TOKEN or value.decode() == PROFILE_DEBUG_TOKEN
+        return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self._should_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = request_profile.RequestProfile(PROFILE_INTERVAL_MS)
+        token = request_profile.activate(profile)
+        status = {}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                status["code"] = message["status"]
+            await send(message)
+
+        profile.start()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            profile.stop()
+            request_profile.deactivate(token)
+            await run_in_threadpool(
+                _write_profile, profile, scope["method"], scope["path"], status.get("code")
+            )
+
+
+def _write_profile(profile: request_profile.RequestProfile, method, path, status_code):
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    name = f"{datetime.utcnow():%Y%m%dT%H%M%S%f}_{method}_{path.strip('/').replace('/', '_') or 'root'}"
+    base = os.path.join(PROFILE_DIR, name)
+
+    with open(f"{base}.folded", "w", encoding="utf-8") as f:
+        f.write(profile.folded())
+
+    summary = {
+        "method": method,
+        "path": path,
+        "status_code": status_code,
+        "samples": profile.samples,
+        "interval_ms": profile.interval * 1000,
+        "time_split_ms": profile.time_split(),
+    }
+    with open(f"{base}.json", "wb") as f:
+        f.write(orjson.dumps(summary, option=orjson.OPT_INDENT_2))
+
+    logger.info(
+        "Request profile written",
+        extra={"event": "request_profiled", "profile": f"{base}.folded", **summary},
+    )
@@ -0,0 +1,43 @@
+import uuid
+from app.core import request_context
+
+REQUEST_ID_HEADER = b"x-request-id"
+
+
+class RequestContextMiddleware:
+    """
+    Assigns every request an id (the caller's X-Request-ID, or a new one),
+    exposes it and the endpoint through app.core.request_context and echoes
+    the id back in the response headers.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        rid = None
+        for name, value in scope.get("headers", []):
+            if name == REQUEST_ID_HEADER:
+                rid = value.decode()
+                break
+        rid = rid or uuid.uuid4().hex
+
+        id_token = request_context.request_id.set(rid)
+        endpoint_token = request_context.endpoint.set(f"{scope['method']} {scope['path']}")
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = list(message.get("headers", [])) + [
+                    (REQUEST_ID_HEADER, rid.encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            request_context.request_id.reset(id_token)
+            request_context.endpoint.reset(endpoint_token)
@@ -1,5 +1,6 @@
 from pydantic import BaseModel, EmailStr
-from typing import List, Dict
+from typing import List, Dict, Optional
+from app.models.base import PayloadModel
 
 
 class BusinessMetadata(BaseModel):
@@ -21,7 +22,9 @@ class AccessControl(BaseModel):
     business_action: List[str]
 
 
-class AnalysisPayload(BaseModel):
+class AnalysisPayload(PayloadModel):
     business_metadata: BusinessMetadata
     storage_setup: StorageSetup
     access_controls: Dict[str, AccessControl]
+    # Target workspace; defaults to the one mapped to the product
+    workspace: Optional[str] = None
@@ -0,0 +1,35 @@
+from typing import Any, Dict, Optional
+import orjson
+from pydantic import BaseModel, ConfigDict, PrivateAttr
+
+
+class PayloadModel(BaseModel):
+    """
+    Base for incoming request payloads.
+
+    Payloads are frozen once validated, so the JSON encoding produced by
+    pydantic-core is computed on first use and reused for logging and
+    auditing instead of calling .dict() at every step.
+
+    frozen=True only blocks assigning fields of the payload itself: nested
+    models and lists stay mutable, and changing them would leave the cached
+    encoding stale. Treat payloads as read-only after validation.
+    """
+
+    model_config = ConfigDict(frozen=True)
+
+    _json_cache: Optional[bytes] = PrivateAttr(default=None)
+    _dict_cache: Optional[Dict[str, Any]] = PrivateAttr(default=None)
+
+    def json_bytes(self) -> bytes:
+        if self._json_cache is None:
+            self._json_cache = self.model_dump_json().encode()
+        return self._json_cache
+
+    def json_text(self) -> str:
+        return self.json_bytes().decode()
+
+    def as_dict(self) -> Dict[str, Any]:
+        if self._dict_cache is None:
+            self._dict_cache = orjson.loads(self.json_bytes())
+        return self._dict_cache
@@ -1,8 +1,17 @@
 from pydantic import BaseModel
-from typing import List, Dict, Optional
+from typing import List, Dict, Literal, Optional
 
 class CreateSnapshotPayload(BaseModel):
     source_table_fullname: str
     product: str
     study: str
     timestamp: str
+    # "deep" copies the data files, "shallow" only references the source files
+    mode: Literal["deep", "shallow"] = "deep"
+    # Refresh an existing snapshot in place (CREATE OR REPLACE); a deep clone
+    # then copies only the files that changed
+    replace: bool = False
+    # Return right after submitting; progress is then read from the status API
+    wait: bool = True
+    # Target workspace; defaults to the one mapped to the product
+    workspace: Optional[str] = None
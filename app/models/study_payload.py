@@ -1,5 +1,6 @@
 from pydantic import BaseModel
 from typing import List, Dict, Optional
+from app.models.base import PayloadModel
 
 
 class BusinessMetadata(BaseModel):
@@ -39,10 +40,12 @@ class EntityAccessControl(BaseModel):
 #     volumes: Optional[EntityAccessControl]
 
 
-class StudyPayload(BaseModel):
+class StudyPayload(PayloadModel):
     business_metadata: BusinessMetadata
     storage_setup: StorageSetup
     access_controls: Optional[Dict[str, EntityAccessControl]] = None
+    # Target workspace; defaults to the one mapped to the product
+    workspace: Optional[str] = None
     
 class Metadata(BaseModel):
     description: str
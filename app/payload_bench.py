@@ -0,0 +1,91 @@
+import json
+import timeit
+from app.models.study_payload import StudyPayload
+from app.models.analysis_payload import AnalysisPayload
+
+
+def build_study_body(groups: int, directories: int):
+    """Build a StudyPayload body with many groups and directories."""
+    schemas = ["raw", "raw_restricted", "volumes"]
+    return {
+        "business_metadata": {
+            "product_name": "bench-product",
+            "study": "20250101",
+            "study_type": "open",
+        },
+        "storage_setup": {
+            "data_schemas": schemas,
+            "volume_directories": {
+                "raw": [f"dir_{i}/sub_{i % 7}" for i in range(directories)],
+                "raw_restricted": [f"dir_{i}" for i in range(directories)],
+            },
+        },
+        "access_controls": {
+            schema: {
+                "groups": [
+                    {"group": f"grp-{schema}-{i}", "access": "read_only"}
+                    for i in range(groups)
+                ]
+            }
+            for schema in schemas
+        },
+    }
+
+
+def build_analysis_body(groups: int, directories: int):
+    """Build an AnalysisPayload body with many groups and directories."""
+    return {
+        "business_metadata": {
+            "product_name": "bench-product",
+            "study": "20250101",
+            "analysis_lead": "lead@example.com",
+            "analysis_type": "efficacy",
+        },
+        "storage_setup": {
+            "volume_directories": [f"dir_{i}" for i in range(directories)],
+            "data_layer_schemas": ["raw", "curated", "report"],
+        },
+        "access_controls": {
+            f"g{i}": {
+                "group": f"grp-{i}",
+                "table_actions": "read_only",
+                "volume_action": "read_only_volume",
+                "business_action": [],
+            }
+            for i in range(groups)
+        },
+    }
+
+
+def legacy_pipeline(model, body):
+    """Validate then dump the payload three times, as the old request path did."""
+    payload = model(**body)
+    for _ in range(3):
+        json.dumps(payload.model_dump())
+
+
+def cached_pipeline(model, raw: bytes):
+    """Validate from raw JSON then reuse the cached encoding three times."""
+    payload = model.model_validate_json(raw)
+    for _ in range(3):
+        payload.json_bytes()
+
+
+def run(groups: int = 500, directories: int = 500, number: int = 50):
+    for model, builder in (
+        (StudyPayload, build_study_body),
+        (AnalysisPayload, build_analysis_body),
+    ):
+        body = builder(groups, directories)
+        raw = json.dumps(body).encode()
+        legacy = timeit.timeit(lambda: legacy_pipeline(model, body), number=number)
+        cached = timeit.timeit(lambda: cached_pipeline(model, raw), number=number)
+        print(
+            f"{model.__name__}: {len(raw)} bytes, "
+            f"legacy {legacy / number * 1000:.2f} ms/req, "
+            f"cached {cached / number * 1000:.2f} ms/req"
+        )
+
+
+if __name__ == "__main__":
+    run()
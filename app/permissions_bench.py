@@ -0,0 +1,69 @@
+import json
+import timeit
+import orjson
+from app.core.config import ACCESS_MAP
+from app.models.study_payload import StudyPayload
+from app.services.provisioning_plan import build_study_plan
+from app.services.permissions import changes_payload
+from app.payload_bench import build_study_body
+
+LEVELS = ["read_only", "read_write", "modify", "list", "unknown_level"]
+
+
+def build_body(principals: int):
+    """Study body where every schema grants `principals` groups mixed levels."""
+    body = build_study_body(0, 10)
+    for schema, control in body["access_controls"].items():
+        control["groups"] = [
+            # Every group gets a second level on a few schemas, so merging matters
+            {"group": f"grp-{i}", "access": LEVELS[(i + len(schema)) % len(LEVELS)]}
+            for i in range(principals)
+        ] + [
+            {"group": f"grp-{i}", "access": "list"} for i in range(0, principals, 10)
+        ]
+    return body
+
+
+def legacy_bodies(payload: StudyPayload):
+    """
+    One dict per group per schema and a single PATCH body per schema,
+    encoded by requests' json= (stdlib json), as before.
+    """
+    bodies = []
+    for schema_name, control in payload.access_controls.items():
+        access_payload = {"changes": []}
+        for group in control.groups:
+            privileges = ACCESS_MAP.get(group.access)
+            if not privileges:
+                continue
+            access_payload["changes"].append(
+                {"add": privileges, "principal": group.group}
+            )
+        bodies.append(json.dumps(access_payload))
+    return bodies
+
+
+def resolved_bodies(payload: StudyPayload):
+    """Bitset resolution, merged per principal and chunked to request limits."""
+    plan = build_study_plan(payload)
+    return [
+        orjson.dumps(changes_payload(chunk))
+        for op in plan.grants
+        for chunk in op.chunks()
+    ]
+
+
+def run(principals: int = 10_000, number: int = 10):
+    payload = StudyPayload(**build_body(principals))
+    for name, fn in (("legacy", legacy_bodies), ("resolved", resolved_bodies)):
+        bodies = fn(payload)
+        seconds = timeit.timeit(lambda: fn(payload), number=number)
+        print(
+            f"{name}: {principals} principals x {len(payload.access_controls)} schemas, "
+            f"{seconds / number * 1000:.2f} ms/req, {len(bodies)} PATCH bodies, "
+            f"largest {max(len(b) for b in bodies)} bytes"
+        )
+
+
+if __name__ == "__main__":
+    run()
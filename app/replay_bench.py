@@ -0,0 +1,139 @@
+"""
+Offline benchmark of the provisioning pipeline on recorded Databricks traffic.
+
+Record once against a real workspace (credentials from the usual env vars):
+    python -m app.replay_bench record traffic.ndjson.gz
+then compare execution strategies on identical traffic, without a workspace:
+    python -m app.replay_bench replay traffic.ndjson.gz --scale 1 --copies 8
+Replays go through the configured per-workspace rate limit unless --rate
+overrides it (0 lifts it, to compare strategies on latency alone).
+
+Payloads are generated deterministically (see payload_bench), so a replay
+issues the same requests as the recording.
+"""
+import argparse
+import asyncio
+import time
+from contextlib import contextmanager
+from functools import partial
+import app.databricks_api as dbx
+from app.models.analysis_payload import AnalysisPayload
+from app.models.study_payload import StudyPayload
+from app.payload_bench import build_analysis_body, build_study_body
+from app.services import provisioning_plan
+from app.services.analysis_setup import process_analysis_payload
+from app.services.grant_batcher import batcher as grant_batcher
+from app.services.study_resources import process_payload
+from app.utils import traffic
+from app.utils.rate_limiter import RateLimiter
+
+
+def build_payloads(copies: int, groups: int, directories: int):
+    """`copies` study and analysis payloads, each for its own study."""
+    payloads = []
+    for i in range(copies):
+        study = build_study_body(groups, directories)
+        analysis = build_analysis_body(groups, directories)
+        for body in (study, analysis):
+            body["business_metadata"]["study"] = f"2025{i:04d}"
+        payloads.append(StudyPayload.model_validate(study))
+        payloads.append(AnalysisPayload.model_validate(analysis))
+    return payloads
+
+
+def provision(payload):
+    if isinstance(payload, AnalysisPayload):
+        return process_analysis_payload(payload)
+    return process_payload(payload)
+
+
+@contextmanager
+def serial_client():
+    """One call at a time and no grant batching, as before."""
+    create_directories, batching = dbx.create_directories, grant_batcher.enabled
+    fan_out = provisioning_plan.PLAN_FAN_OUT
+    dbx.create_directories = partial(create_directories, max_concurrency=1)
+    grant_batcher.enabled = False
+    provisioning_plan.PLAN_FAN_OUT = 1
+    try:
+        yield
+    finally:
+        dbx.create_directories, grant_batcher.enabled = create_directories, batching
+        provisioning_plan.PLAN_FAN_OUT = fan_out
+
+
+def run_serial(payloads):
+    with serial_client():
+        for payload in payloads:
+            provision(payload)
+
+
+def run_concurrent(payloads):
+    for payload in payloads:
+        provision(payload)
+
+
+def run_async(payloads):
+    async def _all():
+        await asyncio.gather(*(asyncio.to_thread(provision, p) for p in payloads))
+
+    asyncio.run(_all())
+
+
+MODES = {"serial": run_serial, "concurrent": run_concurrent, "async": run_async}
+
+
+def record(path: str, copies: int, groups: int, directories: int):
+    traffic.configure(traffic.RECORD, path)
+    dbx.close_clients()
+    try:
+        run_serial(build_payloads(copies, groups, directories))
+    finally:
+        recorded = traffic.stats()["recorded"]
+        traffic.close()
+    print(f"recorded {recorded} exchanges to {path}")
+
+
+def replay(
+    path: str, scale: float, rate: float, copies: int, groups: int, directories: int
+):
+    payloads = build_payloads(copies, groups, directories)
+    for name, mode in MODES.items():
+        # Fresh clients and a fresh recording so every mode sees the same answers
+        traffic.configure(traffic.REPLAY, path, scale)
+        dbx.close_clients()
+        if rate is not None:
+            dbx.client().limiter = RateLimiter(rate, max(1, int(rate)))
+        start = time.perf_counter()
+        mode(payloads)
+        elapsed = time.perf_counter() - start
+        stats = traffic.stats()
+        print(
+            f"{name:>10}: {elapsed * 1000:8.1f} ms for {len(payloads)} payloads, "
+            f"{stats['replayed']} upstream calls, {stats['misses']} unrecorded"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("command", choices=("record", "replay"))
+    parser.add_argument("file")
+    parser.add_argument("--scale", type=float, default=1.0)
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=None,
+        help="requests per second to the stand-in (0 = unlimited, default as configured)",
+    )
+    parser.add_argument("--copies", type=int, default=4)
+    parser.add_argument("--groups", type=int, default=20)
+    parser.add_argument("--directories", type=int, default=20)
+    args = parser.parse_args()
+    if args.command == "record":
+        record(args.file, args.copies, args.groups, args.directories)
+    else:
+        replay(args.file, args.scale, args.rate, args.copies, args.groups, args.directories)
+
+
+if __name__ == "__main__":
+    main()
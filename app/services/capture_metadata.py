@@ -1,60 +1,26 @@
-import json
+import orjson
+import time
 from datetime import datetime
-from typing import Dict, Any, Optional
-from app.models.study_payload import StudyPayload
-from app.models.metadata import MetadataLog
+from typing import Dict, Any, List, Optional
 import psycopg2
+from psycopg2.extras import execute_values
+from app.models.base import PayloadModel
 from app.core.config import (
-    LAKEBASE_DB_NAME,
-    LAKEBASE_USER,
-    LAKEBASE_OAUTH_TOKEN,
-    LAKEBASE_HOST,
+    AUDIT_OUTBOX_ENABLED,
+    AUDIT_OUTBOX_DIR,
+    AUDIT_OUTBOX_SEGMENT_BYTES,
+    AUDIT_OUTBOX_SEGMENT_SECONDS,
+    AUDIT_OUTBOX_FSYNC_MS,
+    AUDIT_OUTBOX_SHIP_INTERVAL_SECONDS,
+    AUDIT_OUTBOX_MAX_ATTEMPTS,
 )
+from app.core.lakebase import PreparedStatement, execute, get_connection
+from app.core.logging_config import get_logger
+from app.utils.outbox import Outbox, RejectedRecords
 
+logger = get_logger("capture_metadata")
 
-def insert_metadata(
-    payload: StudyPayload,
-    response: Dict[str, Any],
-    http_status: int,
-    request_by: str,
-    api_response_time = float,
-    error: Optional[str] = None,
-    description: Optional[str] = None,
-    business_justification: Optional[str] = None, 
-    
-):
-    """
-    Insert metadata record into Lakebase
-    """
-
-
-    log = MetadataLog(
-        request_payload=payload.dict(),
-        response_payload=response,
-        http_status_code=http_status,
-        error_message=error,
-        created_at=datetime.utcnow(),
-        product_name=payload.business_metadata.product_name,
-        study=payload.business_metadata.study,
-        study_type=payload.business_metadata.study_type,
-        request_by = request_by, 
-        description = description,
-        business_justification = business_justification, 
-        api_response_time = api_response_time
-    )
-
-    conn = psycopg2.connect(
-        dbname=LAKEBASE_DB_NAME,
-        user=LAKEBASE_USER,
-        password=LAKEBASE_OAUTH_TOKEN,
-        host=LAKEBASE_HOST,
-        port="5432",
-        sslmode="require",
-    )
-    print("Connected to Lakebase")
-    cursor = conn.cursor()
-
-    query = """
+INSERT_METADATA_QUERY = """
     INSERT INTO metadata (
         request_payload,
         response_payload,
@@ -72,26 +38,220 @@ def insert_metadata(
     VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
     """
 
-    cursor.execute(
-        query,
-        (
-            json.dumps(log.request_payload),
-            json.dumps(log.response_payload),
-            log.http_status_code,
-            log.error_message,
-            log.created_at,
-            log.product_name,
-            log.study,
-            log.study_type,
-            log.request_by,
-            log.business_justification,
-            log.description,
-            log.api_response_time
-        ),
+# Per-minute rollup kept in step with every audit row, read by the dashboard aggregates
+UPSERT_ROLLUP_QUERY = """
+    INSERT INTO metadata_rollup_minute AS r (
+        bucket,
+        product_name,
+        study,
+        http_status_code,
+        request_count,
+        error_count,
+        total_response_time
+    )
+    VALUES (date_trunc('minute', %s::timestamp), COALESCE(%s, ''), COALESCE(%s, ''), COALESCE(%s, -1), 1, %s, %s)
+    ON CONFLICT (bucket, product_name, study, http_status_code) DO UPDATE SET
+        request_count = r.request_count + EXCLUDED.request_count,
+        error_count = r.error_count + EXCLUDED.error_count,
+        total_response_time = r.total_response_time + EXCLUDED.total_response_time
+    """
+
+
+INSERT_METADATA = PreparedStatement("insert_metadata", INSERT_METADATA_QUERY)
+UPSERT_ROLLUP = PreparedStatement("upsert_rollup_minute", UPSERT_ROLLUP_QUERY)
+
+# Bulk forms for the outbox shipper; rollup rows are pre-aggregated per key
+# since one statement cannot update the same rollup row twice
+INSERT_METADATA_BULK_QUERY = INSERT_METADATA_QUERY.replace(
+    "VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)", "VALUES %s"
+)
+
+UPSERT_ROLLUP_BULK_QUERY = """
+    INSERT INTO metadata_rollup_minute AS r (
+        bucket,
+        product_name,
+        study,
+        http_status_code,
+        request_count,
+        error_count,
+        total_response_time
     )
+    VALUES %s
+    ON CONFLICT (bucket, product_name, study, http_status_code) DO UPDATE SET
+        request_count = r.request_count + EXCLUDED.request_count,
+        error_count = r.error_count + EXCLUDED.error_count,
+        total_response_time = r.total_response_time + EXCLUDED.total_response_time
+    """
+
+
+def _rollups(rows: List[list]) -> List[tuple]:
+    """Rollup increments for audit rows, one per rollup key."""
+    rollups: Dict[tuple, list] = {}
+    for row in rows:
+        created_at = row[4]
+        if isinstance(created_at, str):
+            created_at = row[4] = datetime.fromisoformat(created_at)
+        http_status = row[2]
+        key = (
+            created_at.replace(second=0, microsecond=0),
+            row[5] or "",
+            row[6] or "",
+            # Rows without a status are rolled up under -1, like retention's "other" class
+            http_status if http_status is not None else -1,
+        )
+        totals = rollups.setdefault(key, [0, 0, 0.0])
+        totals[0] += 1
+        totals[1] += 1 if http_status is not None and http_status >= 400 else 0
+        totals[2] += row[11] or 0
+    return [key + tuple(totals) for key, totals in rollups.items()]
 
-    print("Metadata log inserted")
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+def _insert_rows(cursor, rows: List[list]):
+    execute_values(cursor, INSERT_METADATA_BULK_QUERY, rows, page_size=500)
+
+
+def write_batch(rows: List[list]):
+    """
+    Insert audit rows and their rollup increments in one transaction.
+
+    If Lakebase refuses the batch (a constraint or data error rather than a
+    lost connection), the rows are inserted one at a time under savepoints;
+    the good rows are committed and the refused ones raised as
+    RejectedRecords for the outbox to quarantine.
+    """
+    rejected: List[list] = []
+    error: Optional[Exception] = None
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SAVEPOINT audit_batch")
+            try:
+                _insert_rows(cursor, rows)
+            except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                raise
+            except psycopg2.DatabaseError as e:
+                error = e
+                cursor.execute("ROLLBACK TO SAVEPOINT audit_batch")
+                accepted: List[list] = []
+                for row in rows:
+                    cursor.execute("SAVEPOINT audit_row")
+                    try:
+                        _insert_rows(cursor, [row])
+                    except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                        raise
+                    except psycopg2.DatabaseError:
+                        cursor.execute("ROLLBACK TO SAVEPOINT audit_row")
+                        rejected.append(row)
+                    else:
+                        cursor.execute("RELEASE SAVEPOINT audit_row")
+                        accepted.append(row)
+                rows = accepted
+            if rows:
+                execute_values(cursor, UPSERT_ROLLUP_BULK_QUERY, _rollups(rows), page_size=500)
+    if rejected:
+        raise RejectedRecords(rejected, error)
+
+
+outbox = Outbox(
+    AUDIT_OUTBOX_DIR,
+    write_batch,
+    segment_bytes=AUDIT_OUTBOX_SEGMENT_BYTES,
+    segment_seconds=AUDIT_OUTBOX_SEGMENT_SECONDS,
+    fsync_ms=AUDIT_OUTBOX_FSYNC_MS,
+    ship_interval_seconds=AUDIT_OUTBOX_SHIP_INTERVAL_SECONDS,
+    max_attempts=AUDIT_OUTBOX_MAX_ATTEMPTS,
+    # Lakebase unreachable or the pool exhausted: retry the same segment later
+    transient=(psycopg2.OperationalError, psycopg2.InterfaceError, TimeoutError),
+    name="audit_outbox",
+)
+
+
+def insert_metadata(
+    payload: PayloadModel,
+    response: Dict[str, Any],
+    http_status: int,
+    request_by: str,
+    api_response_time = float,
+    error: Optional[str] = None,
+    description: Optional[str] = None,
+    business_justification: Optional[str] = None, 
+    
+):
+    """
+    Record an audit row, reusing the payload's cached JSON. With the outbox
+    enabled the row is appended locally and shipped to Lakebase in the
+    background; otherwise it is inserted directly.
+    """
+    metadata = payload.business_metadata
+    row = (
+        payload.json_text(),
+        orjson.dumps(response, default=str).decode(),
+        http_status,
+        error,
+        datetime.utcnow(),
+        metadata.product_name,
+        metadata.study,
+        getattr(metadata, "study_type", None),
+        request_by,
+        description,
+        business_justification,
+        api_response_time,
+    )
+
+    if AUDIT_OUTBOX_ENABLED:
+        outbox.append(row)
+        return
+
+    rollup = (
+        row[4],
+        metadata.product_name,
+        metadata.study,
+        http_status,
+        1 if http_status is not None and http_status >= 400 else 0,
+        api_response_time,
+    )
+
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            execute(cursor, INSERT_METADATA, row)
+            execute(cursor, UPSERT_ROLLUP, rollup)
+
+    logger.debug("Metadata log inserted", extra={"event": "metadata_inserted"})
+
+
+# Recorded when neither the request nor the payload names a requester
+UNKNOWN_REQUESTER = "unknown"
+
+
+def requester(payload: PayloadModel, metadata=None) -> str:
+    """
+    Who asked for a request: the submitted Metadata's request_by, else the
+    payload's analysis lead (analysis payloads carry no Metadata).
+    """
+    if metadata is not None:
+        return metadata.request_by
+    lead = getattr(payload.business_metadata, "analysis_lead", None)
+    return lead or UNKNOWN_REQUESTER
+
+
+def record_audit(payload: PayloadModel, response, http_status, started: float, metadata=None):
+    """
+    Audit row for a provisioning request, appended to the outbox (or written
+    to Lakebase directly when the outbox is disabled). Never fails the request.
+    """
+    try:
+        insert_metadata(
+            payload,
+            response,
+            http_status,
+            request_by=requester(payload, metadata),
+            error=None if http_status == 200 else (response or {}).get("message"),
+            description=metadata.description if metadata else None,
+            business_justification=(
+                metadata.business_justification if metadata else None
+            ),
+            api_response_time=(time.perf_counter() - started) * 1000,
+        )
+    except Exception:
+        logger.exception(
+            "Audit row could not be recorded", extra={"event": "audit_record_failed"}
+        )
@@ -1,37 +1,182 @@
+import threading
 import time
+from typing import Dict, Optional
 import app.databricks_api as dbx
+import app.sql_execution as sql
+from app.core import workspaces
 from app.models.snapshot_payload import CreateSnapshotPayload
+from app.core.logging_config import get_logger
+from app.services.workspace_index import index as workspace_index
+from app.services.provisioning_plan import (
+    OperationFailure,
+    PlanExecutionError,
+    build_snapshot_plan,
+    ensure_catalog_exists,
+    execute_plan,
+    full_name,
+    snapshot_schema_name,
+)
+from app.utils.time_logging import timed_op
 
+logger = get_logger("create_snapshot")
 
-def create_snapshot(payload: CreateSnapshotPayload):
-    catalog_name = payload.product.lower()
-    study = payload.study
+# Columns of the CLONE result row, reported as clone metrics
+CLONE_METRICS = (
+    "source_table_size",
+    "source_num_of_files",
+    "num_removed_files",
+    "num_copied_files",
+    "removed_files_size",
+    "copied_files_size",
+)
+
+# statement_id -> snapshot submitted by this instance
+_snapshots: Dict[str, dict] = {}
+_lock = threading.Lock()
+# Finished snapshots kept for the status API
+MAX_TRACKED_SNAPSHOTS = 1000
+
+
+def clone_statement(payload: CreateSnapshotPayload, table: str) -> str:
+    create = "CREATE OR REPLACE TABLE" if payload.replace else "CREATE TABLE"
+    return (
+        f"{create} {table} {payload.mode.upper()} CLONE "
+        f"{payload.source_table_fullname} TIMESTAMP AS OF '{payload.timestamp}'"
+    )
+
+
+def clone_metrics(result: dict) -> Dict[str, int]:
+    """
+    Files and bytes reported by a finished CLONE statement. A shallow clone
+    copies nothing, so only the source size and file count are set.
+    """
+    row = sql.first_row(result) or {}
+    return {
+        name: int(row[name])
+        for name in CLONE_METRICS
+        if row.get(name) is not None
+    }
+
+
+def _track(statement_id: str, snapshot: dict):
+    with _lock:
+        _snapshots[statement_id] = snapshot
+        # Dicts keep insertion order, so the oldest snapshots go first
+        while len(_snapshots) > MAX_TRACKED_SNAPSHOTS:
+            del _snapshots[next(iter(_snapshots))]
+
+
+def _finish(snapshot: dict, result: dict, record: bool = True) -> dict:
+    """Record the latest state of a snapshot's statement, and its metrics once done."""
+    status = result["status"]
+    snapshot["state"] = status["state"]
+    if status["state"] == "SUCCEEDED" and "metrics" not in snapshot:
+        snapshot["metrics"] = clone_metrics(result)
+        if not record:
+            return snapshot
+        snapshot["duration_seconds"] = round(time.time() - snapshot["submitted_at"], 1)
+        workspace_index.record_table(snapshot["table"])
+        logger.info(
+            "Snapshot completed",
+            extra={"event": "snapshot_completed", **snapshot},
+        )
+    elif status["state"] not in sql.PENDING_STATES:
+        snapshot["error"] = status.get("error", {}).get("message", status["state"])
+    return snapshot
 
-    # 1. Check if catalog exists
-    catalogs = dbx.list_catalogs().get("catalogs", [])
 
-    if catalog_name not in [c["name"] for c in catalogs]:
-        raise dbx.DatabricksAPIError(404, f"Catalog {catalog_name} not found")
+def _already_exists(failure: OperationFailure) -> bool:
+    return (
+        failure.operation == "create_schema"
+        and failure.status_code in (400, 409)
+        and "ALREADY_EXISTS" in failure.message.upper().replace(" ", "_")
+    )
+
+
+def create_snapshot(payload: CreateSnapshotPayload) -> dict:
+    plan = build_snapshot_plan(payload)
+    catalog_name = plan.catalog
+
+    # 1. Check if catalog exists
+    ensure_catalog_exists(catalog_name, logger)
 
     # 2. Check table exists
 
-    table_fullname = dbx.get_tables(payload.source_table_fullname)
+    if not workspace_index.has_table(payload.source_table_fullname):
+        table_fullname = dbx.get_tables(payload.source_table_fullname)
+    else:
+        table_fullname = payload.source_table_fullname
     if not table_fullname:
         raise dbx.DatabricksAPIError(
             404, f"Table {payload.source_table_fullname} not found"
         )
 
-    # 3. create schema
+    # 3. Create the snapshot schema; it already exists when a snapshot is refreshed
+    schema_name = snapshot_schema_name(payload.study)
+    if not workspace_index.has_schema(catalog_name, schema_name):
+        try:
+            execute_plan(plan, logger)
+        except PlanExecutionError as e:
+            if not all(_already_exists(failure) for failure in e.failures):
+                raise
+            workspace_index.record_schema(catalog_name, schema_name)
+
+    # 4. Create snapshot
+    new_table = full_name(
+        catalog_name,
+        schema_name,
+        payload.source_table_fullname.split(".")[-1],
+    )
+    result = sql.submit(clone_statement(payload, new_table))
+    snapshot = {
+        "statement_id": result["statement_id"],
+        "table": new_table,
+        "source": payload.source_table_fullname,
+        "timestamp": payload.timestamp,
+        "mode": payload.mode,
+        "replace": payload.replace,
+        "workspace": workspaces.current_name(),
+        "submitted_at": time.time(),
+        "state": result["status"]["state"],
+    }
+    _track(result["statement_id"], snapshot)
+    logger.info("Snapshot submitted", extra={"event": "snapshot_submitted", **snapshot})
+
+    if not payload.wait:
+        return dict(snapshot)
+
+    try:
+        with timed_op(
+            logger=logger,
+            event="snapshot_clone",
+            extra={"table": new_table, "mode": payload.mode, "replace": payload.replace},
+        ):
+            result = sql.wait(result)
+    except dbx.DatabricksAPIError as e:
+        snapshot["state"], snapshot["error"] = "FAILED", e.message
+        raise dbx.DatabricksAPIError(
+            500, f"Snapshot {new_table} failed to complete: {e.message}"
+        )
+    return dict(_finish(snapshot, result))
+
+
+def snapshot_status(statement_id: str) -> dict:
+    """
+    State of a snapshot's clone statement, with clone metrics once it has
+    succeeded.
+    """
+    with _lock:
+        snapshot = _snapshots.get(statement_id)
 
-    dbx.create_schema(schema_name=f"{study}_snapshot", catalog_name=catalog_name)
+    if snapshot is None:
+        # Submitted by another instance: only the statement itself is known
+        result = dbx.sql_status(statement_id)
+        return _finish({"statement_id": statement_id}, result, record=False)
 
-    # 3. Create snapshot
-    new_table = f"{catalog_name}.{study}_snapshot.{payload.source_table_fullname.split('.')[-1]}"
-    statement = f"CREATE TABLE {new_table} DEEP CLONE {payload.source_table_fullname} TIMESTAMP AS OF '{payload.timestamp}'"
-    result = dbx.execute_statement(statement=statement)
-    print(f"Snapshot job started: {result}")
-    while result["status"]["state"] in ["PENDING", "RUNNING"]:
-        time.sleep(3)
-        result = dbx.sql_status(result["statement_id"])
-    if result["status"]["state"] != "SUCCEEDED":
-        raise dbx.DatabricksAPIError(500, f"Snapshot {new_table} failed to complete")
+    if snapshot["state"] in sql.PENDING_STATES:
+        with workspaces.use_workspace(snapshot["workspace"]):
+            _finish(snapshot, dbx.sql_status(statement_id))
+    status = dict(snapshot)
+    if status["state"] in sql.PENDING_STATES:
+        status["elapsed_seconds"] = round(time.time() - status["submitted_at"], 1)
+    return status
@@ -1,11 +1,19 @@
-from datetime import datetime
-import psycopg2
+from typing import Tuple
+import orjson
 from psycopg2 import sql
-from app.core.config import (
-    LAKEBASE_DB_NAME,
-    LAKEBASE_USER,
-    LAKEBASE_OAUTH_TOKEN,
-    LAKEBASE_HOST,
+from psycopg2.extras import register_default_jsonb
+from app.core.config import LAKEBASE_DB_NAME
+from app.core.lakebase import PreparedStatement, execute, get_connection
+from app.core.logging_config import get_logger
+
+logger = get_logger("fetch_metadata")
+
+JSONB_OID = 3802
+
+
+SELECT_METADATA = PreparedStatement(
+    "select_metadata",
+    sql.SQL("SELECT * FROM {}.public.metadata").format(sql.Identifier(LAKEBASE_DB_NAME)),
 )
 
 
@@ -14,26 +22,46 @@ def fetch_metadata():
     Read metadata records from Lakebase
     """
 
-    conn = psycopg2.connect(
-        dbname=LAKEBASE_DB_NAME,
-        user=LAKEBASE_USER,
-        password=LAKEBASE_OAUTH_TOKEN,
-        host=LAKEBASE_HOST,
-        port="5432",
-        sslmode="require",
-    )
-    print("Connected to Lakebase")
-    cursor = conn.cursor()
-
-    query = sql.SQL("SELECT * FROM {}.public.metadata").format(
-        sql.Identifier(LAKEBASE_DB_NAME)
-    )
-    cursor.execute(query)
-    rows = cursor.fetchall()
-    print("Metadata log read")  
-    
-    conn.commit()
-    cursor.close()
-    conn.close()
-    
+    with get_connection(readonly=True) as conn:
+        with conn.cursor() as cursor:
+            execute(cursor, SELECT_METADATA)
+            rows = cursor.fetchall()
+            logger.debug(
+                "Metadata log read", extra={"event": "metadata_read", "rows": len(rows)}
+            )
+
     return rows
+
+
+def fetch_metadata_json() -> Tuple[int, bytes]:
+    """
+    Read metadata records as an encoded JSON array of rows.
+    JSONB columns are passed through as the text Postgres returns instead of
+    being parsed into dicts and serialized again.
+    """
+
+    with get_connection(readonly=True) as conn:
+        with conn.cursor() as cursor:
+            register_default_jsonb(conn_or_curs=cursor, loads=lambda value: value)
+            execute(cursor, SELECT_METADATA)
+            raw_columns = {
+                index
+                for index, column in enumerate(cursor.description)
+                if column.type_code == JSONB_OID
+            }
+            rows = cursor.fetchall()
+            logger.debug(
+                "Metadata log read", extra={"event": "metadata_read", "rows": len(rows)}
+            )
+
+    encoded = []
+    for row in rows:
+        fields = [
+            value.encode()
+            if index in raw_columns and value is not None
+            else orjson.dumps(value, default=str)
+            for index, value in enumerate(row)
+        ]
+        encoded.append(b"[" + b",".join(fields) + b"]")
+
+    return len(rows), b"[" + b",".join(encoded) + b"]"
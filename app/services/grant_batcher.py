@@ -0,0 +1,163 @@
+import threading
+from concurrent.futures import Future
+from typing import Dict, Iterable, List, Tuple
+import app.databricks_api as dbx
+from app.core import workspaces
+from app.core.config import GRANT_BATCHING_ENABLED
+from app.core.logging_config import get_logger
+from app.services.permissions import (
+    GrantGroup,
+    GrantSet,
+    changes_payload,
+    chunk_changes,
+    mask_of,
+)
+
+logger = get_logger("grant_batcher")
+
+
+class _Batch:
+    __slots__ = ("grants", "waiters")
+
+    def __init__(self):
+        self.grants = GrantSet()
+        # (future, the caller's own groups), in arrival order
+        self.waiters: List[Tuple[Future, Tuple[GrantGroup, ...]]] = []
+
+
+class GrantBatcher:
+    """
+    Merges grant PATCHes for the same securable that arrive while one is in
+    flight.
+
+    A caller that finds no PATCH in flight for its securable sends at once,
+    so an uncontended grant pays no extra latency. Callers arriving while a
+    PATCH is in flight join one batch, whose first caller waits for that
+    PATCH to finish, then sends the merged changes (chunked) and hands the
+    result to every caller that joined. If the merged PATCH is rejected
+    (4xx), each caller's own changes are re-sent separately so only the
+    offending caller gets the error. Flushes for one securable never
+    overlap; callers for other securables are not held up.
+    """
+
+    def __init__(self, enabled: bool = GRANT_BATCHING_ENABLED):
+        self.enabled = enabled
+        self._pending: Dict[Tuple[str, str, str], _Batch] = {}
+        # Set when the latest flush for a securable has finished sending
+        self._flushing: Dict[Tuple[str, str, str], threading.Event] = {}
+        self._lock = threading.Lock()
+        self.requests_sent = 0
+        self.calls = 0
+
+    def grant(self, object_type: str, full_name: str, groups: Iterable[GrantGroup]):
+        groups = tuple(groups)
+        if not self.enabled:
+            return self._send(object_type, full_name, groups)
+
+        key = (workspaces.current_name(), object_type, full_name)
+        future: Future = Future()
+        with self._lock:
+            self.calls += 1
+            batch = self._pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = self._pending[key] = _Batch()
+                previous = self._flushing.get(key)
+                done = self._flushing[key] = threading.Event()
+            for group in groups:
+                mask = mask_of(group.add)
+                for principal in group.principals:
+                    batch.grants.add(principal, mask)
+            batch.waiters.append((future, groups))
+
+        if leader:
+            try:
+                if previous is not None:
+                    # Collect callers while the previous PATCHes for this
+                    # securable finish; they must never overlap
+                    previous.wait()
+                with self._lock:
+                    del self._pending[key]
+                self._flush(object_type, full_name, batch)
+            finally:
+                done.set()
+                with self._lock:
+                    if self._flushing.get(key) is done:
+                        del self._flushing[key]
+        return future.result()
+
+    def _flush(self, object_type: str, full_name: str, batch: _Batch):
+        try:
+            response = self._send(object_type, full_name, batch.grants.groups())
+        except dbx.DatabricksAPIError as e:
+            if len(batch.waiters) > 1 and 400 <= e.status_code < 500:
+                self._flush_separately(object_type, full_name, batch, e)
+            else:
+                for waiter, _ in batch.waiters:
+                    waiter.set_exception(e)
+            return
+        except BaseException as e:
+            for waiter, _ in batch.waiters:
+                waiter.set_exception(e)
+            return
+        if len(batch.waiters) > 1:
+            logger.info(
+                "Merged grant requests",
+                extra={
+                    "event": "grant_batch_merged",
+                    "full_name": full_name,
+                    "callers": len(batch.waiters),
+                    "principals": len(batch.grants.masks),
+                },
+            )
+        for waiter, _ in batch.waiters:
+            waiter.set_result(response)
+
+    def _flush_separately(
+        self, object_type: str, full_name: str, batch: _Batch, error: dbx.DatabricksAPIError
+    ):
+        logger.warning(
+            "Merged grant request rejected, sending each caller's changes separately",
+            extra={
+                "event": "grant_batch_split",
+                "full_name": full_name,
+                "callers": len(batch.waiters),
+                "status_code": error.status_code,
+                "error": error.message,
+            },
+        )
+        for waiter, groups in batch.waiters:
+            try:
+                waiter.set_result(self._send(object_type, full_name, groups))
+            except BaseException as e:
+                waiter.set_exception(e)
+
+    def _send(self, object_type: str, full_name: str, groups: Tuple[GrantGroup, ...]):
+        response, requests = _send(object_type, full_name, groups)
+        with self._lock:
+            self.requests_sent += requests
+        return response
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "calls": self.calls,
+            "requests_sent": self.requests_sent,
+            "open_batches": len(self._pending),
+        }
+
+
+def _send(object_type: str, full_name: str, groups: Tuple[GrantGroup, ...]):
+    """
+    PATCH the changes in request-sized chunks. Returns the last response,
+    which lists the securable's full privilege assignments, and the number
+    of requests sent.
+    """
+    response, requests = None, 0
+    for chunk in chunk_changes(groups):
+        response = dbx.grant_permissions(object_type, full_name, changes_payload(chunk))
+        requests += 1
+    return response, requests
+
+
+batcher = GrantBatcher()
@@ -0,0 +1,264 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+import orjson
+from app.core.config import (
+    IDEMPOTENCY_TTL_SECONDS,
+    IDEMPOTENCY_WAIT_SECONDS,
+    IDEMPOTENCY_BACKEND,
+    IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS,
+)
+from app.core.lakebase import get_connection
+from app.core.logging_config import get_logger
+
+logger = get_logger("idempotency")
+
+# Poll interval while another instance holds a Lakebase claim
+REMOTE_POLL_SECONDS = 0.5
+
+
+class IdempotencyConflict(Exception):
+    """The original request for this key is still running after the wait."""
+
+
+class IdempotencyMismatch(Exception):
+    """The key was already used for a request with a different body."""
+
+
+def request_hash(route: str, *bodies: bytes) -> str:
+    """SHA-256 of the route and the request body."""
+    digest = hashlib.sha256(route.encode())
+    for body in bodies:
+        digest.update(b"\0")
+        digest.update(body)
+    return digest.hexdigest()
+
+
+def request_key(route: str, header_key: Optional[str], *bodies: bytes) -> str:
+    """
+    Idempotency key for a request: the caller's Idempotency-Key header if
+    sent, otherwise a hash of the route and the request body.
+    """
+    if header_key:
+        return f"{route}:{header_key}"
+    return f"{route}:sha256:{request_hash(route, *bodies)}"
+
+
+def _mismatch(key: str) -> IdempotencyMismatch:
+    return IdempotencyMismatch(
+        f"Idempotency key {key} was already used with a different request body"
+    )
+
+
+class _Entry:
+    __slots__ = ("body_hash", "done", "response", "error", "expires_at")
+
+    def __init__(self, body_hash: str):
+        self.body_hash = body_hash
+        self.done = threading.Event()
+        self.response: Any = None
+        self.error: Optional[BaseException] = None
+        self.expires_at: Optional[float] = None
+
+
+class MemoryStore:
+    """
+    In-process store of running and completed executions, keyed by
+    idempotency key. Completed entries expire after IDEMPOTENCY_TTL_SECONDS.
+    """
+
+    def __init__(self):
+        self._running: Dict[str, _Entry] = {}
+        # In completion order, which is expiry order since the TTL is fixed
+        self._completed: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _purge(self, now: float):
+        while self._completed:
+            entry = next(iter(self._completed.values()))
+            if entry.expires_at > now:
+                return
+            self._completed.popitem(last=False)
+
+    def claim(self, key: str, body_hash: str) -> Tuple[_Entry, bool]:
+        """
+        Return (entry, owner). The owner runs the work; everyone else waits
+        on entry.done. Raises IdempotencyMismatch if the key is held for a
+        different body.
+        """
+        with self._lock:
+            self._purge(time.monotonic())
+            entry = self._running.get(key) or self._completed.get(key)
+            if entry is not None:
+                if entry.body_hash != body_hash:
+                    raise _mismatch(key)
+                return entry, False
+            entry = self._running[key] = _Entry(body_hash)
+            return entry, True
+
+    def complete(self, key: str, entry: _Entry, response: Any):
+        with self._lock:
+            entry.response = response
+            entry.expires_at = time.monotonic() + IDEMPOTENCY_TTL_SECONDS
+            self._running.pop(key, None)
+            self._completed[key] = entry
+        entry.done.set()
+
+    def fail(self, key: str, entry: _Entry, error: BaseException):
+        # Failures are not cached: waiters see the error, later retries run again
+        with self._lock:
+            entry.error = error
+            self._running.pop(key, None)
+        entry.done.set()
+
+
+class LakebaseStore:
+    """
+    Claims and completed responses shared across instances through the
+    idempotency_keys table.
+    """
+
+    CLAIM_QUERY = """
+        INSERT INTO idempotency_keys (idempotency_key, request_hash, status, expires_at)
+        VALUES (%s, %s, 'running', now() + make_interval(secs => %s))
+        ON CONFLICT (idempotency_key) DO UPDATE SET
+            request_hash = EXCLUDED.request_hash,
+            status = 'running',
+            response = NULL,
+            expires_at = EXCLUDED.expires_at
+        WHERE idempotency_keys.expires_at < now()
+        RETURNING idempotency_key
+        """
+    LOOKUP_QUERY = """
+        SELECT request_hash, status, response::text FROM idempotency_keys
+        WHERE idempotency_key = %s AND expires_at >= now()
+        """
+    COMPLETE_QUERY = """
+        UPDATE idempotency_keys
+        SET status = 'completed', response = %s, expires_at = now() + make_interval(secs => %s)
+        WHERE idempotency_key = %s
+        """
+    RELEASE_QUERY = "DELETE FROM idempotency_keys WHERE idempotency_key = %s AND status = 'running'"
+
+    def claim(self, key: str, body_hash: str) -> Tuple[bool, Optional[str], Any]:
+        """
+        Return (claimed, status, response) for a key. Raises
+        IdempotencyMismatch if the key is held for a different body.
+        """
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    self.CLAIM_QUERY, (key, body_hash, IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS)
+                )
+                if cursor.fetchone():
+                    return True, None, None
+                cursor.execute(self.LOOKUP_QUERY, (key,))
+                row = cursor.fetchone()
+        if row is None:
+            # The other claim expired between the two statements; claim again
+            return self.claim(key, body_hash)
+        stored_hash, status, response = row
+        if stored_hash != body_hash:
+            raise _mismatch(key)
+        return False, status, orjson.loads(response) if response else None
+
+    def complete(self, key: str, response: Any):
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    self.COMPLETE_QUERY,
+                    (orjson.dumps(response, default=str).decode(), IDEMPOTENCY_TTL_SECONDS, key),
+                )
+
+    def release(self, key: str):
+        with get_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(self.RELEASE_QUERY, (key,))
+
+    def wait(self, key: str, body_hash: str, deadline: float) -> Any:
+        """
+        Wait for another instance to finish the key and return its response.
+        """
+        while time.monotonic() < deadline:
+            time.sleep(REMOTE_POLL_SECONDS)
+            claimed, status, response = self.claim(key, body_hash)
+            if claimed:
+                # The other instance failed and released the key; run it here
+                return None
+            if status == "completed":
+                return response
+        raise IdempotencyConflict(f"Request {key} is still in progress")
+
+
+memory_store = MemoryStore()
+lakebase_store = LakebaseStore() if IDEMPOTENCY_BACKEND == "lakebase" else None
+
+
+def _claim_remote(key: str, body_hash: str) -> Tuple[Any, bool]:
+    """
+    Return (stored response, holds_claim) from the Lakebase store, waiting
+    for another instance that is already running the same key.
+    """
+    claimed, status, response = lakebase_store.claim(key, body_hash)
+    if claimed:
+        return None, True
+    if status == "completed":
+        return response, False
+    response = lakebase_store.wait(
+        key, body_hash, time.monotonic() + IDEMPOTENCY_WAIT_SECONDS
+    )
+    return response, response is None
+
+
+def run_idempotent(key: str, body_hash: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+    """
+    Run fn once per key. Returns (response, replayed): concurrent duplicates
+    attach to the running execution and completed duplicates get the stored
+    response for IDEMPOTENCY_TTL_SECONDS. Reusing a key with a different
+    `body_hash` raises IdempotencyMismatch.
+    """
+    entry, owner = memory_store.claim(key, body_hash)
+    if not owner:
+        if not entry.done.wait(IDEMPOTENCY_WAIT_SECONDS):
+            raise IdempotencyConflict(f"Request {key} is still in progress")
+        if entry.error is not None:
+            raise entry.error
+        logger.info(
+            "Replaying idempotent response",
+            extra={"event": "idempotent_replay", "key": key},
+        )
+        return entry.response, True
+
+    holds_claim = False
+    try:
+        if lakebase_store is not None:
+            response, holds_claim = _claim_remote(key, body_hash)
+            if not holds_claim:
+                memory_store.complete(key, entry, response)
+                return response, True
+
+        response = fn()
+    except BaseException as e:
+        memory_store.fail(key, entry, e)
+        if holds_claim:
+            try:
+                lakebase_store.release(key)
+            except Exception:
+                logger.exception(
+                    "Failed to release idempotency key",
+                    extra={"event": "idempotency_release_failed", "key": key},
+                )
+        raise
+
+    memory_store.complete(key, entry, response)
+    if lakebase_store is not None:
+        try:
+            lakebase_store.complete(key, response)
+        except Exception:
+            logger.exception(
+                "Failed to store idempotent response",
+                extra={"event": "idempotency_store_failed", "key": key},
+            )
+    return response, False
@@ -0,0 +1,213 @@
+import asyncio
+import time
+from typing import AsyncIterator, Optional, Tuple
+import orjson
+from pydantic import ValidationError
+from starlette.concurrency import run_in_threadpool
+from app.core.config import (
+    IDEMPOTENCY_ENABLED,
+    INGEST_CONCURRENCY,
+    INGEST_QUEUE_SIZE,
+    INGEST_ITEMS_PER_SECOND,
+    INGEST_MAX_LINE_BYTES,
+)
+from app.core.logging_config import get_logger
+from app.core.resources import resources
+from app.core.workspaces import UnknownWorkspaceError, resolve, use_workspace
+from app.databricks_api import DatabricksAPIError
+from app.models.analysis_payload import AnalysisPayload
+from app.models.study_payload import StudyPayload
+from app.services.analysis_setup import process_analysis_payload
+from app.services.capture_metadata import record_audit
+from app.services.idempotency import (
+    IdempotencyConflict,
+    request_hash,
+    request_key,
+    run_idempotent,
+)
+from app.services.study_resources import process_payload
+from app.utils.rate_limiter import RateLimiter
+
+logger = get_logger("ingest")
+
+ROUTE = "/ingest"
+
+# Shared by every ingest stream, so concurrent batches split the same budget
+limiter = RateLimiter(INGEST_ITEMS_PER_SECOND)
+
+_DONE = object()
+
+
+async def iter_lines(
+    stream: AsyncIterator[bytes], max_line_bytes: int = INGEST_MAX_LINE_BYTES
+) -> AsyncIterator[Tuple[int, Optional[bytes]]]:
+    """
+    Yield (line number, line) from a byte stream as lines complete. Only the
+    unfinished line is buffered; lines over max_line_bytes are yielded as
+    None and the rest of them is skipped.
+    """
+    buffer = bytearray()
+    line_no = 0
+    skipping = False
+    async for chunk in stream:
+        start = 0
+        while True:
+            end = chunk.find(b"\n", start)
+            if end == -1:
+                if not skipping:
+                    buffer += chunk[start:]
+                    if len(buffer) > max_line_bytes:
+                        buffer.clear()
+                        skipping = True
+                break
+            line_no += 1
+            if skipping:
+                skipping = False
+                yield line_no, None
+            else:
+                buffer += chunk[start:end]
+                line = bytes(buffer).strip()
+                buffer.clear()
+                if len(line) > max_line_bytes:
+                    yield line_no, None
+                elif line:
+                    yield line_no, line
+            start = end + 1
+    line = bytes(buffer).strip()
+    if skipping:
+        yield line_no + 1, None
+    elif line:
+        yield line_no + 1, line
+
+
+def parse_line(line: bytes):
+    """
+    Validate one NDJSON line as an AnalysisPayload (business_metadata has an
+    analysis_type) or a StudyPayload.
+    """
+    data = orjson.loads(line)
+    if not isinstance(data, dict):
+        raise ValueError("Line is not a JSON object")
+    metadata = data.get("business_metadata") or {}
+    if "analysis_type" in metadata:
+        return AnalysisPayload.model_validate(data)
+    return StudyPayload.model_validate(data)
+
+
+def _provision(line: bytes, payload) -> Tuple[dict, bool]:
+    limiter.acquire()
+    workspace = resolve(payload.business_metadata.product_name, payload.workspace)
+    if isinstance(payload, AnalysisPayload):
+        fn = lambda: process_analysis_payload(payload)
+    else:
+        fn = lambda: process_payload(payload)
+    with use_workspace(workspace), resources.track():
+        if not IDEMPOTENCY_ENABLED:
+            return fn(), False
+        return run_idempotent(
+            request_key(ROUTE, None, line), request_hash(ROUTE, line), fn
+        )
+
+
+def _result(line_no: int, status: str, status_code: int, **fields) -> Tuple[str, bytes]:
+    return status, orjson.dumps(
+        {"line": line_no, "status": status, "status_code": status_code, **fields}
+    ) + b"\n"
+
+
+async def _process(line_no: int, line: Optional[bytes]) -> Tuple[str, bytes]:
+    if line is None:
+        return _result(
+            line_no, "invalid", 413, message=f"Line exceeds {INGEST_MAX_LINE_BYTES} bytes"
+        )
+    try:
+        payload = parse_line(line)
+    except ValidationError as e:
+        return _result(
+            line_no, "invalid", 422, errors=e.errors(include_url=False, include_context=False)
+        )
+    except ValueError as e:
+        return _result(line_no, "invalid", 400, message=str(e))
+
+    started = time.perf_counter()
+    try:
+        response, replayed = await run_in_threadpool(_provision, line, payload)
+    except UnknownWorkspaceError as e:
+        status, status_code, fields = "invalid", 400, {"message": str(e)}
+    except DatabricksAPIError as e:
+        status, status_code, fields = "error", e.status_code, {"message": e.message}
+    except IdempotencyConflict as e:
+        status, status_code, fields = "error", 409, {"message": str(e)}
+    except Exception as e:
+        logger.exception(
+            "Ingest line failed",
+            extra={"event": "ingest_line_exception", "line": line_no},
+        )
+        status, status_code, fields = "error", 500, {"message": str(e)}
+    else:
+        status, status_code = "success", 200
+        fields = {"response": response, "replayed": replayed}
+
+    # Audited like /study-setup and /analysis-setup
+    audited = (
+        response
+        if status == "success"
+        else {"status": status, "message": fields["message"]}
+    )
+    await run_in_threadpool(record_audit, payload, audited, status_code, started)
+    return _result(line_no, status, status_code, **fields)
+
+
+async def ingest(stream: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """
+    Provision every line of an NDJSON body and stream one NDJSON result per
+    line, in completion order, while the body is still being read.
+
+    Lines wait in a bounded queue for INGEST_CONCURRENCY workers and results
+    in a bounded queue for the client, so a slow pipeline stops the body
+    from being read and a slow client stops the pipeline: memory stays flat
+    whatever the batch size.
+    """
+    lines: asyncio.Queue = asyncio.Queue(INGEST_QUEUE_SIZE)
+    results: asyncio.Queue = asyncio.Queue(INGEST_QUEUE_SIZE)
+    counts = {"lines": 0, "success": 0, "error": 0, "invalid": 0}
+
+    async def read():
+        try:
+            async for item in iter_lines(stream):
+                await lines.put(item)
+        except Exception as e:
+            # A broken body still reports the lines read so far
+            await results.put(_result(0, "error", 400, message=f"Body read failed: {e}"))
+        finally:
+            for _ in range(INGEST_CONCURRENCY):
+                await lines.put(_DONE)
+
+    async def work():
+        while True:
+            item = await lines.get()
+            if item is _DONE:
+                break
+            await results.put(await _process(*item))
+        await results.put(_DONE)
+
+    tasks = [asyncio.create_task(read())] + [
+        asyncio.create_task(work()) for _ in range(INGEST_CONCURRENCY)
+    ]
+    try:
+        running = INGEST_CONCURRENCY
+        while running:
+            result = await results.get()
+            if result is _DONE:
+                running -= 1
+                continue
+            status, body = result
+            counts["lines"] += 1
+            counts[status] += 1
+            yield body
+        logger.info("Ingest completed", extra={"event": "ingest_completed", **counts})
+    finally:
+        # Client gone or stream finished: stop reading and provisioning
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
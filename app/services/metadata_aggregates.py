@@ -0,0 +1,97 @@
+import hashlib
+from threading import Lock
+from time import monotonic
+from typing import Dict, Tuple
+import orjson
+from app.core.config import AGGREGATES_CACHE_TTL_SECONDS
+from app.core.lakebase import PreparedStatement, execute, get_connection
+
+AGGREGATES_QUERY = """
+    SELECT
+        product_name,
+        study,
+        http_status_code,
+        SUM(request_count),
+        SUM(error_count),
+        SUM(total_response_time)
+    FROM metadata_rollup_minute
+    WHERE bucket >= date_trunc('minute', now() - make_interval(mins => %s))
+    GROUP BY product_name, study, http_status_code
+    ORDER BY product_name, study, http_status_code
+    """
+
+AGGREGATES = PreparedStatement("select_aggregates", AGGREGATES_QUERY)
+
+# (window_minutes, by_study) -> (expires_at, etag, body)
+_cache: Dict[Tuple[int, bool], Tuple[float, str, bytes]] = {}
+_lock = Lock()
+
+
+def _summarize(rows, by_study: bool) -> list:
+    groups: Dict[Tuple[str, ...], dict] = {}
+    for product, study, status, requests, errors, total_time in rows:
+        key = (product, study) if by_study else (product,)
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {
+                "product_name": product,
+                "request_count": 0,
+                "error_count": 0,
+                "total_response_time": 0.0,
+                "status_counts": {},
+            }
+            if by_study:
+                group["study"] = study
+        group["request_count"] += int(requests)
+        group["error_count"] += int(errors)
+        group["total_response_time"] += float(total_time)
+        counts = group["status_counts"]
+        counts[str(status)] = counts.get(str(status), 0) + int(requests)
+
+    summary = []
+    for group in groups.values():
+        count = group["request_count"]
+        total_time = group.pop("total_response_time")
+        group["error_rate"] = group["error_count"] / count if count else 0.0
+        group["avg_api_response_time"] = total_time / count if count else None
+        summary.append(group)
+    return summary
+
+
+def fetch_aggregates(window_minutes: int = 60, by_study: bool = False) -> dict:
+    """
+    Request counts, error rates and average api_response_time per product
+    (and optionally study) over the last window_minutes, read from the
+    per-minute rollup table.
+    """
+    with get_connection(readonly=True) as conn:
+        with conn.cursor() as cursor:
+            execute(cursor, AGGREGATES, (window_minutes,))
+            rows = cursor.fetchall()
+
+    return {
+        "window_minutes": window_minutes,
+        "by_study": by_study,
+        "groups": _summarize(rows, by_study),
+    }
+
+
+def get_cached_aggregates(window_minutes: int = 60, by_study: bool = False):
+    """
+    Return (etag, encoded body) for the aggregates, recomputed at most once
+    per AGGREGATES_CACHE_TTL_SECONDS however often dashboards poll.
+    """
+    key = (window_minutes, by_study)
+    entry = _cache.get(key)
+    if entry and entry[0] > monotonic():
+        return entry[1], entry[2]
+
+    with _lock:
+        # Another poller may have refreshed while this one waited
+        entry = _cache.get(key)
+        if entry and entry[0] > monotonic():
+            return entry[1], entry[2]
+        body = orjson.dumps(fetch_aggregates(window_minutes, by_study))
+        etag = f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+        _cache[key] = (monotonic() + AGGREGATES_CACHE_TTL_SECONDS, etag, body)
+        return etag, body
@@ -0,0 +1,178 @@
+import gzip
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+import app.databricks_api as dbx
+from app.core.config import (
+    RETENTION_DAYS,
+    RETENTION_RUN_HOUR_UTC,
+    RETENTION_BATCH_SIZE,
+    RETENTION_MAX_BATCHES,
+    RETENTION_ARCHIVE_PATH,
+    ROLLUP_RETENTION_DAYS,
+)
+from app.core.lakebase import get_connection
+from app.core.logging_config import get_logger
+from app.utils.time_logging import timed_op
+
+logger = get_logger("metadata_retention")
+
+# Oldest expired rows of one status class, locked so concurrent runs skip them.
+# Rows come back as JSON text straight from Postgres for the NDJSON archive.
+SELECT_EXPIRED_QUERY = """
+    SELECT m.id, row_to_json(m)::text
+    FROM metadata m
+    WHERE {status_filter}
+      AND m.created_at < %s
+    ORDER BY m.id
+    LIMIT %s
+    FOR UPDATE SKIP LOCKED
+    """
+
+STATUS_CLASS_FILTER = "m.http_status_code >= %s AND m.http_status_code < %s"
+# Rows without a usable status (-1, NULL, ...) still expire
+OTHER_STATUS_FILTER = (
+    "(m.http_status_code IS NULL OR m.http_status_code < 200 OR m.http_status_code >= 600)"
+)
+OTHER_STATUS_CLASS = "other"
+
+DELETE_QUERY = "DELETE FROM metadata WHERE id = ANY(%s)"
+
+DELETE_ROLLUPS_QUERY = """
+    DELETE FROM metadata_rollup_minute
+    WHERE ctid = ANY(ARRAY(
+        SELECT ctid FROM metadata_rollup_minute WHERE bucket < %s LIMIT %s
+    ))
+    """
+
+_stop = threading.Event()
+_scheduler: Optional[threading.Thread] = None
+
+
+def _status_range(status_class: str):
+    """'4xx' -> (400, 500)"""
+    low = int(status_class[0]) * 100
+    return low, low + 100
+
+
+def _select_expired(status_class: str):
+    """SELECT_EXPIRED_QUERY for one status class, and its status parameters."""
+    if status_class == OTHER_STATUS_CLASS:
+        return SELECT_EXPIRED_QUERY.format(status_filter=OTHER_STATUS_FILTER), ()
+    return (
+        SELECT_EXPIRED_QUERY.format(status_filter=STATUS_CLASS_FILTER),
+        _status_range(status_class),
+    )
+
+
+def _archive(status_class: str, cutoff: datetime, ids, lines) -> str:
+    path = (
+        f"{RETENTION_ARCHIVE_PATH}/{status_class}/{cutoff:%Y-%m-%d}/"
+        f"metadata_{ids[0]}_{ids[-1]}.ndjson.gz"
+    )
+    contents = gzip.compress("\n".join(lines).encode() + b"\n")
+    with timed_op(
+        logger=logger,
+        event="archive_metadata",
+        extra={"path": path, "rows": len(ids), "bytes": len(contents)},
+    ):
+        dbx.upload_file(path, contents, overwrite=True)
+    return path
+
+
+def _purge_batch(status_class: str, cutoff: datetime) -> int:
+    """
+    Archive and delete one bounded batch in a single transaction; rows are
+    only deleted once their archive file has been written.
+    """
+    query, status_params = _select_expired(status_class)
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(query, (*status_params, cutoff, RETENTION_BATCH_SIZE))
+            rows = cursor.fetchall()
+            if not rows:
+                return 0
+            ids = [row[0] for row in rows]
+            if RETENTION_ARCHIVE_PATH:
+                _archive(status_class, cutoff, ids, [row[1] for row in rows])
+            cursor.execute(DELETE_QUERY, (ids,))
+    return len(ids)
+
+
+def _purge_rollup_batch(cutoff: datetime) -> int:
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute(DELETE_ROLLUPS_QUERY, (cutoff, RETENTION_BATCH_SIZE))
+            return cursor.rowcount
+
+
+def run_retention(now: Optional[datetime] = None) -> dict:
+    """
+    Apply RETENTION_DAYS to every status class and ROLLUP_RETENTION_DAYS to
+    the per-minute rollups, at most RETENTION_MAX_BATCHES batches of
+    RETENTION_BATCH_SIZE rows per run.
+    """
+    # Aware, so the comparison with TIMESTAMPTZ ignores the session time zone
+    now = now or datetime.now(timezone.utc)
+    deleted = {}
+    batches = 0
+    for status_class, days in RETENTION_DAYS.items():
+        cutoff = now - timedelta(days=days)
+        deleted[status_class] = 0
+        while batches < RETENTION_MAX_BATCHES and not _stop.is_set():
+            count = _purge_batch(status_class, cutoff)
+            if not count:
+                break
+            batches += 1
+            deleted[status_class] += count
+
+    rollup_cutoff = now - timedelta(days=ROLLUP_RETENTION_DAYS)
+    deleted["rollups"] = 0
+    while batches < RETENTION_MAX_BATCHES and not _stop.is_set():
+        count = _purge_rollup_batch(rollup_cutoff)
+        if not count:
+            break
+        batches += 1
+        deleted["rollups"] += count
+
+    logger.info(
+        "Retention run completed",
+        extra={"event": "retention_completed", "deleted": deleted, "batches": batches},
+    )
+    return {"deleted": deleted, "batches": batches, "archived": bool(RETENTION_ARCHIVE_PATH)}
+
+
+def _seconds_until_next_run() -> float:
+    now = datetime.now(timezone.utc)
+    next_run = now.replace(hour=RETENTION_RUN_HOUR_UTC, minute=0, second=0, microsecond=0)
+    if next_run <= now:
+        next_run += timedelta(days=1)
+    return (next_run - now).total_seconds()
+
+
+def _scheduler_loop():
+    while not _stop.wait(_seconds_until_next_run()):
+        try:
+            run_retention()
+        except Exception:
+            logger.exception("Retention run failed", extra={"event": "retention_failed"})
+
+
+def start_retention_scheduler():
+    """
+    Run retention daily at RETENTION_RUN_HOUR_UTC in a background thread.
+    """
+    global _scheduler
+    if _scheduler is not None and _scheduler.is_alive():
+        return
+    _stop.clear()
+    _scheduler = threading.Thread(
+        target=_scheduler_loop, name="metadata-retention", daemon=True
+    )
+    _scheduler.start()
+
+
+def stop_retention_scheduler(timeout: Optional[float] = None):
+    _stop.set()
+    if _scheduler is not None:
+        _scheduler.join(timeout)
@@ -0,0 +1,128 @@
+import sys
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Dict, Iterable, Iterator, List, Tuple
+from app.core.config import ACCESS_MAP, UC_GRANT_MAX_CHANGES, UC_GRANT_MAX_BYTES
+
+# Every privilege named in ACCESS_MAP, in first-seen order; bit i is PRIVILEGE_ORDER[i]
+PRIVILEGE_ORDER: Tuple[str, ...] = tuple(
+    dict.fromkeys(
+        sys.intern(privilege)
+        for privileges in ACCESS_MAP.values()
+        for privilege in privileges
+    )
+)
+_BITS: Dict[str, int] = {privilege: 1 << i for i, privilege in enumerate(PRIVILEGE_ORDER)}
+
+# Access level -> privilege bitset, compiled once
+LEVEL_MASKS: Dict[str, int] = {
+    level: sum(_BITS[privilege] for privilege in set(privileges))
+    for level, privileges in ACCESS_MAP.items()
+}
+
+
+@lru_cache(maxsize=None)
+def privileges(mask: int) -> Tuple[str, ...]:
+    """
+    Privileges of a bitset, in ACCESS_MAP order. The same tuple object is
+    returned for equal bitsets, so principals with the same rights share it.
+    """
+    return tuple(p for p in PRIVILEGE_ORDER if mask & _BITS[p])
+
+
+@lru_cache(maxsize=1024)
+def mask_of(privilege_names: Tuple[str, ...]) -> int:
+    """Bitset of a privilege tuple; names outside ACCESS_MAP are not representable."""
+    try:
+        return sum(_BITS[p] for p in set(privilege_names))
+    except KeyError as e:
+        raise ValueError(f"Unknown privilege {e.args[0]}") from None
+
+
+@dataclass(frozen=True, slots=True)
+class GrantGroup:
+    """Principals receiving the same privilege set on one securable."""
+
+    add: Tuple[str, ...]
+    principals: Tuple[str, ...]
+
+    def add_size(self) -> int:
+        # Encoded size of {"add":["A","B"],"principal":""}, without the principal
+        return 26 + sum(len(p) + 3 for p in self.add)
+
+
+class GrantSet:
+    """
+    Privileges per principal on one securable. Levels granted to the same
+    principal are merged by OR-ing their bitsets.
+    """
+
+    __slots__ = ("masks",)
+
+    def __init__(self):
+        self.masks: Dict[str, int] = {}
+
+    def add(self, principal: str, mask: int):
+        masks = self.masks
+        masks[principal] = masks.get(principal, 0) | mask
+
+    def groups(self) -> Tuple[GrantGroup, ...]:
+        """Principals grouped by identical privilege set, in first-seen order."""
+        grouped: Dict[int, List[str]] = {}
+        for principal, mask in self.masks.items():
+            principals = grouped.get(mask)
+            if principals is None:
+                principals = grouped[mask] = []
+            principals.append(principal)
+        return tuple(
+            GrantGroup(privileges(mask), tuple(principals))
+            for mask, principals in grouped.items()
+        )
+
+
+def change_count(groups: Iterable[GrantGroup]) -> int:
+    return sum(len(group.principals) for group in groups)
+
+
+def chunk_changes(
+    groups: Iterable[GrantGroup],
+    max_changes: int = UC_GRANT_MAX_CHANGES,
+    max_bytes: int = UC_GRANT_MAX_BYTES,
+) -> Iterator[Tuple[GrantGroup, ...]]:
+    """
+    Split grouped changes into PATCH-sized chunks of at most max_changes
+    principals and roughly max_bytes of JSON each. A group spanning a chunk
+    boundary is sliced, never copied per principal.
+    """
+    chunk: List[GrantGroup] = []
+    count = size = 0
+    for group in groups:
+        add_size = group.add_size()
+        principals = group.principals
+        start = 0
+        for i, principal in enumerate(principals):
+            change_size = add_size + len(principal)
+            if count and (count >= max_changes or size + change_size > max_bytes):
+                if i > start:
+                    chunk.append(GrantGroup(group.add, principals[start:i]))
+                yield tuple(chunk)
+                chunk, count, size, start = [], 0, 0, i
+            count += 1
+            size += change_size
+        if start == 0:
+            chunk.append(group)
+        elif start < len(principals):
+            chunk.append(GrantGroup(group.add, principals[start:]))
+    if chunk:
+        yield tuple(chunk)
+
+
+def changes_payload(groups: Iterable[GrantGroup]) -> dict:
+    """PATCH body for Unity Catalog: one change per principal."""
+    return {
+        "changes": [
+            {"add": group.add, "principal": principal}
+            for group in groups
+            for principal in group.principals
+        ]
+    }
@@ -0,0 +1,129 @@
+import math
+from typing import Dict, Optional
+import app.databricks_api as dbx
+from app.core.config import (
+    DATABRICKS_MAX_CONCURRENCY,
+    DEFAULT_OPERATION_LATENCY_MS,
+    PLAN_FAN_OUT,
+)
+from app.services import workspace_state
+from app.services.workspace_index import index as workspace_index
+from app.services.provisioning_plan import ProvisioningPlan
+from app.utils import latency_stats
+
+# timed_op event -> Databricks API family it calls
+API_FAMILIES: Dict[str, str] = {
+    "list_catalogs": "unity-catalog/catalogs",
+    "create_schema": "unity-catalog/schemas",
+    "create_volume": "unity-catalog/volumes",
+    "create_directory": "fs/directories",
+    "grant_permissions": "unity-catalog/permissions",
+}
+
+
+def diff_plan(plan: ProvisioningPlan) -> dict:
+    """
+    Compare a plan with the workspace index, or cached workspace state when
+    the index is stale, and count the schemas and volumes that already
+    exist. execute_plan still sends those creates and they fail as already
+    existing. Directories and grants are idempotent upstream.
+    """
+    if workspace_index.has_catalog(plan.catalog) is not None:
+        return _diff_from_index(plan)
+
+    if plan.catalog not in workspace_state.catalog_names():
+        return {"catalog_exists": False, "existing": {}}
+
+    existing_schemas = workspace_state.schema_names(plan.catalog)
+    schemas = sum(1 for op in plan.schemas if op.name in existing_schemas)
+    volumes = 0
+    for op in plan.volumes:
+        if op.schema in existing_schemas and op.name in workspace_state.volume_names(
+            op.catalog, op.schema
+        ):
+            volumes += 1
+
+    return {
+        "catalog_exists": True,
+        "existing": {"create_schema": schemas, "create_volume": volumes},
+    }
+
+
+def _diff_from_index(plan: ProvisioningPlan) -> dict:
+    if not workspace_index.has_catalog(plan.catalog):
+        return {"catalog_exists": False, "existing": {}}
+    schemas = sum(
+        1 for op in plan.schemas if workspace_index.has_schema(op.catalog, op.name)
+    )
+    volumes = sum(
+        1
+        for op in plan.volumes
+        if workspace_index.has_volume(op.catalog, op.schema, op.name)
+    )
+    return {
+        "catalog_exists": True,
+        "existing": {"create_schema": schemas, "create_volume": volumes},
+    }
+
+
+def estimate_plan(plan: ProvisioningPlan, diff: Optional[dict] = None) -> dict:
+    """
+    Count the API calls a plan needs per family and estimate its duration
+    from the latencies timed_op has observed so far. Creates the diff found
+    to exist already are still sent, so they are counted and also reported
+    as expected conflicts.
+    """
+    existing = (diff or {}).get("existing", {})
+    # Only leaf directories are sent; parents are created implicitly
+    directory_calls = len(
+        set(dbx.normalize_directory_paths(op.path for op in plan.directories).values())
+    )
+    counts = {
+        "list_catalogs": 1,
+        "create_schema": len(plan.schemas),
+        "create_volume": len(plan.volumes),
+        "create_directory": directory_calls,
+        "grant_permissions": sum(len(op.chunks()) for op in plan.grants),
+    }
+    # Concurrent calls cost one latency per wave
+    waves = {
+        "create_schema": math.ceil(counts["create_schema"] / PLAN_FAN_OUT),
+        "create_volume": math.ceil(counts["create_volume"] / PLAN_FAN_OUT),
+        "create_directory": math.ceil(directory_calls / DATABRICKS_MAX_CONCURRENCY),
+        "grant_permissions": math.ceil(counts["grant_permissions"] / PLAN_FAN_OUT),
+    }
+
+    operations: Dict[str, int] = {}
+    latencies: Dict[str, float] = {}
+    estimated_ms = 0.0
+    for event, count in counts.items():
+        if count <= 0:
+            continue
+        observed = latency_stats.observed_ms(event)
+        latency = observed if observed is not None else DEFAULT_OPERATION_LATENCY_MS
+        family = API_FAMILIES[event]
+        operations[family] = operations.get(family, 0) + count
+        latencies[family] = round(latency, 1)
+        estimated_ms += waves.get(event, count) * latency
+
+    return {
+        "operations": operations,
+        "total_operations": sum(operations.values()),
+        "latency_ms_per_operation": latencies,
+        "estimated_duration_ms": int(estimated_ms),
+        # Creates that will fail because the securable already exists
+        "expected_conflicts": {
+            API_FAMILIES[event]: count for event, count in existing.items() if count
+        },
+    }
+
+
+def plan_response(plan: ProvisioningPlan, diff: bool = False) -> dict:
+    """
+    Plan-only response: the plan itself plus its cost estimate.
+    """
+    plan_diff = diff_plan(plan) if diff else None
+    response = {"plan": plan.to_dict(), "estimate": estimate_plan(plan, plan_diff)}
+    if plan_diff is not None:
+        response["diff"] = plan_diff
+    return response
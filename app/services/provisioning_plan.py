@@ -0,0 +1,500 @@
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+from app.models.study_payload import StudyPayload
+from app.models.analysis_payload import AnalysisPayload
+from app.models.snapshot_payload import CreateSnapshotPayload
+import app.databricks_api as dbx
+from app.core.config import PLAN_FAN_OUT
+from app.services.permissions import (
+    LEVEL_MASKS,
+    GrantGroup,
+    GrantSet,
+    change_count,
+    changes_payload,
+    chunk_changes,
+)
+from app.services.grant_batcher import batcher as grant_batcher
+from app.services.workspace_index import index as workspace_index
+from app.utils.time_logging import timed_op
+
+
+# --- Naming ---
+def study_schema_name(study: str, schema: str) -> str:
+    return f"{study}_{schema}"
+
+
+def analysis_schema_name(study: str, analysis_type: str, schema: str) -> str:
+    return f"{study}_{analysis_type}_{schema}"
+
+
+def volume_schema_name(study: str) -> str:
+    return f"{study}_volumes"
+
+
+def snapshot_schema_name(study: str) -> str:
+    return f"{study}_snapshot"
+
+
+def full_name(*parts: str) -> str:
+    return ".".join(parts)
+
+
+# --- Plan items ---
+@dataclass(frozen=True, slots=True)
+class SchemaOp:
+    catalog: str
+    name: str
+
+    @property
+    def full_name(self) -> str:
+        return full_name(self.catalog, self.name)
+
+
+@dataclass(frozen=True, slots=True)
+class VolumeOp:
+    catalog: str
+    schema: str
+    name: str
+
+    @property
+    def full_name(self) -> str:
+        return full_name(self.catalog, self.schema, self.name)
+
+    @property
+    def path(self) -> str:
+        return f"/Volumes/{self.catalog}/{self.schema}/{self.name}"
+
+
+@dataclass(frozen=True, slots=True)
+class DirectoryOp:
+    volume: VolumeOp
+    directory: str
+
+    @property
+    def path(self) -> str:
+        return f"{self.volume.path}/{self.directory}"
+
+
+@dataclass(frozen=True, slots=True)
+class GrantOp:
+    object_type: str
+    full_name: str
+    # Principals grouped by identical privilege set
+    groups: Tuple[GrantGroup, ...]
+
+    def change_count(self) -> int:
+        return change_count(self.groups)
+
+    def access_payload(self) -> dict:
+        return changes_payload(self.groups)
+
+    def chunks(self) -> Tuple[Tuple[GrantGroup, ...], ...]:
+        """The changes split into request-sized PATCH bodies."""
+        return tuple(chunk_changes(self.groups))
+
+
+@dataclass(frozen=True, slots=True)
+class InvalidAccess:
+    full_name: str
+    group: str
+    access: str
+
+
+@dataclass(frozen=True, slots=True)
+class ProvisioningPlan:
+    """
+    Every securable, path and grant a payload needs, computed once.
+    Items are de-duplicated and kept in first-seen payload order.
+    """
+
+    catalog: str
+    schemas: Tuple[SchemaOp, ...] = ()
+    volumes: Tuple[VolumeOp, ...] = ()
+    directories: Tuple[DirectoryOp, ...] = ()
+    grants: Tuple[GrantOp, ...] = ()
+    invalid_access: Tuple[InvalidAccess, ...] = ()
+
+    def operation_count(self) -> int:
+        return (
+            len(self.schemas)
+            + len(self.volumes)
+            + len(self.directories)
+            + len(self.grants)
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "catalog": self.catalog,
+            "operation_count": self.operation_count(),
+            "schemas": [op.full_name for op in self.schemas],
+            "volumes": [op.full_name for op in self.volumes],
+            "directories": [op.path for op in self.directories],
+            "grants": [
+                {
+                    "object_type": op.object_type,
+                    "full_name": op.full_name,
+                    **op.access_payload(),
+                }
+                for op in self.grants
+            ],
+            "invalid_access": [
+                {"full_name": item.full_name, "group": item.group, "access": item.access}
+                for item in self.invalid_access
+            ],
+        }
+
+
+class _PlanBuilder:
+    """Collects plan items, dropping duplicates while keeping insertion order."""
+
+    def __init__(self, catalog: str):
+        self.catalog = catalog
+        self.schemas: Dict[SchemaOp, None] = {}
+        self.volumes: Dict[VolumeOp, None] = {}
+        self.directories: Dict[DirectoryOp, None] = {}
+        self.grants: Dict[Tuple[str, str], GrantSet] = {}
+        self.invalid_access: Dict[InvalidAccess, None] = {}
+
+    def schema(self, name: str) -> SchemaOp:
+        op = SchemaOp(self.catalog, name)
+        self.schemas[op] = None
+        return op
+
+    def volume(self, schema: str, name: str) -> VolumeOp:
+        op = VolumeOp(self.catalog, schema, name)
+        self.volumes[op] = None
+        return op
+
+    def directory(self, volume: VolumeOp, directory: str):
+        self.directories[DirectoryOp(volume, directory)] = None
+
+    def grant(self, object_type: str, securable: str, group: str, access: str):
+        self.grant_all(object_type, securable, ((group, access),))
+
+    def grant_all(self, object_type: str, securable: str, grants):
+        """Grant (group, access) pairs on one securable."""
+        key = (object_type, securable)
+        grant_set = self.grants.get(key)
+        if grant_set is None:
+            grant_set = self.grants[key] = GrantSet()
+        masks = grant_set.masks
+        for group, access in grants:
+            mask = LEVEL_MASKS.get(access)
+            if not mask:
+                self.invalid_access[InvalidAccess(securable, group, access)] = None
+                continue
+            masks[group] = masks.get(group, 0) | mask
+        if not masks:
+            del self.grants[key]
+
+    def build(self) -> ProvisioningPlan:
+        grants = tuple(
+            GrantOp(object_type, securable, grant_set.groups())
+            for (object_type, securable), grant_set in self.grants.items()
+        )
+        return ProvisioningPlan(
+            catalog=self.catalog,
+            schemas=tuple(self.schemas),
+            volumes=tuple(self.volumes),
+            directories=tuple(self.directories),
+            grants=grants,
+            invalid_access=tuple(self.invalid_access),
+        )
+
+
+def build_study_plan(payload: StudyPayload) -> ProvisioningPlan:
+    catalog_name = payload.business_metadata.product_name.lower()
+    study = payload.business_metadata.study
+    builder = _PlanBuilder(catalog_name)
+
+    for schema in payload.storage_setup.data_schemas:
+        builder.schema(study_schema_name(study, schema))
+
+    volume_schema = volume_schema_name(study)
+    for schema in payload.storage_setup.data_schemas:
+        if schema == "volumes":
+            continue
+        builder.volume(volume_schema, f"vol_{schema}")
+
+    for volume_type, dirs in payload.storage_setup.volume_directories:
+        volume = VolumeOp(catalog_name, volume_schema, f"vol_{volume_type}")
+        for directory_name in dirs:
+            builder.directory(volume, directory_name)
+
+    for schema_name, control in (payload.access_controls or {}).items():
+        securable = full_name(catalog_name, study_schema_name(study, schema_name))
+        builder.grant_all(
+            "SCHEMA",
+            securable,
+            ((group.group, group.access) for group in control.groups or []),
+        )
+
+    return builder.build()
+
+
+def build_analysis_plan(payload: AnalysisPayload) -> ProvisioningPlan:
+    catalog_name = payload.business_metadata.product_name.lower()
+    study = payload.business_metadata.study
+    analysis_type = payload.business_metadata.analysis_type
+    builder = _PlanBuilder(catalog_name)
+
+    analysis_schemas = [
+        builder.schema(analysis_schema_name(study, analysis_type, schema))
+        for schema in payload.storage_setup.data_layer_schemas
+    ]
+
+    # volumes already under studyname_volumes schema
+    volume_schema = volume_schema_name(study)
+    volume = builder.volume(volume_schema, f"{analysis_type}_vol")
+    for directory in payload.storage_setup.volume_directories:
+        builder.directory(volume, directory)
+
+    # Table action applies to the analysis schemas, volume action to the volume schema
+    volume_securable = full_name(catalog_name, volume_schema)
+    for group in (payload.access_controls or {}).values():
+        for schema in analysis_schemas:
+            builder.grant("SCHEMA", schema.full_name, group.group, group.table_actions)
+        builder.grant("SCHEMA", volume_securable, group.group, group.volume_action)
+
+    return builder.build()
+
+
+def build_snapshot_plan(payload: CreateSnapshotPayload) -> ProvisioningPlan:
+    builder = _PlanBuilder(payload.product.lower())
+    builder.schema(snapshot_schema_name(payload.study))
+    return builder.build()
+
+
+def ensure_catalog_exists(catalog_name: str, logger):
+    # Only a positive answer from the index is trusted; a miss may be a
+    # catalog created since the last refresh
+    if workspace_index.has_catalog(catalog_name):
+        return
+
+    with timed_op(logger=logger, event="list_catalogs"):
+        catalogs = dbx.list_catalogs().get("catalogs", [])
+
+    if catalog_name not in [c["name"] for c in catalogs]:
+        logger.error(
+            "Catalog not found",
+            extra={"event": "catalog_missing", "catalog": catalog_name},
+        )
+        raise dbx.DatabricksAPIError(404, f"Catalog {catalog_name} not found")
+
+
+@dataclass(frozen=True, slots=True)
+class OperationFailure:
+    operation: str
+    securable: str
+    status_code: int
+    message: str
+    # Principals of a failed grant
+    groups: Tuple[str, ...] = ()
+
+    def describe(self) -> str:
+        text = f"{self.operation} {self.securable}"
+        if self.groups:
+            shown = ", ".join(self.groups[:10])
+            more = len(self.groups) - 10
+            text += f" for {shown}" + (f" and {more} more" if more > 0 else "")
+        return f"{text} ({self.status_code}: {self.message})"
+
+
+class PlanExecutionError(dbx.DatabricksAPIError):
+    """
+    Every operation of a plan that failed. The status code is the first
+    failure's; operations depending on a failed one are not attempted.
+    """
+
+    def __init__(self, failures: List[OperationFailure]):
+        self.failures = failures
+        shown = "; ".join(f.describe() for f in failures[:20])
+        more = len(failures) - 20
+        super().__init__(
+            failures[0].status_code,
+            f"{len(failures)} operation(s) failed: {shown}"
+            + (f"; and {more} more" if more > 0 else ""),
+        )
+
+
+def _log_invalid_access(plan: ProvisioningPlan, logger):
+    # One warning per unknown level rather than per group
+    invalid: Dict[str, List[InvalidAccess]] = {}
+    for item in plan.invalid_access:
+        invalid.setdefault(item.access, []).append(item)
+    for access, items in invalid.items():
+        logger.warning(
+            "Invalid access level",
+            extra={
+                "event": "invalid_access_level",
+                "access": access,
+                "count": len(items),
+                "groups": sorted({item.group for item in items})[:20],
+                "full_names": sorted({item.full_name for item in items}),
+            },
+        )
+
+
+def _create_schema(op: SchemaOp, logger):
+    with timed_op(
+        logger=logger,
+        event="create_schema",
+        extra={"schema": op.name, "catalog": op.catalog},
+    ):
+        dbx.create_schema(op.name, op.catalog)
+    workspace_index.record_schema(op.catalog, op.name)
+
+
+def _create_volume(op: VolumeOp, logger):
+    with timed_op(
+        logger=logger,
+        event="create_volume",
+        extra={"volume": op.name, "schema": op.schema, "catalog": op.catalog},
+    ):
+        dbx.create_volume(op.name, op.schema, op.catalog)
+    workspace_index.record_volume(op.catalog, op.schema, op.name)
+
+
+def _grant(op: GrantOp, logger):
+    logger.debug(
+        "Prepared access payload",
+        extra={
+            "event": "access_payload_prepared",
+            "full_name": op.full_name,
+            "changes_count": op.change_count(),
+            "privilege_sets": len(op.groups),
+        },
+    )
+    # Concurrent requests granting on the same securable share one PATCH
+    with timed_op(
+        logger=logger,
+        event="grant_permissions",
+        extra={
+            "object_type": op.object_type,
+            "full_name": op.full_name,
+            "changes_count": op.change_count(),
+        },
+    ):
+        grant_batcher.grant(op.object_type, op.full_name, op.groups)
+
+
+def _create_directories(
+    directories: List[DirectoryOp], catalog: str, logger
+) -> List[OperationFailure]:
+    with timed_op(
+        logger=logger,
+        event="create_directories",
+        extra={"catalog": catalog, "directories_count": len(directories)},
+    ):
+        results = dbx.create_directories(op.path for op in directories)
+    return [
+        OperationFailure(
+            "create_directory",
+            path,
+            result.get("status_code", 500),
+            result.get("message", ""),
+        )
+        for path, result in results.items()
+        if result["status"] != "success"
+    ]
+
+
+def _collect(
+    futures: List[Tuple[Future, str, str, Tuple[str, ...]]], logger
+) -> List[OperationFailure]:
+    failures = []
+    for future, operation, securable, groups in futures:
+        try:
+            future.result()
+        except dbx.DatabricksAPIError as e:
+            failures.append(
+                OperationFailure(operation, securable, e.status_code, e.message, groups)
+            )
+    for failure in failures:
+        logger.error(
+            "Plan operation failed",
+            extra={
+                "event": "plan_operation_failed",
+                "operation": failure.operation,
+                "securable": failure.securable,
+                "status_code": failure.status_code,
+                "groups": list(failure.groups[:20]),
+            },
+        )
+    return failures
+
+
+def execute_plan(plan: ProvisioningPlan, logger, fan_out: Optional[int] = None):
+    """
+    Run a plan against Databricks with up to `fan_out` (default
+    PLAN_FAN_OUT) calls in flight:
+    schemas first, then volumes and grants together, with directories
+    created as soon as their volumes exist. Operations whose schema or
+    volume failed are skipped and all failures are raised together as a
+    PlanExecutionError.
+    """
+    _log_invalid_access(plan, logger)
+
+    workers = max(1, fan_out or PLAN_FAN_OUT)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+
+        def submit(fn: Callable, op, operation: str, securable: str, groups=()):
+            future = executor.submit(contextvars.copy_context().run, fn, op, logger)
+            return future, operation, securable, groups
+
+        # 1. Schemas: everything else lives in them
+        schemas = [
+            submit(_create_schema, op, "create_schema", op.full_name)
+            for op in plan.schemas
+        ]
+        failures = _collect(schemas, logger)
+        failed = {f.securable for f in failures}
+
+        # 2. Volumes (queued first, directories wait on them) and grants
+        volumes = [
+            submit(_create_volume, op, "create_volume", op.full_name)
+            for op in plan.volumes
+            if full_name(op.catalog, op.schema) not in failed
+        ]
+        grants = [
+            submit(
+                _grant,
+                op,
+                "grant_permissions",
+                op.full_name,
+                tuple(p for group in op.groups for p in group.principals),
+            )
+            for op in plan.grants
+            if op.full_name not in failed
+        ]
+        volume_failures = _collect(volumes, logger)
+        failures += volume_failures
+
+        # 3. Directories of the volumes that exist, while grants are in flight
+        failed_volumes = {f.securable for f in volume_failures}
+        directories = [
+            op
+            for op in plan.directories
+            if op.volume.full_name not in failed_volumes
+            and full_name(op.volume.catalog, op.volume.schema) not in failed
+        ]
+        if directories:
+            directory_failures = _create_directories(directories, plan.catalog, logger)
+            for failure in directory_failures:
+                logger.error(
+                    "Directory creation failed",
+                    extra={
+                        "event": "create_directory_failed",
+                        "path": failure.securable,
+                        "status_code": failure.status_code,
+                        "message": failure.message,
+                    },
+                )
+            failures += directory_failures
+
+        failures += _collect(grants, logger)
+
+    if failures:
+        raise PlanExecutionError(failures)
@@ -0,0 +1,246 @@
+import sys
+import threading
+import time
+from typing import Callable, Dict, Iterator, Optional, Set
+import app.databricks_api as dbx
+from app.core import workspaces
+from app.core.config import (
+    DEFAULT_WORKSPACE,
+    WORKSPACE_INDEX_CATALOGS,
+    WORKSPACE_INDEX_REFRESH_SECONDS,
+    WORKSPACE_INDEX_MAX_AGE_SECONDS,
+    WORKSPACE_INDEX_REQUESTS_PER_SECOND,
+    WORKSPACE_INDEX_PAGE_SIZE,
+)
+from app.core.logging_config import get_logger
+from app.utils.rate_limiter import RateLimiter
+from app.utils.time_logging import timed_op
+
+logger = get_logger("workspace_index")
+
+
+class _Schema:
+    __slots__ = ("volumes", "tables")
+
+    def __init__(self):
+        self.volumes: Set[str] = set()
+        self.tables: Set[str] = set()
+
+
+class WorkspaceIndex:
+    """
+    Compact in-memory view of the managed catalogs of one workspace:
+    catalog -> schema -> volumes / tables, with interned names.
+
+    Queries answer True/False only while the index is fresh and the request
+    targets the indexed workspace, and return None otherwise, so callers
+    fall back to a live call. A full refresh builds a
+    new map and swaps it in; successful creates are applied incrementally.
+    """
+
+    def __init__(self, catalogs=WORKSPACE_INDEX_CATALOGS, workspace=DEFAULT_WORKSPACE):
+        self.workspace = workspace
+        self.managed = set(catalogs)
+        self._catalogs: Dict[str, Dict[str, _Schema]] = {}
+        self._refreshed_at: Optional[float] = None
+        # Creates recorded while a refresh is listing, replayed onto its result
+        self._pending: Optional[list] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    # --- Queries ---
+    def is_fresh(self) -> bool:
+        return (
+            self._refreshed_at is not None
+            and time.monotonic() - self._refreshed_at < WORKSPACE_INDEX_MAX_AGE_SECONDS
+        )
+
+    def _tracks(self, catalog: str) -> bool:
+        return workspaces.current_name() == self.workspace and (
+            not self.managed or catalog in self.managed
+        )
+
+    def has_catalog(self, catalog: str) -> Optional[bool]:
+        if not self.is_fresh() or not self._tracks(catalog):
+            return None
+        return catalog in self._catalogs
+
+    def _schema(self, catalog: str, schema: str) -> Optional[_Schema]:
+        return self._catalogs.get(catalog, {}).get(schema)
+
+    def has_schema(self, catalog: str, schema: str) -> Optional[bool]:
+        if not self.is_fresh() or not self._tracks(catalog):
+            return None
+        return self._schema(catalog, schema) is not None
+
+    def has_volume(self, catalog: str, schema: str, volume: str) -> Optional[bool]:
+        if not self.is_fresh() or not self._tracks(catalog):
+            return None
+        entry = self._schema(catalog, schema)
+        return entry is not None and volume in entry.volumes
+
+    def has_table(self, table_fullname: str) -> Optional[bool]:
+        if not self.is_fresh():
+            return None
+        parts = table_fullname.split(".")
+        if len(parts) != 3:
+            # Not a catalog.schema.table name: leave it to the API to reject
+            return None
+        catalog, schema, table = parts
+        if not self._tracks(catalog):
+            return None
+        entry = self._schema(catalog, schema)
+        return entry is not None and table in entry.tables
+
+    def stats(self) -> dict:
+        schemas = [s for catalog in self._catalogs.values() for s in catalog.values()]
+        return {
+            "workspace": self.workspace,
+            "fresh": self.is_fresh(),
+            "age_seconds": (
+                round(time.monotonic() - self._refreshed_at, 1)
+                if self._refreshed_at is not None
+                else None
+            ),
+            "catalogs": len(self._catalogs),
+            "schemas": len(schemas),
+            "volumes": sum(len(s.volumes) for s in schemas),
+            "tables": sum(len(s.tables) for s in schemas),
+        }
+
+    # --- Incremental updates from our own successful creates ---
+    def _record(self, catalog: str, schema: str = None, volume: str = None, table: str = None):
+        if not self._tracks(catalog):
+            return
+        with self._lock:
+            _apply(self._catalogs, catalog, schema, volume, table)
+            if self._pending is not None:
+                self._pending.append((catalog, schema, volume, table))
+
+    def record_catalog(self, catalog: str):
+        self._record(catalog)
+
+    def record_schema(self, catalog: str, schema: str):
+        self._record(catalog, schema)
+
+    def record_volume(self, catalog: str, schema: str, volume: str):
+        self._record(catalog, schema, volume=volume)
+
+    def record_table(self, table_fullname: str):
+        parts = table_fullname.split(".")
+        if len(parts) == 3:
+            catalog, schema, table = parts
+            self._record(catalog, schema, table=table)
+
+    # --- Full refresh ---
+    def refresh(self):
+        """
+        Page through the Unity Catalog list endpoints for every managed
+        catalog, at most WORKSPACE_INDEX_REQUESTS_PER_SECOND calls per second.
+        """
+        limiter = RateLimiter(WORKSPACE_INDEX_REQUESTS_PER_SECOND)
+        started = time.monotonic()
+        catalogs: Dict[str, Dict[str, _Schema]] = {}
+        with self._lock:
+            self._pending = []
+
+        try:
+            with workspaces.use_workspace(self.workspace):
+                self._list_into(limiter, catalogs)
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+
+        with self._lock:
+            for change in self._pending:
+                _apply(catalogs, *change)
+            self._pending = None
+            self._catalogs = catalogs
+            # Age is measured from the start of the listing
+            self._refreshed_at = started
+        logger.info("Workspace index refreshed", extra={"event": "workspace_index_ready", **self.stats()})
+
+    def _list_into(self, limiter: RateLimiter, catalogs: Dict[str, Dict[str, _Schema]]):
+        with timed_op(logger=logger, event="workspace_index_refresh"):
+            for item in _paged(limiter, dbx.list_catalogs, "catalogs"):
+                name = item["name"]
+                if self._tracks(name):
+                    catalogs[sys.intern(name)] = {}
+
+            for catalog, schemas in catalogs.items():
+                for item in _paged(
+                    limiter, dbx.list_schemas, "schemas", catalog_name=catalog
+                ):
+                    schemas[sys.intern(item["name"])] = _Schema()
+
+                for schema, entry in schemas.items():
+                    for item in _paged(
+                        limiter,
+                        dbx.list_volumes,
+                        "volumes",
+                        catalog_name=catalog,
+                        schema_name=schema,
+                    ):
+                        entry.volumes.add(sys.intern(item["name"]))
+
+                for item in _paged(
+                    limiter, dbx.list_table_summaries, "tables", catalog_name=catalog
+                ):
+                    _, schema, table = item["full_name"].split(".")
+                    entry = schemas.get(schema)
+                    if entry is not None:
+                        entry.tables.add(sys.intern(table))
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception(
+                    "Workspace index refresh failed",
+                    extra={"event": "workspace_index_refresh_failed"},
+                )
+            self._stop.wait(WORKSPACE_INDEX_REFRESH_SECONDS)
+
+    def start(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(
+            target=self._run, name="workspace-index", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+
+def _apply(catalogs, catalog, schema=None, volume=None, table=None):
+    schemas = catalogs.setdefault(sys.intern(catalog), {})
+    if schema is None:
+        return
+    entry = schemas.setdefault(sys.intern(schema), _Schema())
+    if volume is not None:
+        entry.volumes.add(sys.intern(volume))
+    if table is not None:
+        entry.tables.add(sys.intern(table))
+
+
+def _paged(limiter: RateLimiter, fetch: Callable, key: str, **kwargs) -> Iterator[dict]:
+    page_token = None
+    while True:
+        limiter.acquire()
+        resp = fetch(
+            page_token=page_token, max_results=WORKSPACE_INDEX_PAGE_SIZE, **kwargs
+        )
+        yield from resp.get(key, [])
+        page_token = resp.get("next_page_token")
+        if not page_token:
+            return
+
+
+index = WorkspaceIndex()
@@ -0,0 +1,75 @@
+from threading import Lock
+from time import monotonic
+from typing import Callable, Dict, FrozenSet, Tuple
+import app.databricks_api as dbx
+from app.core import workspaces
+from app.core.config import WORKSPACE_STATE_TTL_SECONDS
+
+_cache: Dict[Tuple[str, ...], Tuple[float, FrozenSet[str]]] = {}
+_lock = Lock()
+
+
+def _list_names(fetch: Callable, key: str, **kwargs) -> FrozenSet[str]:
+    names = set()
+    page_token = None
+    while True:
+        resp = fetch(page_token=page_token, **kwargs) if page_token else fetch(**kwargs)
+        names.update(item["name"] for item in resp.get(key, []))
+        page_token = resp.get("next_page_token")
+        if not page_token:
+            return frozenset(names)
+
+
+def _cached(cache_key: Tuple[str, ...], load: Callable[[], FrozenSet[str]]):
+    # Each workspace has its own entries
+    cache_key = (workspaces.current_name(), *cache_key)
+    now = monotonic()
+    with _lock:
+        entry = _cache.get(cache_key)
+    if entry and now - entry[0] < WORKSPACE_STATE_TTL_SECONDS:
+        return entry[1]
+    names = load()
+    with _lock:
+        _cache[cache_key] = (now, names)
+    return names
+
+
+def catalog_names() -> FrozenSet[str]:
+    return _cached(
+        ("catalogs",), lambda: _list_names(dbx.list_catalogs, "catalogs")
+    )
+
+
+def schema_names(catalog_name: str) -> FrozenSet[str]:
+    return _cached(
+        ("schemas", catalog_name),
+        lambda: _list_names(dbx.list_schemas, "schemas", catalog_name=catalog_name),
+    )
+
+
+def volume_names(catalog_name: str, schema_name: str) -> FrozenSet[str]:
+    return _cached(
+        ("volumes", catalog_name, schema_name),
+        lambda: _list_names(
+            dbx.list_volumes,
+            "volumes",
+            catalog_name=catalog_name,
+            schema_name=schema_name,
+        ),
+    )
+
+
+def warm_up() -> int:
+    """Load the catalog list of the current workspace into the cache."""
+    if not dbx.client().workspace.host:
+        return 0
+    return len(catalog_names())
+
+
+def invalidate(workspace: str = None):
+    with _lock:
+        if workspace is None:
+            _cache.clear()
+            return
+        for key in [key for key in _cache if key[0] == workspace]:
+            del _cache[key]
@@ -0,0 +1,172 @@
+import time
+from typing import Any, Iterator, List, Optional
+import orjson
+import requests
+import app.databricks_api as dbx
+from app.core.config import (
+    SQL_WAIT_TIMEOUT,
+    SQL_POLL_INTERVAL_SECONDS,
+    SQL_MAX_POLL_INTERVAL_SECONDS,
+)
+from app.core.logging_config import get_logger
+
+logger = get_logger("sql_execution")
+
+PENDING_STATES = ("PENDING", "RUNNING")
+
+# Presigned external links are fetched without workspace credentials
+_links_session = requests.Session()
+
+
+def submit(
+    statement: str,
+    wait_timeout: str = SQL_WAIT_TIMEOUT,
+    on_wait_timeout: str = "CONTINUE",
+    disposition: str = "INLINE",
+    format: str = "JSON_ARRAY",
+    parameters: Optional[List[dict]] = None,
+) -> dict:
+    """
+    Submit a statement to the SQL warehouse.
+    - wait_timeout: "0s" returns immediately with a statement id, otherwise 5s-50s
+    - on_wait_timeout: "CONTINUE" keeps running in the background, "CANCEL" stops it
+    - disposition: "INLINE" (small results) or "EXTERNAL_LINKS" (large results)
+    - format: "JSON_ARRAY", "ARROW_STREAM" or "CSV"
+    """
+    return dbx.execute_statement(
+        statement,
+        wait_timeout=wait_timeout,
+        on_wait_timeout=on_wait_timeout,
+        disposition=disposition,
+        format=format,
+        parameters=parameters,
+    )
+
+
+def cancel(statement_id: str):
+    logger.info("Cancelling statement", extra={"event": "statement_cancel", "statement_id": statement_id})
+    return dbx.cancel_statement(statement_id)
+
+
+def wait(
+    result: dict,
+    timeout: Optional[float] = None,
+    poll_interval: float = SQL_POLL_INTERVAL_SECONDS,
+    max_poll_interval: float = SQL_MAX_POLL_INTERVAL_SECONDS,
+) -> dict:
+    """
+    Poll a submitted statement until it leaves PENDING/RUNNING.
+    The poll delay doubles up to max_poll_interval. On timeout the statement
+    is cancelled. Raises DatabricksAPIError unless the statement SUCCEEDED.
+    """
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    delay = poll_interval
+    while result["status"]["state"] in PENDING_STATES:
+        if deadline is not None and time.monotonic() + delay > deadline:
+            cancel(result["statement_id"])
+            raise dbx.DatabricksAPIError(
+                504, f"Statement {result['statement_id']} timed out after {timeout}s"
+            )
+        time.sleep(delay)
+        delay = min(delay * 2, max_poll_interval)
+        result = dbx.sql_status(result["statement_id"])
+
+    status = result["status"]
+    if status["state"] != "SUCCEEDED":
+        error = status.get("error", {}).get("message", status["state"])
+        raise dbx.DatabricksAPIError(
+            500, f"Statement {result['statement_id']} {status['state']}: {error}"
+        )
+    return result
+
+
+def execute(statement: str, timeout: Optional[float] = None, **kwargs) -> dict:
+    """
+    Submit a statement and wait for it to finish.
+    """
+    return wait(submit(statement, **kwargs), timeout=timeout)
+
+
+def iter_chunks(result: dict) -> Iterator[dict]:
+    """
+    Lazily yield result chunks of a finished statement, fetching each
+    following chunk only when the previous one has been consumed.
+    """
+    chunk = result.get("result")
+    while chunk:
+        yield chunk
+        next_index = chunk.get("next_chunk_index")
+        if next_index is None:
+            links = chunk.get("external_links") or []
+            next_index = links[-1].get("next_chunk_index") if links else None
+        if next_index is None:
+            return
+        chunk = dbx.get_statement_result_chunk(result["statement_id"], next_index)
+
+
+def _open_link(link: dict) -> requests.Response:
+    resp = _links_session.get(link["external_link"], stream=True, timeout=60)
+    resp.raise_for_status()
+    resp.raw.decode_content = True
+    return resp
+
+
+def iter_rows(result: dict) -> Iterator[List[Any]]:
+    """
+    Yield rows of a JSON_ARRAY result, one chunk in memory at a time.
+    Works for both INLINE and EXTERNAL_LINKS dispositions.
+    """
+    for chunk in iter_chunks(result):
+        if "data_array" in chunk:
+            yield from chunk["data_array"]
+            continue
+        for link in chunk.get("external_links") or []:
+            with _open_link(link) as resp:
+                rows = orjson.loads(resp.content)
+            yield from rows
+
+
+def iter_arrow_batches(result: dict):
+    """
+    Stream pyarrow RecordBatches of an EXTERNAL_LINKS / ARROW_STREAM result
+    straight from the presigned links without buffering whole chunks.
+    """
+    try:
+        import pyarrow.ipc as ipc
+    except ImportError as e:
+        raise ImportError("pyarrow is required to read ARROW_STREAM results") from e
+
+    for chunk in iter_chunks(result):
+        for link in chunk.get("external_links") or []:
+            with _open_link(link) as resp:
+                yield from ipc.open_stream(resp.raw)
+
+
+def fetch_scalar(statement: str, timeout: Optional[float] = None):
+    """
+    Run a statement and return the first column of its first row.
+    """
+    result = execute(statement, timeout=timeout)
+    for row in iter_rows(result):
+        return row[0] if row else None
+    return None
+
+
+def first_row(result: dict) -> Optional[dict]:
+    """
+    First row of a finished statement as {column name: value}.
+    """
+    columns = result.get("manifest", {}).get("schema", {}).get("columns", [])
+    for row in iter_rows(result):
+        return dict(zip((column["name"] for column in columns), row))
+    return None
+
+
+def count_rows(table_fullname: str, timestamp: Optional[str] = None) -> int:
+    """
+    Row count of a table, optionally as of a timestamp (time travel).
+    """
+    statement = f"SELECT COUNT(*) FROM {table_fullname}"
+    if timestamp:
+        statement += f" TIMESTAMP AS OF '{timestamp}'"
+    return int(fetch_scalar(statement) or 0)
@@ -0,0 +1,162 @@
+import contextvars
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Optional, TypeVar
+from app.core.config import (
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_DELAY_MS,
+    HEDGE_MIN_SAMPLES,
+    HEDGE_BUDGET_RATIO,
+    HEDGE_MAX_WORKERS,
+)
+from app.utils import latency_stats
+
+T = TypeVar("T")
+
+# Unspent hedge credit is capped so a quiet period cannot fund a burst
+_MAX_CREDIT = 10.0
+
+
+class Hedger:
+    """
+    Sends a second copy of a slow idempotent call and returns whichever
+    answers first.
+
+    Once a call has run longer than the recent `percentile` latency of the
+    same call (never before `min_delay_ms`, and not at all until
+    `min_samples` were observed), a hedge is sent and the first successful
+    answer wins; the other attempt is left to finish and ignored. The delay
+    is measured from when the first attempt actually started, so waiting
+    for a worker never triggers a hedge. First attempts and hedges use
+    separate pools, so hedges cannot hold up first attempts. Every call
+    earns `budget_ratio` of a hedge, so hedges add at most that share of
+    load. Hedges do not wait on the per-workspace rate limiter; the budget
+    bounds their extra load instead.
+    """
+
+    def __init__(
+        self,
+        percentile: float = HEDGE_PERCENTILE,
+        min_delay_ms: float = HEDGE_MIN_DELAY_MS,
+        min_samples: int = HEDGE_MIN_SAMPLES,
+        budget_ratio: float = HEDGE_BUDGET_RATIO,
+        max_workers: int = HEDGE_MAX_WORKERS,
+    ):
+        self.percentile = percentile
+        self.min_delay_ms = min_delay_ms
+        self.min_samples = min_samples
+        self.budget_ratio = budget_ratio
+        self._credit = 0.0
+        self._primaries = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="hedged-call"
+        )
+        self._hedges = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="hedge"
+        )
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.fired = 0
+        self.won = 0
+        self.over_budget = 0
+
+    def delay_ms(self, key: str) -> Optional[float]:
+        observed = latency_stats.percentile_ms(
+            _event(key), self.percentile, self.min_samples
+        )
+        return None if observed is None else max(observed, self.min_delay_ms)
+
+    def _earn(self):
+        with self._lock:
+            self.calls += 1
+            self._credit = min(self._credit + self.budget_ratio, _MAX_CREDIT)
+
+    def _spend(self) -> bool:
+        with self._lock:
+            if self._credit < 1:
+                self.over_budget += 1
+                return False
+            self._credit -= 1
+            self.fired += 1
+            return True
+
+    def _submit(
+        self,
+        executor: ThreadPoolExecutor,
+        key: str,
+        fn: Callable[[], T],
+        started: Optional[threading.Event] = None,
+    ) -> Future:
+        def _timed():
+            if started is not None:
+                started.set()
+            start = time.perf_counter()
+            try:
+                return fn()
+            finally:
+                latency_stats.record(_event(key), (time.perf_counter() - start) * 1000)
+
+        return executor.submit(contextvars.copy_context().run, _timed)
+
+    def call(self, key: str, fn: Callable[[], T]) -> T:
+        """Run fn, hedged against the latency history of `key`."""
+        self._earn()
+        delay = self.delay_ms(key)
+        if delay is None:
+            # Not enough history yet: just run and observe
+            start = time.perf_counter()
+            try:
+                return fn()
+            finally:
+                latency_stats.record(_event(key), (time.perf_counter() - start) * 1000)
+
+        started = threading.Event()
+        primary = self._submit(self._primaries, key, fn, started)
+        while not started.wait(delay / 1000) and not primary.done():
+            # Still queued for a worker; that time does not count
+            pass
+        done, _ = wait([primary], timeout=delay / 1000)
+        if done or not self._spend():
+            return primary.result()
+
+        hedge = self._submit(self._hedges, key, fn)
+        first = None
+        pending = {primary, hedge}
+        while pending and first is None:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            # If both finished together the first attempt is preferred
+            for future in (primary, hedge):
+                if future in done and future.exception() is None:
+                    first = future
+                    break
+        for other in pending:
+            other.cancel()
+        if first is None:
+            # Both failed: report the first attempt's error
+            return primary.result()
+        if first is hedge:
+            with self._lock:
+                self.won += 1
+        return first.result()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "hedges_fired": self.fired,
+                "hedges_won": self.won,
+                "over_budget": self.over_budget,
+                "budget_ratio": self.budget_ratio,
+                "credit": round(self._credit, 2),
+            }
+
+    def shutdown(self):
+        self._primaries.shutdown(wait=False, cancel_futures=True)
+        self._hedges.shutdown(wait=False, cancel_futures=True)
+
+
+def _event(key: str) -> str:
+    return f"upstream_{key}"
+
+
+hedger = Hedger()
@@ -0,0 +1,153 @@
+import math
+from threading import Lock
+from time import monotonic
+from typing import Dict, Optional
+from app.core.config import LATENCY_WINDOW_SECONDS
+
+# Weight of the newest sample in the moving average
+EWMA_ALPHA = 0.2
+
+# Log-bucketed histogram: every bucket spans 2% of its value, so percentiles
+# carry at most ~1% relative error and 0.1 ms - 1 h fits in under 1000 buckets.
+_GAMMA = 1.02
+_LOG_GAMMA = math.log(_GAMMA)
+_MIN_MS = 0.1
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+class LatencySketch:
+    """
+    Bounded-memory latency histogram with quantile queries.
+    """
+
+    __slots__ = ("buckets", "count", "max_ms")
+
+    def __init__(self):
+        self.buckets: Dict[int, int] = {}
+        self.count = 0
+        self.max_ms = 0.0
+
+    def add(self, duration_ms: float):
+        index = math.ceil(math.log(max(duration_ms, _MIN_MS) / _MIN_MS) / _LOG_GAMMA)
+        self.buckets[index] = self.buckets.get(index, 0) + 1
+        self.count += 1
+        if duration_ms > self.max_ms:
+            self.max_ms = duration_ms
+
+    def merge(self, other: "LatencySketch") -> "LatencySketch":
+        merged = LatencySketch()
+        for sketch in (self, other):
+            for index, count in sketch.buckets.items():
+                merged.buckets[index] = merged.buckets.get(index, 0) + count
+            merged.count += sketch.count
+            merged.max_ms = max(merged.max_ms, sketch.max_ms)
+        return merged
+
+    def quantile(self, q: float) -> Optional[float]:
+        if not self.count:
+            return None
+        rank = q * (self.count - 1)
+        seen = 0
+        for index in sorted(self.buckets):
+            seen += self.buckets[index]
+            if seen > rank:
+                # Midpoint of the bucket (value range is (gamma^(i-1), gamma^i])
+                value = _MIN_MS * 2 * _GAMMA**index / (_GAMMA + 1)
+                return min(value, self.max_ms)
+        return self.max_ms
+
+
+class _EventStats:
+    __slots__ = ("count", "total_ms", "ewma_ms", "current", "previous", "window_start")
+
+    def __init__(self, now: float):
+        self.count = 0
+        self.total_ms = 0.0
+        self.ewma_ms = 0.0
+        self.current = LatencySketch()
+        self.previous = LatencySketch()
+        self.window_start = now
+
+    def rotate(self, now: float):
+        elapsed = now - self.window_start
+        if elapsed < LATENCY_WINDOW_SECONDS:
+            return
+        # Keep the window that just ended unless it is stale as well
+        self.previous = self.current if elapsed < 2 * LATENCY_WINDOW_SECONDS else LatencySketch()
+        self.current = LatencySketch()
+        self.window_start = now
+
+    def recent(self) -> LatencySketch:
+        return self.current.merge(self.previous)
+
+
+_stats: Dict[str, _EventStats] = {}
+_lock = Lock()
+
+
+def record(event: str, duration_ms: float):
+    """
+    Record one observed duration for an event (called by timed_op).
+    """
+    now = monotonic()
+    with _lock:
+        stats = _stats.get(event)
+        if stats is None:
+            stats = _stats[event] = _EventStats(now)
+            stats.ewma_ms = duration_ms
+        else:
+            stats.ewma_ms += EWMA_ALPHA * (duration_ms - stats.ewma_ms)
+            stats.rotate(now)
+        stats.count += 1
+        stats.total_ms += duration_ms
+        stats.current.add(duration_ms)
+
+
+def observed_ms(event: str) -> Optional[float]:
+    """
+    Recent typical duration of an event, or None if it was never observed.
+    """
+    stats = _stats.get(event)
+    return stats.ewma_ms if stats else None
+
+
+def percentile_ms(event: str, percentile: float, min_count: int = 0) -> Optional[float]:
+    """
+    Percentile (0-100) of the event's durations over the rolling window,
+    or None if the window holds fewer than `min_count` samples.
+    """
+    with _lock:
+        stats = _stats.get(event)
+        if stats is None:
+            return None
+        stats.rotate(monotonic())
+        recent = stats.recent()
+        if recent.count < max(min_count, 1):
+            return None
+        return recent.quantile(percentile / 100)
+
+
+def _describe(stats: _EventStats, now: float) -> dict:
+    stats.rotate(now)
+    recent = stats.recent()
+    return {
+        "count": stats.count,
+        "mean_ms": stats.total_ms / stats.count,
+        "recent_ms": stats.ewma_ms,
+        "window_count": recent.count,
+        "window_max_ms": recent.max_ms,
+        **{f"p{p}_ms": recent.quantile(p / 100) for p in PERCENTILES},
+    }
+
+
+def snapshot_event(event: str) -> Optional[dict]:
+    with _lock:
+        stats = _stats.get(event)
+        return _describe(stats, monotonic()) if stats else None
+
+
+def snapshot() -> Dict[str, dict]:
+    now = monotonic()
+    with _lock:
+        return {event: _describe(stats, now) for event, stats in _stats.items()}
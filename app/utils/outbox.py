@@ -0,0 +1,344 @@
+import fcntl
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple, Type
+import orjson
+from app.core.logging_config import get_logger
+
+logger = get_logger("outbox")
+
+SUFFIX = ".ndjson"
+# Segments the sink kept rejecting are moved here instead of blocking the rest
+QUARANTINE_DIR = "quarantine"
+
+
+class RejectedRecords(Exception):
+    """
+    Raised by a `ship` function that stored every record except `records`,
+    which the sink refuses (e.g. a constraint violation). Those records are
+    quarantined at once and the segment counts as shipped.
+    """
+
+    def __init__(self, records: List, error: Exception):
+        super().__init__(f"{len(records)} records rejected: {error}")
+        self.records = records
+        self.error = error
+
+
+class Outbox:
+    """
+    Local write-ahead log in front of a slow or unavailable sink.
+
+    append() writes one NDJSON line to the active segment file and returns;
+    the line reaches the OS immediately and disk at the next batched fsync
+    (every `fsync_ms`). Segments are closed at `segment_bytes` or after
+    `segment_seconds`. A shipper thread hands each closed segment to `ship`
+    (one call, one transaction) and deletes the file only once that returned,
+    so records survive sink outages and restarts and are delivered at least
+    once. Segments are locked while written or shipped, so several
+    processes can share a directory.
+
+    A `transient` error (the sink is unreachable) ends the pass and the
+    segment is retried later. RejectedRecords quarantines just the records
+    it names. Any other error counts against that segment and shipping
+    carries on with the next one; after `max_attempts` such failures the
+    segment is moved to the quarantine directory.
+    """
+
+    def __init__(
+        self,
+        directory: str,
+        ship: Callable[[List], None],
+        segment_bytes: int,
+        segment_seconds: float,
+        fsync_ms: float,
+        ship_interval_seconds: float,
+        max_attempts: int = 5,
+        transient: Tuple[Type[BaseException], ...] = (),
+        name: str = "outbox",
+    ):
+        self.directory = directory
+        self.ship_fn = ship
+        self.segment_bytes = segment_bytes
+        self.segment_seconds = segment_seconds
+        self.fsync_interval = fsync_ms / 1000
+        self.ship_interval = ship_interval_seconds
+        self.max_attempts = max_attempts
+        self.transient = transient
+        self.name = name
+        self._file = None
+        self._path: Optional[str] = None
+        self._opened_at = 0.0
+        self._size = 0
+        self._dirty = False
+        # Full segments detached by append(), closed by the sync thread
+        self._closing: list = []
+        self._lock = threading.Lock()
+        self._ship_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        # Non-transient failures per segment path
+        self._attempts: Dict[str, int] = {}
+        self.appended = 0
+        self.shipped = 0
+        self.quarantined = 0
+        self.quarantined_records = 0
+        self.ship_failures = 0
+        self.corrupt_lines = 0
+        self.last_error: Optional[str] = None
+
+    # --- Writing ---
+    def append(self, record):
+        line = orjson.dumps(record, default=str) + b"\n"
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._file.write(line)
+            self._file.flush()
+            self._size += len(line)
+            self._dirty = True
+            self.appended += 1
+            if self._size >= self.segment_bytes:
+                # Synced and closed by the sync thread, off the request path
+                self._closing.append(self._detach())
+
+    def _open(self):
+        os.makedirs(self.directory, exist_ok=True)
+        # Time-ordered and unique across processes sharing the directory
+        name = f"{time.time_ns():020d}-{os.getpid()}{SUFFIX}"
+        self._path = os.path.join(self.directory, name)
+        self._file = open(self._path, "ab")
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        self._opened_at = time.monotonic()
+        self._size = 0
+
+    def _detach(self):
+        """
+        Stop appending to the active segment and return its file, to be
+        synced and closed outside the lock (it stays flock'ed until then, so
+        the shipper skips it).
+        """
+        f = self._file
+        self._file = None
+        self._path = None
+        self._dirty = False
+        return f
+
+    def sync(self):
+        """fsync everything appended so far, without blocking appends."""
+        with self._lock:
+            closing, self._closing = self._closing, []
+            fd = None
+            if self._dirty:
+                # A duplicate descriptor stays valid even if the segment is
+                # rotated and closed while the fsync runs
+                fd = os.dup(self._file.fileno())
+                self._dirty = False
+        for f in closing:
+            _close(f)
+        if fd is not None:
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    # --- Shipping ---
+    def _segments(self) -> List[str]:
+        try:
+            names = sorted(n for n in os.listdir(self.directory) if n.endswith(SUFFIX))
+        except FileNotFoundError:
+            return []
+        return [os.path.join(self.directory, n) for n in names]
+
+    def _read(self, f) -> list:
+        records = []
+        for line in f:
+            try:
+                records.append(orjson.loads(line))
+            except orjson.JSONDecodeError:
+                # A line torn by a crash mid-write
+                self.corrupt_lines += 1
+        return records
+
+    def ship(self) -> int:
+        """Ship every closed segment, oldest first; returns records shipped."""
+        with self._ship_lock:
+            with self._lock:
+                if (
+                    self._file is not None
+                    and time.monotonic() - self._opened_at >= self.segment_seconds
+                ):
+                    self._closing.append(self._detach())
+                closing, self._closing = self._closing, []
+                active = self._path
+            for f in closing:
+                _close(f)
+
+            shipped = 0
+            for path in self._segments():
+                if path == active:
+                    continue
+                try:
+                    f = open(path, "rb")
+                except FileNotFoundError:
+                    continue
+                with f:
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    except BlockingIOError:
+                        # Still written or being shipped by another process
+                        continue
+                    if not os.path.exists(path):
+                        continue
+                    records = self._read(f)
+                    delivered = len(records)
+                    if records:
+                        try:
+                            self.ship_fn(records)
+                        except self.transient:
+                            raise
+                        except RejectedRecords as e:
+                            self._quarantine_records(path, e)
+                            delivered -= len(e.records)
+                        except Exception as e:
+                            self._rejected(path, e)
+                            continue
+                    os.remove(path)
+                self._attempts.pop(path, None)
+                shipped += delivered
+                self.shipped += delivered
+            return shipped
+
+    def _rejected(self, path: str, error: Exception):
+        attempts = self._attempts.get(path, 0) + 1
+        self.ship_failures += 1
+        self.last_error = str(error)
+        if attempts < self.max_attempts:
+            self._attempts[path] = attempts
+            logger.warning(
+                "Outbox segment rejected, will retry",
+                extra={
+                    "event": "outbox_segment_rejected",
+                    "outbox": self.name,
+                    "segment": path,
+                    "attempts": attempts,
+                    "error": str(error),
+                },
+            )
+            return
+        self._attempts.pop(path, None)
+        quarantine = os.path.join(self.directory, QUARANTINE_DIR)
+        os.makedirs(quarantine, exist_ok=True)
+        os.replace(path, os.path.join(quarantine, os.path.basename(path)))
+        self.quarantined += 1
+        logger.error(
+            "Outbox segment quarantined after repeated failures",
+            extra={
+                "event": "outbox_segment_quarantined",
+                "outbox": self.name,
+                "segment": path,
+                "attempts": attempts,
+                "error": str(error),
+            },
+        )
+
+    def _quarantine_records(self, path: str, rejected: RejectedRecords):
+        quarantine = os.path.join(self.directory, QUARANTINE_DIR)
+        os.makedirs(quarantine, exist_ok=True)
+        target = os.path.join(quarantine, os.path.basename(path))
+        with open(target, "ab") as f:
+            for record in rejected.records:
+                f.write(orjson.dumps(record, default=str) + b"\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.quarantined_records += len(rejected.records)
+        self.last_error = str(rejected.error)
+        logger.error(
+            "Outbox records rejected by the sink and quarantined",
+            extra={
+                "event": "outbox_records_quarantined",
+                "outbox": self.name,
+                "segment": path,
+                "records": len(rejected.records),
+                "error": str(rejected.error),
+            },
+        )
+
+    # --- Background threads ---
+    def _sync_loop(self):
+        while not self._stop.wait(self.fsync_interval):
+            try:
+                self.sync()
+            except OSError:
+                logger.exception(
+                    "Outbox fsync failed", extra={"event": "outbox_sync_failed", "outbox": self.name}
+                )
+
+    def _ship_loop(self):
+        while not self._stop.wait(self.ship_interval):
+            self._ship_logged()
+
+    def _ship_logged(self):
+        try:
+            self.ship()
+        except Exception as e:
+            self.ship_failures += 1
+            self.last_error = str(e)
+            logger.warning(
+                "Outbox shipping failed, segments kept for the next attempt",
+                extra={
+                    "event": "outbox_ship_failed",
+                    "outbox": self.name,
+                    "error": str(e),
+                    **self.stats(),
+                },
+            )
+
+    def start(self):
+        if any(t.is_alive() for t in self._threads):
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._stop.clear()
+        self._threads = [
+            threading.Thread(target=loop, name=f"{self.name}-{kind}", daemon=True)
+            for kind, loop in (("sync", self._sync_loop), ("ship", self._ship_loop))
+        ]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: Optional[float] = None):
+        """Stop the threads, close the active segment and ship what is left."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        with self._lock:
+            self._closing.append(self._detach())
+        self.sync()
+        self._ship_logged()
+
+    def stats(self) -> dict:
+        segments = self._segments()
+        sizes = []
+        for path in segments:
+            try:
+                sizes.append(os.path.getsize(path))
+            except FileNotFoundError:
+                pass
+        return {
+            "appended": self.appended,
+            "shipped": self.shipped,
+            "quarantined_segments": self.quarantined,
+            "quarantined_records": self.quarantined_records,
+            "pending_segments": len(sizes),
+            "pending_bytes": sum(sizes),
+            "ship_failures": self.ship_failures,
+            "corrupt_lines": self.corrupt_lines,
+            "last_error": self.last_error,
+        }
+
+
+def _close(f):
+    if f is not None:
+        os.fsync(f.fileno())
+        f.close()
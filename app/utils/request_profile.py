@@ -0,0 +1,124 @@
+import sys
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from time import perf_counter
+from typing import Dict, Optional
+
+# Wait categories recorded by the hooks
+DATABRICKS = "databricks"
+RETRY_SLEEP = "retry_sleep"
+RATE_LIMIT = "rate_limit"
+LAKEBASE = "lakebase"
+
+_current: ContextVar[Optional["RequestProfile"]] = ContextVar(
+    "request_profile", default=None
+)
+
+
+class RequestProfile:
+    """
+    Profile of one sampled request: where its wall time went, plus a
+    statistical sample of the stacks of every thread that worked on it.
+    """
+
+    def __init__(self, interval_ms: float):
+        self.interval = interval_ms / 1000
+        self.waits: Dict[str, float] = {}
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self._threads: Dict[int, None] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler: Optional[threading.Thread] = None
+        self._start = 0.0
+        self.wall = 0.0
+
+    def attach_thread(self):
+        self._threads[threading.get_ident()] = None
+
+    def add_wait(self, category: str, seconds: float):
+        with self._lock:
+            self.waits[category] = self.waits.get(category, 0.0) + seconds
+
+    def start(self):
+        self._start = perf_counter()
+        self._sampler = threading.Thread(
+            target=self._sample, name="request-profiler", daemon=True
+        )
+        self._sampler.start()
+
+    def stop(self):
+        self.wall = perf_counter() - self._start
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            for ident in list(self._threads):
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({code.co_filename}:{frame.f_lineno})")
+                    frame = frame.f_back
+                key = ";".join(reversed(stack))
+                self.stacks[key] = self.stacks.get(key, 0) + 1
+                self.samples += 1
+
+    def time_split(self) -> Dict[str, float]:
+        """
+        Wall time in ms split into Databricks waits, retry sleeps, Lakebase
+        waits and the remainder (CPU and anything not hooked).
+        Concurrent waits overlap, so the remainder is floored at zero.
+        """
+        split = {name: seconds * 1000 for name, seconds in self.waits.items()}
+        split["cpu"] = max(0.0, self.wall * 1000 - sum(split.values()))
+        split["wall"] = self.wall * 1000
+        return {name: round(ms, 2) for name, ms in split.items()}
+
+    def folded(self) -> str:
+        """
+        Stacks in collapsed "frame;frame;frame count" format, readable by
+        flamegraph.pl and speedscope.
+        """
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.items())
+
+
+def activate(profile: RequestProfile):
+    return _current.set(profile)
+
+
+def deactivate(token):
+    _current.reset(token)
+
+
+def attach_thread():
+    """
+    Mark the calling thread as working on the current profiled request.
+    """
+    profile = _current.get()
+    if profile is not None:
+        profile.attach_thread()
+
+
+@contextmanager
+def waiting(category: str):
+    """
+    Attribute the wrapped block to a wait category of the current request.
+    A single context variable lookup when no request is being profiled.
+    """
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+    profile.attach_thread()
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        profile.add_wait(category, perf_counter() - start)
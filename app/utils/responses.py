@@ -0,0 +1,43 @@
+from typing import Any
+import orjson
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.requests import ClientDisconnect
+
+
+class ORJSONResponse(JSONResponse):
+    """
+    JSON response rendered with orjson. Route return values have already
+    been through FastAPI's jsonable_encoder; `_default` only matters for
+    content passed to the response directly.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return orjson.dumps(
+            content, default=_default, option=orjson.OPT_NON_STR_KEYS
+        )
+
+
+class DuplexStreamingResponse(StreamingResponse):
+    """
+    Streaming response for handlers that keep reading the request body while
+    the response is sent. StreamingResponse would otherwise consume body
+    messages while listening for a disconnect; here a disconnect surfaces
+    when reading the body or sending the next chunk fails.
+    """
+
+    async def __call__(self, scope, receive, send) -> None:
+        try:
+            await self.stream_response(send)
+        except OSError:
+            raise ClientDisconnect()
+        if self.background is not None:
+            await self.background()
+
+
+def _default(obj: Any):
+    model_dump = getattr(obj, "model_dump", None)
+    if model_dump is not None:
+        return model_dump(mode="json")
+    return str(obj)
@@ -1,23 +1,37 @@
 from time import perf_counter
 from contextlib import contextmanager
+from app.core import request_context
+from app.core.config import LATENCY_BUDGETS_MS
+from app.core.logging_config import get_logger
+from app.utils import latency_stats, request_profile
+
+slow_logger = get_logger("slow_operations")
 
 
 @contextmanager
 def timed_op(logger, event: str, extra: dict | None = None):
     """
     Context manager to time an operation and log success/failure with duration.
+    Operations slower than their budget in LATENCY_BUDGETS_MS are also
+    written to the slow-operation log.
     Usage:
         with timed_op(logger, "create_schema", {"schema": schema_name, "catalog": catalog_name}):
             dbx.create_schema(schema_name, catalog_name)
     """
     extra = extra or {}
+    request_profile.attach_thread()
+    upstream_token = request_context.last_upstream_call.set(None)
     start = perf_counter()
     try:
         yield
-        duration_ms = int((perf_counter() - start) * 1000)
+        elapsed_ms = (perf_counter() - start) * 1000
+        latency_stats.record(event, elapsed_ms)
+        duration_ms = int(elapsed_ms)
         logger.info("ok", extra={"event": event, "duration_ms": duration_ms, **extra})
+        _check_budget(event, elapsed_ms, extra)
     except Exception as e:
-        duration_ms = int((perf_counter() - start) * 1000)
+        elapsed_ms = (perf_counter() - start) * 1000
+        duration_ms = int(elapsed_ms)
         logger.error(
             "fail",
             extra={
@@ -27,4 +41,28 @@ def timed_op(logger, event: str, extra: dict | None = None):
                 **extra,
             },
         )
+        _check_budget(event, elapsed_ms, {**extra, "error": str(e)})
         raise
+    finally:
+        request_context.last_upstream_call.reset(upstream_token)
+
+
+def _check_budget(event: str, elapsed_ms: float, extra: dict):
+    budget_ms = LATENCY_BUDGETS_MS.get(event)
+    if budget_ms is None or elapsed_ms <= budget_ms:
+        return
+    upstream = request_context.last_upstream_call.get() or {}
+    slow_logger.warning(
+        "Operation over latency budget",
+        extra={
+            **extra,
+            "event": event,
+            "duration_ms": int(elapsed_ms),
+            "budget_ms": budget_ms,
+            "request_id": request_context.request_id.get(),
+            "endpoint": request_context.endpoint.get(),
+            "attempts": upstream.get("attempts"),
+            "upstream_status": upstream.get("status_code"),
+            "upstream_headers": upstream.get("headers"),
+        },
+    )
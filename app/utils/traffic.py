@@ -0,0 +1,253 @@
+import gzip
+import hashlib
+import re
+import threading
+import time
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import parse_qsl, urlencode, urlsplit
+import orjson
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from app.core.config import TRAFFIC_MODE, TRAFFIC_FILE, TRAFFIC_LATENCY_SCALE
+from app.core.logging_config import get_logger
+
+logger = get_logger("traffic")
+
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+
+# Keys whose values never reach a recording; page tokens are kept for paging
+_SECRET_KEY = re.compile(r"token|secret|password|credential|authorization", re.I)
+_KEPT_KEYS = {"page_token", "next_page_token"}
+REDACTED = "REDACTED"
+# Response headers worth keeping (the rest is dropped to keep files small)
+_KEPT_HEADERS = (
+    "content-type",
+    "x-request-id",
+    "x-databricks-org-id",
+    "x-databricks-reason-phrase",
+    "retry-after",
+)
+
+
+def _secret(key: str) -> bool:
+    return key not in _KEPT_KEYS and bool(_SECRET_KEY.search(key))
+
+
+def redact(value):
+    """Copy of a decoded JSON value with secret-looking fields replaced."""
+    if isinstance(value, dict):
+        return {k: REDACTED if _secret(k) else redact(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [redact(v) for v in value]
+    return value
+
+
+def request_path(url: str) -> str:
+    """Host-independent path and query of a request, with secrets redacted."""
+    parts = urlsplit(url)
+    query = [(k, REDACTED if _secret(k) else v) for k, v in parse_qsl(parts.query)]
+    return f"{parts.path}?{urlencode(query)}" if query else parts.path
+
+
+def body_key(body) -> Optional[str]:
+    if not body:
+        return None
+    if isinstance(body, str):
+        body = body.encode()
+    return hashlib.sha1(body).hexdigest()[:16]
+
+
+class Recorder:
+    """
+    Appends exchanges to a gzip NDJSON file, one compact line each:
+    o (ms since recording start), m, p (path and query), k (request body
+    hash), s (status), h (headers), b (response body), t (latency in ms).
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = gzip.open(path, "ab")
+        self._lock = threading.Lock()
+        self._start = time.monotonic()
+        self.count = 0
+
+    def record(self, request: requests.PreparedRequest, response: requests.Response, elapsed: float):
+        body = response.text
+        if body and "json" in response.headers.get("content-type", "json"):
+            try:
+                body = orjson.dumps(redact(orjson.loads(body))).decode()
+            except orjson.JSONDecodeError:
+                pass
+        line = {
+            "o": round((time.monotonic() - self._start) * 1000, 1),
+            "m": request.method,
+            "p": request_path(request.url),
+            "k": body_key(request.body),
+            "s": response.status_code,
+            "h": {h: response.headers[h] for h in _KEPT_HEADERS if h in response.headers},
+            "b": body,
+            "t": round(elapsed * 1000, 1),
+        }
+        with self._lock:
+            self._file.write(orjson.dumps(line) + b"\n")
+            self.count += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class RecordingAdapter(HTTPAdapter):
+    """HTTPAdapter that also writes every exchange to a Recorder."""
+
+    def __init__(self, recorder: Recorder, **kwargs):
+        super().__init__(**kwargs)
+        self.recorder = recorder
+
+    def send(self, request, **kwargs):
+        start = time.perf_counter()
+        response = super().send(request, **kwargs)
+        # Read the body now so the latency includes it, as the client sees it
+        response.content
+        self.recorder.record(request, response, time.perf_counter() - start)
+        return response
+
+
+class Recording:
+    """
+    Recorded exchanges indexed by request. Repeated requests are answered in
+    recorded order, then with the last answer. Requests whose body differs
+    from every recording (e.g. merged grant batches) fall back to the
+    method and path alone.
+    """
+
+    def __init__(self, path: str):
+        self.exact: Dict[Tuple, List[dict]] = defaultdict(list)
+        self.by_path: Dict[Tuple, List[dict]] = defaultdict(list)
+        with gzip.open(path, "rb") as f:
+            for line in f:
+                if line.strip():
+                    item = orjson.loads(line)
+                    self.exact[(item["m"], item["p"], item["k"])].append(item)
+                    self.by_path[(item["m"], item["p"])].append(item)
+        self._served: Dict[Tuple, int] = defaultdict(int)
+        self._lock = threading.Lock()
+        self.served = 0
+        self.misses = 0
+
+    def __len__(self):
+        return sum(len(items) for items in self.exact.values())
+
+    def match(self, method: str, path: str, key: Optional[str]) -> Optional[dict]:
+        for index, lookup in ((self.exact, (method, path, key)), (self.by_path, (method, path))):
+            items = index.get(lookup)
+            if items:
+                with self._lock:
+                    served = self._served[lookup]
+                    self._served[lookup] = served + 1
+                    self.served += 1
+                return items[min(served, len(items) - 1)]
+        with self._lock:
+            self.misses += 1
+        return None
+
+
+class ReplayAdapter(BaseAdapter):
+    """
+    Local stand-in for the workspace: answers from a Recording, sleeping the
+    recorded latency times `scale` (0 answers immediately).
+    """
+
+    def __init__(self, recording: Recording, scale: float = 1.0):
+        super().__init__()
+        self.recording = recording
+        self.scale = scale
+
+    def send(self, request, **kwargs):
+        item = self.recording.match(
+            request.method, request_path(request.url), body_key(request.body)
+        )
+        response = requests.Response()
+        response.request = request
+        response.url = request.url
+        response.encoding = "utf-8"
+        if item is None:
+            response.status_code = 501
+            response.reason = "Not Recorded"
+            response._content = f"No recorded response for {request.method} {request_path(request.url)}".encode()
+            response.headers = CaseInsensitiveDict({"content-type": "text/plain"})
+            return response
+
+        if self.scale > 0:
+            time.sleep(item["t"] / 1000 * self.scale)
+        response.status_code = item["s"]
+        response._content = (item["b"] or "").encode()
+        response.headers = CaseInsensitiveDict(item["h"])
+        return response
+
+    def close(self):
+        pass
+
+
+_state = {"mode": TRAFFIC_MODE, "file": TRAFFIC_FILE, "scale": TRAFFIC_LATENCY_SCALE}
+_recorder: Optional[Recorder] = None
+_recording: Optional[Recording] = None
+_lock = threading.Lock()
+
+
+def configure(mode: str, path: str = "", scale: float = 1.0):
+    """Switch mode for sessions created from now on (used by the bench runner)."""
+    global _recording
+    close()
+    with _lock:
+        _state.update(mode=mode, file=path, scale=scale)
+        _recording = None
+
+
+def adapter(pool_connections: int, pool_maxsize: int) -> BaseAdapter:
+    """Transport for a new workspace session according to TRAFFIC_MODE."""
+    global _recorder, _recording
+    mode = _state["mode"]
+    if mode == OFF:
+        return HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+    if not _state["file"]:
+        raise ValueError(f"TRAFFIC_FILE is required when TRAFFIC_MODE is {mode}")
+    with _lock:
+        if mode == RECORD:
+            if _recorder is None:
+                _recorder = Recorder(_state["file"])
+                logger.warning(
+                    "Recording Databricks traffic",
+                    extra={"event": "traffic_recording", "file": _state["file"]},
+                )
+            return RecordingAdapter(
+                _recorder, pool_connections=pool_connections, pool_maxsize=pool_maxsize
+            )
+        if mode == REPLAY:
+            if _recording is None:
+                _recording = Recording(_state["file"])
+            return ReplayAdapter(_recording, _state["scale"])
+    raise ValueError(f"Unknown TRAFFIC_MODE {mode}")
+
+
+def stats() -> dict:
+    return {
+        "mode": _state["mode"],
+        "file": _state["file"],
+        "recorded": _recorder.count if _recorder is not None else None,
+        "replayed": _recording.served if _recording is not None else None,
+        "misses": _recording.misses if _recording is not None else None,
+    }
+
+
+def close():
+    """Flush and close the recording file, if recording."""
+    global _recorder
+    with _lock:
+        if _recorder is not None:
+            _recorder.close()
+            _recorder = None
@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from app.middleware.admission import AdmissionRejected, RouteLimiter
+
+INTERACTIVE, BATCH = "interactive", "batch"
+
+
+def _limiter(concurrency=1, queue_size=2, timeout=1.0):
+    return RouteLimiter("/test", concurrency, queue_size, timeout)
+
+
+def test_free_slot_is_taken_without_queueing():
+    async def scenario():
+        limiter = _limiter(concurrency=2)
+        assert await limiter.acquire(BATCH) == 0.0
+        assert await limiter.acquire(BATCH) == 0.0
+        assert limiter.active == 2
+
+    asyncio.run(scenario())
+
+
+def test_full_queue_is_rejected_with_429():
+    async def scenario():
+        limiter = _limiter(queue_size=1)
+        await limiter.acquire(BATCH)
+        waiter = asyncio.ensure_future(limiter.acquire(BATCH))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as e:
+            await limiter.acquire(BATCH)
+        assert e.value.status_code == 429
+        assert e.value.retry_after >= 1
+        limiter.release()
+        await waiter
+        assert limiter.rejected_queue_full == 1
+
+    asyncio.run(scenario())
+
+
+def test_queue_wait_times_out_with_503():
+    async def scenario():
+        limiter = _limiter(timeout=0.01)
+        await limiter.acquire(BATCH)
+        with pytest.raises(AdmissionRejected) as e:
+            await limiter.acquire(BATCH)
+        assert e.value.status_code == 503
+        assert limiter.waiting() == 0
+        # The timed-out waiter must not swallow the next released slot
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_released_slot_goes_to_the_interactive_lane_first():
+    async def scenario():
+        limiter = _limiter(queue_size=4)
+        await limiter.acquire(BATCH)
+        order = []
+
+        async def request(lane):
+            await limiter.acquire(lane)
+            order.append(lane)
+            limiter.release()
+
+        batch = asyncio.ensure_future(request(BATCH))
+        await asyncio.sleep(0)
+        interactive = asyncio.ensure_future(request(INTERACTIVE))
+        await asyncio.sleep(0)
+        limiter.release()
+        await asyncio.gather(batch, interactive)
+        assert order == [INTERACTIVE, BATCH]
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_leaves_the_queue():
+    async def scenario():
+        limiter = _limiter()
+        await limiter.acquire(BATCH)
+        waiter = asyncio.ensure_future(limiter.acquire(BATCH))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.waiting() == 0
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(scenario())
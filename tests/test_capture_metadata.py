@@ -0,0 +1,94 @@
+from contextlib import contextmanager
+import psycopg2
+import pytest
+from app.services import capture_metadata
+from app.services.capture_metadata import requester, write_batch
+from app.models.analysis_payload import AnalysisPayload
+from app.utils.outbox import RejectedRecords
+
+
+class _Cursor:
+    def __init__(self, db):
+        self.db = db
+
+    def execute(self, sql, *args):
+        self.db.statements.append(sql)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class _Db:
+    """Records inserted rows; rows without a requester violate NOT NULL."""
+
+    def __init__(self):
+        self.statements = []
+        self.inserted = []
+        self.rollups = []
+
+    @contextmanager
+    def connection(self):
+        self.committed = False
+        yield self
+        self.committed = True
+
+    def cursor(self):
+        return _Cursor(self)
+
+    def insert(self, cursor, rows):
+        if any(row[8] is None for row in rows):
+            raise psycopg2.IntegrityError("null value in column request_by")
+        self.inserted.extend(rows)
+
+
+def _row(request_by, status=200):
+    return ["{}", "{}", status, None, "2026-01-01T10:00:30", "p", "s", None, request_by, None, None, 12.0]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    db = _Db()
+    monkeypatch.setattr(capture_metadata, "get_connection", db.connection)
+    monkeypatch.setattr(capture_metadata, "_insert_rows", db.insert)
+    monkeypatch.setattr(
+        capture_metadata,
+        "execute_values",
+        lambda cursor, sql, rows, page_size: db.rollups.extend(rows),
+    )
+    return db
+
+
+def test_batch_inserted_in_one_statement(db):
+    write_batch([_row("a"), _row("b", 500)])
+    assert [row[8] for row in db.inserted] == ["a", "b"]
+    assert [r[4:] for r in db.rollups] == [(1, 0, 12.0), (1, 1, 12.0)]
+
+
+def test_rejected_rows_are_split_out(db):
+    with pytest.raises(RejectedRecords) as e:
+        write_batch([_row("a"), _row(None), _row("c")])
+    assert [row[8] for row in e.value.records] == [None]
+    # The good rows and their rollup are still committed
+    assert [row[8] for row in db.inserted] == ["a", "c"]
+    assert db.committed
+    assert db.rollups[0][4:] == (2, 0, 24.0)
+    assert "ROLLBACK TO SAVEPOINT audit_row" in db.statements
+
+
+def test_analysis_requester_is_the_analysis_lead():
+    payload = AnalysisPayload.model_validate(
+        {
+            "business_metadata": {
+                "product_name": "p",
+                "study": "s",
+                "analysis_lead": "lead@example.com",
+                "analysis_type": "adhoc",
+            },
+            "storage_setup": {"volume_directories": [], "data_layer_schemas": []},
+            "access_controls": {},
+        }
+    )
+    assert requester(payload) == "lead@example.com"
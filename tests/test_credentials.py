@@ -0,0 +1,152 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import orjson
+import pytest
+import app.databricks_api as dbx
+from app.core import credentials, workspaces
+from app.core.credentials import CredentialError, OAuthClientCredentials
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        # Token endpoint
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        server = self.server
+        time.sleep(server.token_delay)
+        with server.lock:
+            server.token_requests += 1
+            token = f"token-{server.token_requests}"
+        if server.token_body is not None:
+            self._reply(200, server.token_body)
+        else:
+            self._reply(200, {"access_token": token, "expires_in": server.expires_in})
+
+    def do_GET(self):
+        # A workspace API that rejects the tokens in `server.revoked`
+        token = self.headers.get("Authorization", "").removeprefix("Bearer ")
+        self.server.api_tokens.append(token)
+        if token in self.server.revoked:
+            self._reply(401, {"error_code": "UNAUTHENTICATED"})
+        else:
+            self._reply(200, {"catalogs": []})
+
+    def _reply(self, status: int, body: dict):
+        data = orjson.dumps(body)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    httpd.lock = threading.Lock()
+    httpd.token_requests = 0
+    httpd.token_delay = 0.0
+    httpd.expires_in = 3600
+    httpd.token_body = None
+    httpd.api_tokens = []
+    httpd.revoked = set()
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}"
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+@pytest.fixture
+def oauth(server):
+    provider = OAuthClientCredentials.for_workspace(server.url, "client", "secret", "test")
+    yield provider
+    provider.stop()
+
+
+def test_token_is_cached(server, oauth):
+    first = oauth.token()
+    assert oauth.token() == first
+    assert server.token_requests == 1
+
+
+def test_expired_token_is_fetched_again(server, oauth):
+    server.expires_in = 0
+    assert oauth.token() == "token-1"
+    assert oauth.token() == "token-2"
+
+
+def test_background_refresh_ahead_of_expiry(server, oauth, monkeypatch):
+    monkeypatch.setattr(credentials, "TOKEN_REFRESH_MARGIN_SECONDS", 0.5)
+    server.expires_in = 1.2
+    assert oauth.token() == "token-1"
+    oauth.start()
+    deadline = time.monotonic() + 3
+    while oauth.refreshes < 2 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    # Swapped by the background thread before token-1 expired
+    assert oauth.refreshes >= 2
+    assert oauth.token() != "token-1"
+
+
+def test_short_lived_tokens_are_not_refreshed_in_a_loop(server, oauth, monkeypatch):
+    # The margin exceeds the token lifetime: refresh halfway through instead
+    monkeypatch.setattr(credentials, "TOKEN_REFRESH_MARGIN_SECONDS", 300.0)
+    monkeypatch.setattr(credentials, "MIN_REFRESH_INTERVAL_SECONDS", 0.5)
+    server.expires_in = 0.4
+    oauth.token()
+    oauth.start()
+    time.sleep(1.2)
+    assert 2 <= server.token_requests <= 5
+
+
+def test_unusable_token_response_is_a_credential_error(server, oauth):
+    server.token_body = {"token_type": "Bearer"}
+    with pytest.raises(CredentialError):
+        oauth.token()
+
+
+def test_refresh_thread_survives_a_bad_response(server, oauth, monkeypatch):
+    monkeypatch.setattr(credentials, "TOKEN_REFRESH_RETRY_SECONDS", 0.1)
+    server.token_body = {"token_type": "Bearer"}
+    oauth.start()
+    time.sleep(0.3)
+    assert oauth._thread.is_alive()
+    server.token_body = None
+    deadline = time.monotonic() + 2
+    while oauth.refreshes < 1 and time.monotonic() < deadline:
+        time.sleep(0.02)
+    assert oauth.refreshes == 1
+
+
+def test_concurrent_callers_share_one_fetch(server, oauth):
+    server.token_delay = 0.2
+    with ThreadPoolExecutor(max_workers=16) as executor:
+        tokens = list(executor.map(lambda _: oauth.token(), range(16)))
+    assert set(tokens) == {"token-1"}
+    assert server.token_requests == 1
+
+
+def test_refresh_of_rejected_token_is_single_flight(server, oauth):
+    rejected = oauth.token()
+    server.token_delay = 0.1
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda _: oauth.refresh(rejected), range(8)))
+    assert server.token_requests == 2
+    assert oauth.token() == "token-2"
+
+
+def test_request_retried_once_with_refreshed_token(server, oauth, monkeypatch):
+    workspace = workspaces.Workspace("test", server.url, "", credentials=oauth)
+    monkeypatch.setitem(dbx._clients, workspaces.current_name(), dbx.WorkspaceClient(workspace))
+    monkeypatch.setattr(dbx, "HEDGING_ENABLED", False)
+    server.revoked.add("token-1")
+
+    assert dbx._make_request("GET", "/api/2.1/unity-catalog/catalogs") == {"catalogs": []}
+    assert server.api_tokens == ["token-1", "token-2"]
+    assert server.token_requests == 2
@@ -0,0 +1,38 @@
+import app.databricks_api as dbx
+from app.databricks_api import normalize_directory_paths
+
+
+def test_paths_normalized_and_deduplicated():
+    creators = normalize_directory_paths(["/a/b/", "a/b", "//a/./b", "/", ""])
+    assert creators == {"/a/b": "/a/b"}
+
+
+def test_parents_are_created_by_a_requested_descendant():
+    creators = normalize_directory_paths(["/v", "/v/raw", "/v/raw/2026", "/v/out"])
+    assert creators.pop("/v") in ("/v/raw/2026", "/v/out")
+    assert creators == {
+        "/v/out": "/v/out",
+        "/v/raw": "/v/raw/2026",
+        "/v/raw/2026": "/v/raw/2026",
+    }
+
+
+def test_sibling_sharing_a_prefix_is_not_a_descendant():
+    creators = normalize_directory_paths(["/v/raw", "/v/raw_2026"])
+    assert creators == {"/v/raw": "/v/raw", "/v/raw_2026": "/v/raw_2026"}
+
+
+def test_create_directories_sends_leaves_only(monkeypatch):
+    sent = []
+
+    def create(path):
+        sent.append(path)
+        if path == "/v/bad":
+            raise dbx.DatabricksAPIError(403, "PERMISSION_DENIED")
+
+    monkeypatch.setattr(dbx, "create_directory_path", create)
+    report = dbx.create_directories(["/v", "/v/raw", "/v/bad"])
+    assert sorted(sent) == ["/v/bad", "/v/raw"]
+    assert report["/v/raw"] == {"status": "success"}
+    assert report["/v"]["created_by"] in ("/v/bad", "/v/raw")
+    assert report["/v/bad"]["status_code"] == 403
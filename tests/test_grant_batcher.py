@@ -0,0 +1,94 @@
+import threading
+import time
+import pytest
+import app.databricks_api as dbx
+from app.services.grant_batcher import GrantBatcher
+from app.services.permissions import GrantGroup
+
+
+class _Upstream:
+    """Fake grant_permissions: slow, records PATCHes, rejects principal 'bad'."""
+
+    def __init__(self, delay=0.1):
+        self.delay = delay
+        self.patches = []
+        self.active = 0
+        self.max_active = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, object_type, full_name, payload):
+        with self.lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        time.sleep(self.delay)
+        with self.lock:
+            self.active -= 1
+            self.patches.append(payload)
+        principals = [change["principal"] for change in payload["changes"]]
+        if "bad" in principals:
+            raise dbx.DatabricksAPIError(400, "PRINCIPAL_DOES_NOT_EXIST: bad")
+        return {"principals": principals}
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    fake = _Upstream()
+    monkeypatch.setattr(dbx, "grant_permissions", fake)
+    return fake
+
+
+def _grant(batcher, principal, results):
+    try:
+        results[principal] = batcher.grant(
+            "SCHEMA", "c.s", [GrantGroup(("USE SCHEMA",), (principal,))]
+        )
+    except dbx.DatabricksAPIError as e:
+        results[principal] = e
+
+
+def _concurrently(batcher, principals, stagger=0.01):
+    results = {}
+    threads = []
+    for principal in principals:
+        thread = threading.Thread(target=_grant, args=(batcher, principal, results))
+        thread.start()
+        threads.append(thread)
+        time.sleep(stagger)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_uncontended_grant_is_sent_at_once(upstream):
+    upstream.delay = 0
+    start = time.perf_counter()
+    _concurrently(GrantBatcher(), ["alice"])
+    assert time.perf_counter() - start < 0.05
+    assert len(upstream.patches) == 1
+
+
+def test_grants_arriving_during_a_patch_are_merged(upstream):
+    batcher = GrantBatcher()
+    results = _concurrently(batcher, ["a", "b", "c", "d"])
+    # "a" goes alone; the rest wait for it and share one PATCH
+    assert len(upstream.patches) == 2
+    assert results["a"] == {"principals": ["a"]}
+    assert results["b"] is results["c"] is results["d"]
+    assert sorted(results["d"]["principals"]) == ["b", "c", "d"]
+    assert upstream.max_active == 1
+    assert batcher.stats()["requests_sent"] == 2
+
+
+def test_rejected_batch_is_split_per_caller(upstream):
+    batcher = GrantBatcher()
+    results = _concurrently(batcher, ["first", "ok", "bad", "fine"])
+    assert isinstance(results["bad"], dbx.DatabricksAPIError)
+    assert results["ok"] == {"principals": ["ok"]}
+    assert results["fine"] == {"principals": ["fine"]}
+    assert upstream.max_active == 1
+
+
+def test_disabled_batcher_sends_every_call(upstream):
+    upstream.delay = 0.02
+    _concurrently(GrantBatcher(enabled=False), ["a", "b", "c"], stagger=0)
+    assert len(upstream.patches) == 3
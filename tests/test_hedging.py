@@ -0,0 +1,72 @@
+import threading
+import time
+import pytest
+from app.utils.hedging import Hedger
+
+
+@pytest.fixture
+def hedger(monkeypatch):
+    h = Hedger(min_delay_ms=20, budget_ratio=1.0, max_workers=4)
+    monkeypatch.setattr(h, "delay_ms", lambda key: 20.0)
+    yield h
+    h.shutdown()
+
+
+def _slow_first(results=("slow", "fast"), slow_seconds=0.5):
+    """fn whose first invocation is slow and later ones answer at once."""
+    calls = []
+    lock = threading.Lock()
+
+    def fn():
+        with lock:
+            n = len(calls)
+            calls.append(threading.current_thread().name)
+        if n == 0:
+            time.sleep(slow_seconds)
+        return results[min(n, 1)]
+
+    return fn, calls
+
+
+def test_hedge_answers_first(hedger):
+    fn, calls = _slow_first()
+    start = time.perf_counter()
+    assert hedger.call("k", fn) == "fast"
+    assert time.perf_counter() - start < 0.3
+    assert len(calls) == 2
+    assert hedger.stats()["hedges_fired"] == 1
+    assert hedger.stats()["hedges_won"] == 1
+
+
+def test_fast_call_is_not_hedged(hedger):
+    assert hedger.call("k", lambda: "ok") == "ok"
+    assert hedger.stats()["hedges_fired"] == 0
+
+
+def test_exhausted_budget_suppresses_hedges(hedger):
+    hedger.budget_ratio = 0.0
+    fn, calls = _slow_first(slow_seconds=0.1)
+    assert hedger.call("k", fn) == "slow"
+    assert len(calls) == 1
+    assert hedger.stats()["over_budget"] == 1
+    assert hedger.stats()["hedges_won"] == 0
+
+
+def test_hedge_covers_a_failed_first_attempt(hedger):
+    state = {"n": 0}
+
+    def fn():
+        state["n"] += 1
+        if state["n"] == 1:
+            time.sleep(0.1)
+            raise TimeoutError("first attempt")
+        time.sleep(0.2)
+        return "hedge"
+
+    assert hedger.call("k", fn) == "hedge"
+    assert hedger.stats()["hedges_won"] == 1
+
+
+def test_no_history_runs_on_the_calling_thread(hedger, monkeypatch):
+    monkeypatch.setattr(hedger, "delay_ms", lambda key: None)
+    assert hedger.call("k", lambda: threading.current_thread().name) == "MainThread"
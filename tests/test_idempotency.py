@@ -0,0 +1,83 @@
+import threading
+import time
+import pytest
+from app.services import idempotency
+from app.services.idempotency import (
+    IdempotencyMismatch,
+    MemoryStore,
+    request_hash,
+    request_key,
+    run_idempotent,
+)
+
+ROUTE = "/test"
+
+
+@pytest.fixture(autouse=True)
+def store(monkeypatch):
+    store = MemoryStore()
+    monkeypatch.setattr(idempotency, "memory_store", store)
+    monkeypatch.setattr(idempotency, "lakebase_store", None)
+    return store
+
+
+def _run(body, fn, header_key=None):
+    return run_idempotent(
+        request_key(ROUTE, header_key, body), request_hash(ROUTE, body), fn
+    )
+
+
+def test_key_is_the_header_or_a_body_hash():
+    assert request_key(ROUTE, "abc", b"{}") == "/test:abc"
+    assert request_key(ROUTE, None, b"{}") == f"/test:sha256:{request_hash(ROUTE, b'{}')}"
+    assert request_hash(ROUTE, b"a", b"b") != request_hash(ROUTE, b"ab")
+
+
+def test_completed_request_is_replayed():
+    calls = []
+    assert _run(b"{}", lambda: calls.append(1) or {"ok": 1}) == ({"ok": 1}, False)
+    assert _run(b"{}", lambda: calls.append(1) or {"ok": 2}) == ({"ok": 1}, True)
+    assert len(calls) == 1
+
+
+def test_concurrent_duplicate_attaches_to_the_running_call():
+    started = threading.Event()
+    release = threading.Event()
+    results = []
+
+    def slow():
+        started.set()
+        release.wait(5)
+        return {"ok": 1}
+
+    first = threading.Thread(target=lambda: results.append(_run(b"{}", slow)))
+    first.start()
+    started.wait(5)
+    second = threading.Thread(target=lambda: results.append(_run(b"{}", slow)))
+    second.start()
+    time.sleep(0.05)
+    release.set()
+    first.join()
+    second.join()
+    assert sorted(replayed for _, replayed in results) == [False, True]
+
+
+def test_key_reused_with_another_body_is_refused():
+    _run(b"one", lambda: {"ok": 1}, header_key="k")
+    with pytest.raises(IdempotencyMismatch):
+        _run(b"two", lambda: {"ok": 2}, header_key="k")
+
+
+def test_failure_is_not_cached():
+    def fail():
+        raise RuntimeError("upstream down")
+
+    with pytest.raises(RuntimeError):
+        _run(b"{}", fail)
+    assert _run(b"{}", lambda: {"ok": 1}) == ({"ok": 1}, False)
+
+
+def test_completed_entries_expire(monkeypatch):
+    monkeypatch.setattr(idempotency, "IDEMPOTENCY_TTL_SECONDS", 0)
+    _run(b"{}", lambda: {"ok": 1})
+    assert _run(b"{}", lambda: {"ok": 2}) == ({"ok": 2}, False)
@@ -0,0 +1,108 @@
+import asyncio
+import orjson
+import pytest
+from fastapi.testclient import TestClient
+import app.main as main
+from app.services import idempotency, ingest
+
+STUDY = {
+    "business_metadata": {"product_name": "demo", "study": "s1", "study_type": "clinical"},
+    "storage_setup": {
+        "data_schemas": ["raw"],
+        "volume_directories": {"raw": ["landing"], "raw_restricted": []},
+    },
+}
+
+
+@pytest.fixture
+def provisioned(monkeypatch):
+    calls = []
+
+    def process_payload(payload):
+        calls.append(payload)
+        return {"status": "success", "study": payload.business_metadata.study}
+
+    monkeypatch.setattr(ingest, "process_payload", process_payload)
+    monkeypatch.setattr(ingest, "IDEMPOTENCY_ENABLED", True)
+    monkeypatch.setattr(idempotency, "memory_store", idempotency.MemoryStore())
+    return calls
+
+
+@pytest.fixture
+def audited(monkeypatch):
+    rows = []
+
+    def record_audit(payload, response, http_status, started):
+        rows.append((payload, response, http_status))
+
+    monkeypatch.setattr(ingest, "record_audit", record_audit)
+    return rows
+
+
+def _post(lines):
+    body = b"".join(orjson.dumps(line) + b"\n" for line in lines)
+    with TestClient(main.app) as client:
+        resp = client.post("/ingest", content=body)
+    assert resp.status_code == 200
+    return [orjson.loads(line) for line in resp.content.splitlines()]
+
+
+def test_ingest_provisions_a_line(provisioned, audited):
+    results = _post([STUDY])
+    assert results == [
+        {
+            "line": 1,
+            "status": "success",
+            "status_code": 200,
+            "response": {"status": "success", "study": "s1"},
+            "replayed": False,
+        }
+    ]
+    assert len(provisioned) == 1
+    assert [(p.business_metadata.study, r, status) for p, r, status in audited] == [
+        ("s1", {"status": "success", "study": "s1"}, 200)
+    ]
+
+
+def test_failed_line_is_audited_with_its_error(provisioned, audited, monkeypatch):
+    def fail(payload):
+        raise ingest.DatabricksAPIError(403, "PERMISSION_DENIED")
+
+    monkeypatch.setattr(ingest, "process_payload", fail)
+    results = _post([STUDY])
+    assert results[0]["status_code"] == 403
+    assert audited[0][1:] == ({"status": "error", "message": "PERMISSION_DENIED"}, 403)
+
+
+def _lines(chunks, max_line_bytes=100):
+    async def stream():
+        for chunk in chunks:
+            yield chunk
+
+    async def collect():
+        return [item async for item in ingest.iter_lines(stream(), max_line_bytes)]
+
+    return asyncio.run(collect())
+
+
+def test_line_split_across_chunks():
+    assert _lines([b'{"a":', b"1}\n{", b'"b":2}\n']) == [(1, b'{"a":1}'), (2, b'{"b":2}')]
+
+
+def test_blank_lines_are_numbered_but_skipped():
+    assert _lines([b"x\n\n  \ny\n"]) == [(1, b"x"), (4, b"y")]
+
+
+def test_final_line_without_newline():
+    assert _lines([b"x\ny"]) == [(1, b"x"), (2, b"y")]
+
+
+def test_oversize_line_is_reported_and_skipped():
+    long = b"z" * 30
+    assert _lines([b"a\n", long[:15], long[15:], b"\nb\n"], max_line_bytes=20) == [
+        (1, b"a"),
+        (2, None),
+        (3, b"b"),
+    ]
+    # Also when the oversize line is the last one
+    assert _lines([b"a\n" + long], max_line_bytes=20) == [(1, b"a"), (2, None)]
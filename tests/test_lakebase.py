@@ -0,0 +1,150 @@
+import psycopg2
+import pytest
+from app.core.lakebase import (
+    PRIMARY_LSN_QUERY,
+    PreparedStatement,
+    ReplicaRouter,
+    parse_lsn,
+)
+
+
+def test_placeholders_are_numbered():
+    statement = PreparedStatement("ins", "INSERT INTO t VALUES (%s, %s, now())")
+    assert statement.prepare_sql(None) == "PREPARE ins AS INSERT INTO t VALUES ($1, $2, now())"
+    assert statement.execute_sql() == "EXECUTE ins (%s, %s)"
+
+
+def test_escaped_percent_is_a_literal():
+    statement = PreparedStatement("q", "SELECT * FROM t WHERE a LIKE 'x%%' AND b = %s AND c = '%%s'")
+    assert statement.prepare_sql(None) == (
+        "PREPARE q AS SELECT * FROM t WHERE a LIKE 'x%' AND b = $1 AND c = '%s'"
+    )
+    assert statement.params == 1
+
+
+def test_statement_without_parameters():
+    statement = PreparedStatement("now", "SELECT now()")
+    assert statement.prepare_sql(None) == "PREPARE now AS SELECT now()"
+    assert statement.execute_sql() == "EXECUTE now"
+
+
+def test_parse_lsn():
+    assert parse_lsn("16/B374D848") == (0x16 << 32) + 0xB374D848
+    assert parse_lsn(None) is None
+
+
+class _Conn:
+    """Answers the LSN queries with whatever the test set last."""
+
+    def __init__(self, lsn="0/10", replay="0/10", lag=0.0):
+        self.lsn = lsn
+        self.replay = replay
+        self.lag = lag
+        self.fail = False
+        self.autocommit = False
+        self.queries = []
+
+    def cursor(self):
+        return self
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, query):
+        if self.fail:
+            raise psycopg2.OperationalError("replica down")
+        self.queries.append(query)
+
+    def fetchone(self):
+        if self.queries[-1] == PRIMARY_LSN_QUERY:
+            return (self.lsn,)
+        return (self.replay, self.lag)
+
+    def rollback(self):
+        pass
+
+
+class _Pool:
+    def __init__(self, conn):
+        self.conn = conn
+        self.released = []
+
+    def acquire(self):
+        return (0.0, self.conn)
+
+    def release(self, entry, discard=False):
+        self.released.append(discard)
+
+
+@pytest.fixture
+def replica():
+    return _Pool(_Conn())
+
+
+def _router(replica, check_interval=60.0):
+    return ReplicaRouter(replica, max_lag=5.0, check_interval=check_interval)
+
+
+def test_reads_use_the_replica_when_caught_up(replica):
+    router = _router(replica)
+    assert router.acquire() is not None
+    assert router.acquire() is not None
+    # The lag is sampled once per check interval
+    assert len(replica.conn.queries) == 1
+    assert router.stats()["replica_reads"] == 2
+
+
+def test_reads_follow_the_primary_until_the_replica_replays_our_write(replica):
+    router = _router(replica)
+    router.acquire()
+    primary = _Conn(lsn="0/20")
+    router.wrote(primary)
+    assert primary.autocommit is False
+
+    assert router.acquire() is None
+    assert replica.released == [False]
+    replica.conn.replay = "0/20"
+    assert router.acquire() is not None
+    assert router.stats()["replay_behind_writes"] is False
+
+
+def test_lagging_replica_is_not_used(replica):
+    replica.conn.lag = 30.0
+    router = _router(replica)
+    assert router.acquire() is None
+    # Not re-checked until the interval has passed
+    assert router.acquire() is None
+    assert len(replica.conn.queries) == 1
+
+
+def test_unknown_write_position_pins_reads_to_the_primary(replica):
+    router = _router(replica)
+    primary = _Conn()
+    primary.fail = True
+    router.wrote(primary)
+    assert router.acquire() is None
+    assert replica.conn.queries == []
+
+
+def test_failed_replica_check_falls_back_to_the_primary(replica):
+    replica.conn.fail = True
+    router = _router(replica, check_interval=0)
+    assert router.acquire() is None
+    assert replica.released == [True]
+    assert router.stats()["lag_seconds"] is None
+
+
+def test_without_a_replica_every_read_uses_the_primary():
+    router = _router(None)
+    router.wrote(_Conn())
+    assert router.acquire() is None
+    assert router.stats() == {
+        "configured": False,
+        "lag_seconds": None,
+        "replay_behind_writes": False,
+        "replica_reads": 0,
+        "primary_reads": 1,
+    }
@@ -0,0 +1,137 @@
+import os
+import orjson
+import pytest
+from app.utils.outbox import QUARANTINE_DIR, Outbox, RejectedRecords
+
+
+class _Unreachable(Exception):
+    pass
+
+
+class _Sink:
+    """Stores batches; fails with `error` while it is set."""
+
+    def __init__(self):
+        self.batches = []
+        self.error = None
+
+    def __call__(self, records):
+        if self.error is not None:
+            raise self.error
+        bad = [r for r in records if r.get("bad")]
+        self.batches.append([r for r in records if not r.get("bad")])
+        if bad:
+            raise RejectedRecords(bad, ValueError("check constraint"))
+
+
+@pytest.fixture
+def sink():
+    return _Sink()
+
+
+def _outbox(tmp_path, sink, **kwargs):
+    options = dict(
+        segment_bytes=1 << 20,
+        segment_seconds=0,
+        fsync_ms=10,
+        ship_interval_seconds=60,
+        max_attempts=2,
+        transient=(_Unreachable,),
+    )
+    options.update(kwargs)
+    return Outbox(str(tmp_path), sink, **options)
+
+
+def _quarantined(tmp_path):
+    directory = tmp_path / QUARANTINE_DIR
+    if not directory.exists():
+        return []
+    return [
+        orjson.loads(line)
+        for path in sorted(directory.iterdir())
+        for line in path.read_bytes().splitlines()
+    ]
+
+
+def test_closed_segment_is_shipped_in_one_call(tmp_path, sink):
+    outbox = _outbox(tmp_path, sink)
+    outbox.append({"n": 1})
+    outbox.append({"n": 2})
+    assert outbox.ship() == 2
+    assert sink.batches == [[{"n": 1}, {"n": 2}]]
+    assert outbox.stats()["pending_segments"] == 0
+
+
+def test_open_segment_is_not_shipped(tmp_path, sink):
+    outbox = _outbox(tmp_path, sink, segment_seconds=60)
+    outbox.append({"n": 1})
+    assert outbox.ship() == 0
+    assert outbox.stats()["pending_segments"] == 1
+
+
+def test_segments_rotate_at_segment_bytes(tmp_path, sink):
+    outbox = _outbox(tmp_path, sink, segment_bytes=1, segment_seconds=60)
+    for n in range(3):
+        outbox.append({"n": n})
+    outbox.sync()
+    assert outbox.ship() == 3
+    assert sink.batches == [[{"n": 0}], [{"n": 1}], [{"n": 2}]]
+
+
+def test_transient_error_keeps_the_segment(tmp_path, sink):
+    outbox = _outbox(tmp_path, sink)
+    outbox.append({"n": 1})
+    sink.error = _Unreachable()
+    for _ in range(3):
+        with pytest.raises(_Unreachable):
+            outbox.ship()
+    # Transient failures never count towards quarantine
+    sink.error = None
+    assert outbox.ship() == 1
+    assert _quarantined(tmp_path) == []
+
+
+def test_failing_segment_is_quarantined_after_max_attempts(tmp_path, sink):
+    outbox = _outbox(tmp_path, sink, segment_bytes=1)
+    outbox.append({"n": 1})
+    outbox.append({"n": 2})
+    outbox.sync()
+    sink.error = ValueError("bad segment")
+    assert outbox.ship() == 0
+    assert outbox.stats()["pending_segments"] == 2
+    assert outbox.ship() == 0
+    assert outbox.stats()["quarantined_segments"] == 2
+    assert outbox.stats()["pending_segments"] == 0
+    assert _quarantined(tmp_path) == [{"n": 1}, {"n": 2}]
+
+
+def test_rejected_records_are_quarantined_alone(tmp_path, sink):
+    outbox = _outbox(tmp_path, sink)
+    outbox.append({"n": 1})
+    outbox.append({"n": 2, "bad": True})
+    outbox.append({"n": 3})
+    assert outbox.ship() == 2
+    assert sink.batches == [[{"n": 1}, {"n": 3}]]
+    assert _quarantined(tmp_path) == [{"n": 2, "bad": True}]
+    stats = outbox.stats()
+    assert stats["quarantined_records"] == 1
+    assert stats["pending_segments"] == 0
+
+
+def test_torn_line_is_skipped(tmp_path, sink):
+    outbox = _outbox(tmp_path, sink)
+    outbox.append({"n": 1})
+    outbox.sync()
+    with open(outbox._path, "ab") as f:
+        f.write(b'{"n": 2')
+    assert outbox.ship() == 1
+    assert outbox.stats()["corrupt_lines"] == 1
+
+
+def test_stop_ships_what_is_left(tmp_path, sink):
+    outbox = _outbox(tmp_path, sink, segment_seconds=60)
+    outbox.start()
+    outbox.append({"n": 1})
+    outbox.stop(timeout=5)
+    assert sink.batches == [[{"n": 1}]]
+    assert not [n for n in os.listdir(tmp_path) if n.endswith(".ndjson")]
@@ -0,0 +1,69 @@
+import pytest
+from app.services.permissions import (
+    GrantGroup,
+    GrantSet,
+    LEVEL_MASKS,
+    change_count,
+    changes_payload,
+    chunk_changes,
+    mask_of,
+    privileges,
+)
+
+
+def _group(*principals, add=("USE SCHEMA", "SELECT")):
+    return GrantGroup(add, principals)
+
+
+def test_levels_are_merged_per_principal():
+    grants = GrantSet()
+    grants.add("alice", LEVEL_MASKS["read_only"])
+    grants.add("alice", LEVEL_MASKS["modify"])
+    grants.add("bob", LEVEL_MASKS["read_only"])
+    groups = grants.groups()
+    assert [group.principals for group in groups] == [("alice",), ("bob",)]
+    assert set(groups[0].add) >= set(groups[1].add)
+    # Equal bitsets share one privilege tuple
+    assert privileges(LEVEL_MASKS["read_only"]) is groups[1].add
+
+
+def test_unknown_privilege_is_rejected():
+    with pytest.raises(ValueError):
+        mask_of(("USE_SCHEMA",))
+
+
+def test_chunks_respect_max_changes_and_keep_order():
+    groups = [_group("a", "b", "c"), _group("d", "e", add=("SELECT",))]
+    chunks = list(chunk_changes(groups, max_changes=2, max_bytes=10_000))
+    assert [change_count(chunk) for chunk in chunks] == [2, 2, 1]
+    principals = [
+        change["principal"]
+        for chunk in chunks
+        for change in changes_payload(chunk)["changes"]
+    ]
+    assert principals == ["a", "b", "c", "d", "e"]
+    # The group crossing the boundary is sliced, not split per principal
+    assert chunks[1] == (_group("c"), _group("d", add=("SELECT",)))
+
+
+def test_chunks_respect_max_bytes():
+    group = _group("alice", "bob", "carol")
+    change_size = group.add_size() + len("alice")
+    chunks = list(chunk_changes([group], max_changes=500, max_bytes=change_size * 2))
+    assert [chunk[0].principals for chunk in chunks] == [("alice", "bob"), ("carol",)]
+
+
+def test_unsplit_group_is_passed_through():
+    group = _group("a", "b")
+    assert list(chunk_changes([group])) == [(group,)]
+    assert list(chunk_changes([])) == []
+
+
+def test_changes_payload_has_one_change_per_principal():
+    payload = changes_payload([_group("a", "b", add=("SELECT",))])
+    assert payload == {
+        "changes": [
+            {"add": ("SELECT",), "principal": "a"},
+            {"add": ("SELECT",), "principal": "b"},
+        ]
+    }